@@ -0,0 +1,120 @@
+"""
+Congestion alerts with hysteresis for every lane of every junction.
+
+A lane's alert is raised once its density has stayed above the area's alert
+threshold for RAISE_AFTER seconds, and cleared once it has stayed at or below
+CLEAR_RATIO of the threshold for CLEAR_AFTER seconds. Readings between the two
+levels, or excursions shorter than the hold time, leave the alert as it is, so
+a lane hovering around the threshold no longer flaps on and off every tick.
+
+Per-lane state lives in flat NumPy arrays laid out like the lane arrays of a
+traffic_data.TrafficBatch, and update() evaluates every lane of every area in
+one pass per tick: O(lanes) array work, with Python only touching the lanes
+that changed state. The engine passes each area's threshold in, so evaluation
+never reads the database; the transitions it returns are written to the
+alert_events table by the traffic log writer, batched with the tick's rows.
+"""
+import os
+from collections import namedtuple
+
+import numpy as np
+
+# At the default 3 s tick an alert needs 2 consecutive readings above the threshold
+# and clears after 3 at or below the clear level. The holds sit between tick
+# multiples so timer jitter cannot move a transition by a tick.
+RAISE_AFTER = float(os.environ.get('TRAFFIC_ALERT_RAISE_AFTER', 2.0)) # Seconds above the threshold before raising
+CLEAR_AFTER = float(os.environ.get('TRAFFIC_ALERT_CLEAR_AFTER', 5.0)) # Seconds at or below the clear level before clearing
+CLEAR_RATIO = float(os.environ.get('TRAFFIC_ALERT_CLEAR_RATIO', 0.85)) # Clear level as a fraction of the threshold
+
+RAISED = 'raised'
+CLEARED = 'cleared'
+EVENT_KINDS = (RAISED, CLEARED)
+
+# One alert transition, in alert_events column order. duration_s and peak_density
+# describe the whole alert on a 'cleared' event; a 'raised' event has no duration
+# and its peak is the density that raised it.
+AlertEvent = namedtuple('AlertEvent', [
+    'area_name',
+    'lane_id',
+    'kind',
+    'timestamp',
+    'density',
+    'threshold',
+    'duration_s',
+    'peak_density',
+])
+
+
+class AlertEvaluator:
+    """
+    Per-lane alert state for every junction of a TrafficSimulator layout.
+    update() is called once per tick, from the engine thread, with that tick's
+    TrafficBatch; active_lanes() describes one area's current alerts.
+    """
+
+    def __init__(self, layout, raise_after=RAISE_AFTER, clear_after=CLEAR_AFTER, clear_ratio=CLEAR_RATIO):
+        if raise_after < 0 or clear_after < 0:
+            raise ValueError("Alert hold times must not be negative.")
+        if not 0 < clear_ratio <= 1:
+            raise ValueError(f"Alert clear ratio must be in (0, 1], got {clear_ratio}.")
+        self.layout = layout
+        self.raise_after = raise_after
+        self.clear_after = clear_after
+        self.clear_ratio = clear_ratio
+        lane_count = len(layout.lane_ids)
+        self._lanes_per_area = np.diff(layout.offsets)
+        self._area_of = np.repeat(np.arange(len(layout.areas)), self._lanes_per_area).tolist()
+        self.active = np.zeros(lane_count, dtype=bool)
+        # When each lane's readings started pointing the other way (NaN: they don't)
+        self._leaving_since = np.full(lane_count, np.nan)
+        self._raised_at = np.zeros(lane_count)
+        self._peak = np.zeros(lane_count, dtype=np.int64)
+        self.raised = 0
+        self.cleared = 0
+
+    def update(self, batch, thresholds, now, timestamp):
+        """
+        Advances every lane to time now (seconds) with this tick's densities.
+        thresholds holds each area's alert threshold aligned with batch.areas;
+        timestamp (ISO) stamps the events. Returns the tick's AlertEvents.
+        """
+        layout = self.layout
+        density = batch.density
+        threshold = np.repeat(np.asarray(thresholds, dtype=np.float64), self._lanes_per_area)
+        active = self.active
+
+        # An active lane leaves on readings at or below the clear level, an idle one on
+        # readings above the threshold; the band in between holds either state
+        leaving = np.where(active, density <= threshold * self.clear_ratio, density > threshold)
+        since = self._leaving_since
+        since[~leaving] = np.nan
+        since[leaving & np.isnan(since)] = now
+        np.maximum(self._peak, density, out=self._peak, where=active)
+        hold = np.where(active, self.clear_after, self.raise_after)
+        flip = np.flatnonzero(leaving & (now - since >= hold))
+        if not len(flip):
+            return []
+
+        events = []
+        for lane, was_active, lane_density, lane_threshold in zip(flip.tolist(), active[flip].tolist(),
+                                                                  density[flip].tolist(), threshold[flip].tolist()):
+            area_name, lane_id = layout.areas[self._area_of[lane]], layout.lane_ids[lane]
+            if was_active:
+                events.append(AlertEvent(area_name, lane_id, CLEARED, timestamp, lane_density, int(lane_threshold),
+                                         round(now - float(self._raised_at[lane]), 1), int(self._peak[lane])))
+            else:
+                events.append(AlertEvent(area_name, lane_id, RAISED, timestamp, lane_density, int(lane_threshold),
+                                         None, lane_density))
+        raising = flip[~active[flip]]
+        self._raised_at[raising] = now
+        self._peak[raising] = density[raising]
+        active[flip] = ~active[flip]
+        since[flip] = np.nan
+        self.raised += len(raising)
+        self.cleared += len(flip) - len(raising)
+        return events
+
+    def active_lanes(self, area_i):
+        """Indexes (within the area) of area area_i's lanes with an active alert."""
+        offsets = self.layout.offsets
+        return np.flatnonzero(self.active[offsets[area_i]:offsets[area_i + 1]]).tolist()
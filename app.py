@@ -1,11 +1,25 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, Response, send_file, make_response
 import traffic_data # Import your traffic logic module
 import database # Import your new database module
+import engine # Background simulation engine that publishes per-area snapshots
+import stream # Server-Sent Events stream of engine snapshots
+import vehicle_registry # RC-number index of registered vehicles
+import challan_io # Streaming CSV/NDJSON challan export and import
+import challan_pdf # Templated, cached challan PDFs
+import pdf_jobs # Bulk challan PDF jobs rendered on a process pool
+import json_provider # orjson-backed JSON encoding with a stdlib fallback
+import alerts # Congestion alert kinds for the alert event log
+import csv
+import gzip
+import hashlib
+import io
 import os
-from datetime import datetime
-from fpdf import FPDF # Import FPDF for PDF generation
+import threading
+import time
+from datetime import datetime, timedelta
 
 app = Flask(__name__)
+app.json = json_provider.FastJSONProvider(app) # jsonify() encodes with orjson when it is installed
 # Generate a strong secret key for session management
 app.secret_key = os.environ.get('SECRET_KEY', 'your_super_secret_key_here_for_dev_only') # IMPORTANT: Use a strong, random key in production!
 
@@ -13,12 +27,118 @@ app.secret_key = os.environ.get('SECRET_KEY', 'your_super_secret_key_here_for_de
 ADMIN_USERNAME = 'admin'
 ADMIN_PASSWORD = 'password123' # IMPORTANT: In a real app, hash and and store passwords securely!
 
-# Initialize the database on app startup
+# --- Startup ---
+# Initialization happens before the first request instead of in it: create_app()
+# creates or upgrades the schema, seeds an empty database and warms the read caches
+# once. Under gunicorn it runs in the master (preload_app, see gunicorn.conf.py), so
+# workers fork with warm caches; start_worker() then elects the one worker that runs
+# the engine, and the others mirror its snapshots (see engine.py). Servers that
+# import the bare module-level app still get startup(), in their first request.
+_startup_lock = threading.Lock()
+_startup_report = None
+
+def startup():
+    """Initializes the database and warms this process's caches, once. Returns the phase timings."""
+    global _startup_report
+    with _startup_lock:
+        if _startup_report is None:
+            started = time.perf_counter()
+            seeded = database.init_db()
+            initialized = time.perf_counter()
+            areas = traffic_data.get_available_areas()
+            database.warm_caches(areas)
+            challan_pdf.warm_templates()
+            database.close_all_connections() # Forked workers must open their own
+            finished = time.perf_counter()
+            _startup_report = {
+                'init_db_ms': round((initialized - started) * 1000, 1),
+                'warmup_ms': round((finished - initialized) * 1000, 1),
+                'seeded_challans': seeded,
+                'areas': len(areas),
+                'registered_vehicles': len(traffic_data.VEHICLE_REGISTRY),
+            }
+            app.logger.info("Startup finished: %s", _startup_report)
+    return _startup_report
+
+def start_worker():
+    """
+    Starts the simulation engine if this worker wins the engine lock, or else a mirror of
+    the worker that did, so the first request finds snapshots ready.
+    """
+    return engine.get_engine()
+
+def create_app():
+    """Application factory for WSGI servers ('app:create_app()'): runs startup() and returns the app."""
+    startup()
+    return app
+
 @app.before_request
-def setup_database():
-    if not hasattr(app, 'database_initialized'):
-        database.init_db()
-        app.database_initialized = True
+def ensure_startup():
+    """
+    Runs startup() in the first request when the server imported the module-level app
+    (e.g. 'gunicorn app:app' or 'flask run') instead of calling create_app().
+    Costs one global read per request once startup has run.
+    """
+    if _startup_report is None:
+        app.logger.warning("Startup was skipped; running it in the first request. "
+                           "Serve 'app:create_app()' (see gunicorn.conf.py) to run it before.")
+        startup()
+
+# --- Conditional GET and compression ---
+# Polled JSON endpoints tag their responses with a weak ETag derived from a cheap
+# data-generation value (see database.get_challans_generation) instead of a hash of
+# the body, so a poll whose data has not changed is answered 304 before its query
+# runs. Browsers revalidate automatically thanks to 'Cache-Control: no-cache'.
+# JSON bodies of COMPRESS_MIN_BYTES or more are brotli-compressed when the optional
+# brotli package is installed and the client accepts it, gzip-compressed otherwise.
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5 # Brotli's speed/size sweet spot for on-the-fly compression
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+def _etag(*generation):
+    """ETag value for the current request's path and query string at a data generation."""
+    key = repr((request.path, sorted(request.args.items(multi=True)), generation))
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=12).hexdigest()
+
+def _conditional(etag, build):
+    """
+    Answers 304 Not Modified if the request's If-None-Match names etag; otherwise returns
+    the response from build() tagged with it. build() only runs when the client is stale.
+    """
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = make_response(build())
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag, weak=True)
+    response.headers['Cache-Control'] = 'private, no-cache' # Cache, but revalidate on every poll
+    return response
+
+@app.after_request
+def compress_response(response):
+    """Compresses JSON bodies of at least COMPRESS_MIN_BYTES for clients that accept it."""
+    if (response.status_code != 200 or response.mimetype != 'application/json'
+            or response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers):
+        return response
+    encoding = request.accept_encodings.best_match(('br', 'gzip') if brotli else ('gzip',))
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
 
 # --- Routes ---
 
@@ -83,151 +203,149 @@ def dashboard():
     # Store selected area in session for persistence
     session['selected_area'] = area_name
 
-    lanes_info, violation_details = traffic_data.simulate_traffic_data(area_name)
+    snapshot = engine.get_engine().snapshot(area_name)
 
-    if not lanes_info:
+    if not snapshot:
         # Handle case where area name is invalid
         return render_template('error.html', message=f"Area '{area_name}' not found."), 404
 
-    current_green_lane = traffic_data.determine_green_lane(lanes_info)
-
-    # Update the signal status in lanes_info for display
-    for lane_id in lanes_info:
-        if lane_id == current_green_lane:
-            lanes_info[lane_id]['signal_status'] = 'GREEN'
-        else:
-            lanes_info[lane_id]['signal_status'] = 'RED'
-
-    # Log current traffic data to the database
-    database.log_traffic_data(area_name, lanes_info)
-
-    # Add challan if a violation occurred in this simulation cycle
-    if violation_details:
-        database.add_challan(
-            area_name,
-            violation_details['lane_id'],
-            violation_details['violation_type'],
-            violation_details['vehicle_number'],
-            violation_details.get('owner_name', 'N/A'),
-            violation_details.get('owner_phone', 'N/A'),
-            violation_details.get('vehicle_type', 'N/A'),
-            violation_details.get('challan_number', 'N/A'),
-            violation_details.get('transaction_id', 'N/A'),
-            violation_details.get('state', 'N/A'),
-            violation_details.get('fine_amount', 0) # Pass fine_amount
-        )
-
-    # Get alert threshold for the current area
-    alert_threshold = database.get_alert_threshold(area_name)
-
-    # Prepare data for Chart.js
-    lane_labels = list(lanes_info.keys())
-    lane_densities = [data['density'] for data in lanes_info.values()]
-
     return render_template('dashboard.html',
                            area_name=area_name,
-                           lanes_info=lanes_info,
-                           current_green_lane=current_green_lane,
-                           lane_labels=lane_labels,
-                           lane_densities=lane_densities,
-                           alert_threshold=alert_threshold)
+                           lanes_info=snapshot.lanes_info,
+                           current_green_lane=snapshot.current_green_lane,
+                           lane_labels=snapshot.lane_labels,
+                           lane_densities=snapshot.lane_densities,
+                           alert_threshold=snapshot.alert_threshold)
+
+# Media type that opts a client into a response schema, e.g. Accept: application/vnd.traffic.v2+json
+SCHEMA_MEDIA_TYPE = 'application/vnd.traffic.v{}+json'
+TRAFFIC_DATA_SCHEMAS = (1, 2)
+
+def _requested_schema(schemas):
+    """
+    The response schema version the client asked for with ?v=N or an Accept header naming
+    SCHEMA_MEDIA_TYPE; 1 when it asked for none. Raises ValueError for an unknown version.
+    """
+    version = request.args.get('v', type=int)
+    if version is None:
+        version = next((n for n in schemas if SCHEMA_MEDIA_TYPE.format(n) in request.accept_mimetypes.values()), 1)
+    if version not in schemas:
+        raise ValueError(f"Unknown schema version; expected one of {', '.join(map(str, schemas))}.")
+    return version
 
 @app.route('/api/traffic_data/<area_name>')
 def api_traffic_data(area_name):
     """
     API endpoint to provide real-time traffic data for AJAX requests for a specific area.
-    This allows the dashboard to update without a full page refresh.
+    Serves the engine's latest snapshot, so polling never simulates or writes anything.
+    Schema 1 (the default) is what the dashboard reads; clients can opt into the leaner
+    schema 2 (lanes as parallel arrays, see engine.build_snapshot) with ?v=2 or
+    Accept: application/vnd.traffic.v2+json.
     """
     if not session.get('logged_in'):
         return jsonify({"error": "Unauthorized"}), 401
 
-    lanes_info, violation_details = traffic_data.simulate_traffic_data(area_name)
+    try:
+        schema = _requested_schema(TRAFFIC_DATA_SCHEMAS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    snapshot = engine.get_engine().snapshot(area_name)
 
-    if not lanes_info:
+    if not snapshot:
         return jsonify({"error": f"Area '{area_name}' not found"}), 404
 
-    current_green_lane = traffic_data.determine_green_lane(lanes_info)
+    payload = snapshot.payload_v2_json if schema == 2 else snapshot.payload_json
+    # Every worker serves the engine process's snapshots under its version numbers (see engine.py)
+    response = _conditional(_etag(snapshot.version, schema),
+                            lambda: Response(payload, mimetype='application/json'))
+    response.vary.add('Accept')
+    return response
 
-    # Update the signal status in lanes_info for display
-    for lane_id in lanes_info:
-        if lane_id == current_green_lane:
-            lanes_info[lane_id]['signal_status'] = 'GREEN'
-        else:
-            lanes_info[lane_id]['signal_status'] = 'RED'
+@app.route('/api/stream/<area_name>')
+def api_stream(area_name):
+    """
+    Server-Sent Events stream of lane deltas, alert transitions and new challans for an area.
+    Each open stream holds a worker thread, so run gunicorn with threaded workers
+    (e.g. --worker-class gthread --threads 32) when many dashboards are open.
+    """
+    if not session.get('logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
 
-    # Log current traffic data to the database
-    database.log_traffic_data(area_name, lanes_info)
+    traffic_engine = engine.get_engine()
+    if not traffic_engine.snapshot(area_name):
+        return jsonify({"error": f"Area '{area_name}' not found"}), 404
 
-    # Add challan if a violation occurred in this simulation cycle
-    if violation_details:
-        database.add_challan(
-            area_name,
-            violation_details['lane_id'],
-            violation_details['violation_type'],
-            violation_details['vehicle_number'],
-            violation_details.get('owner_name', 'N/A'),
-            violation_details.get('owner_phone', 'N/A'),
-            violation_details.get('vehicle_type', 'N/A'),
-            violation_details.get('challan_number', 'N/A'),
-            violation_details.get('transaction_id', 'N/A'),
-            violation_details.get('state', 'N/A'),
-            violation_details.get('fine_amount', 0) # Pass fine_amount
-        )
+    resume_version = request.headers.get('Last-Event-ID', type=int)
+    response = Response(stream.area_events(traffic_engine, area_name, resume_version), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no' # Don't let nginx buffer the stream
+    return response
 
-    # Check for alerts
-    alert_triggered = False
-    alert_message = ""
-    alert_threshold = database.get_alert_threshold(area_name)
-    congested_lanes = []
-
-    for lane_id, data in lanes_info.items():
-        if data['density'] > alert_threshold:
-            alert_triggered = True
-            congested_lanes.append(f"{lane_id} (Density: {data['density']})")
-
-    if alert_triggered:
-        alert_message = f"HIGH CONGESTION ALERT in {area_name}: {', '.join(congested_lanes)}!"
-
-    # Prepare data for Chart.js
-    lane_labels = list(lanes_info.keys())
-    lane_densities = [data['density'] for data in lanes_info.values()]
-
-    response_data = {
-        'lanes_info': lanes_info,
-        'current_green_lane': current_green_lane,
-        'lane_labels': lane_labels,
-        'lane_densities': lane_densities,
-        'alert_triggered': alert_triggered,
-        'alert_message': alert_message,
-        'alert_threshold': alert_threshold
-    }
-    return jsonify(response_data)
+@app.route('/api/signal_plan/<area_name>')
+def api_signal_plan(area_name):
+    """
+    API endpoint for an area's current signal cycle: the phase order, each lane's
+    green time, the all-red clearance, and the phase that is running now.
+    """
+    if not session.get('logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    traffic_engine = engine.get_engine()
+    if not traffic_engine.snapshot(area_name):
+        return jsonify({"error": f"Area '{area_name}' not found"}), 404
+
+    schedule = traffic_engine.signal_schedule(area_name)
+    if schedule is None:
+        return jsonify({"error": "Adaptive signal control is disabled"}), 404
+    return jsonify(schedule)
 
 @app.route('/api/historical_traffic_data/<area_name>')
 def api_historical_traffic_data(area_name):
     """
     API endpoint to provide historical traffic density data for a specific area.
+    Without parameters it returns the last 30 points per lane. With 'start'/'end'
+    (ISO timestamps, end defaults to now, start to one hour before end) and/or
+    'resolution' (raw, minute, hour, day or auto) it returns a time range read
+    from the matching rollup tier, e.g. ?start=2024-05-01T00:00&resolution=auto.
+    Responses carry an ETag, except open-ended ranges; see _conditional().
     """
     if not session.get('logged_in'):
         return jsonify({"error": "Unauthorized"}), 401
 
     # Fetch historical data for all lanes in the area
-    historical_data = {}
     lanes_in_area = traffic_data.AREAS.get(area_name, [])
     if not lanes_in_area:
         return jsonify({"error": f"Area '{area_name}' not found or has no defined lanes."}), 404
 
-    for lane_id in lanes_in_area:
-        # Fetch data for each lane, limit to a reasonable number for charting
-        data = database.get_historical_traffic_data(area_name, lane_id=lane_id, limit=30)
-        timestamps = [row[0] for row in data]
-        densities = [row[1] for row in data]
-        historical_data[lane_id] = {
-            'timestamps': timestamps,
-            'densities': densities
-        }
-
-    return jsonify(historical_data)
+    if not any(param in request.args for param in ('start', 'end', 'resolution')):
+        # One query for every lane, limited to a reasonable number of points for charting
+        return _conditional(_etag(database.get_traffic_generation(area_name)), lambda: jsonify(
+            database.get_area_historical_traffic_data(area_name, lanes_in_area, limit=30)))
+
+    def history_range():
+        try:
+            # Naive local times, like the stored history; timestamps with an offset are converted
+            end = database.parse_local_timestamp(request.args['end']) if 'end' in request.args else datetime.now()
+            start = (database.parse_local_timestamp(request.args['start']) if 'start' in request.args
+                     else end - timedelta(hours=1))
+            if start > end:
+                raise ValueError("start must not be after end.")
+            resolution, lanes = database.get_traffic_history(area_name, lanes_in_area, start, end,
+                                                             request.args.get('resolution', 'auto'))
+        except ValueError as e:
+            return jsonify({"error": f"Invalid history range: {e}"}), 400
+
+        return jsonify({
+            'resolution': resolution,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'lanes': lanes
+        })
+
+    if 'end' not in request.args:
+        return history_range() # Ends at the current time, so it changes even when no data does
+    return _conditional(_etag(database.get_traffic_generation(area_name)), history_range)
 
 @app.route('/api/set_alert_threshold', methods=['POST'])
 def api_set_alert_threshold():
@@ -249,24 +367,91 @@ def api_set_alert_threshold():
         if max_density < 0:
             raise ValueError("Max density cannot be negative.")
         database.set_alert_threshold(area_name, max_density)
+        # Reflect the new threshold before the next tick (other workers see it from that tick)
+        engine.get_engine().republish(area_name)
         return jsonify({"success": True, "message": f"Alert threshold for {area_name} set to {max_density}"})
     except ValueError as e:
         return jsonify({"error": f"Invalid max_density value: {e}"}), 400
     except Exception as e:
         return jsonify({"error": f"An error occurred: {e}"}), 500
 
+@app.route('/api/challans/export')
+def api_export_challans():
+    """
+    Streams challans as a CSV or NDJSON download (?format=csv|ndjson, default csv), optionally
+    filtered by ?area= and ?status=. Rows go out as they are read from the database,
+    so the export runs in constant memory however many challans there are.
+    """
+    if not session.get('logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    export_format = request.args.get('format', 'csv')
+    if export_format not in challan_io.FORMATS:
+        return jsonify({"error": f"Unknown format '{export_format}'"}), 400
+    mimetype, export, _ = challan_io.FORMATS[export_format]
+    rows = database.iter_challans(request.args.get('area'), request.args.get('status'))
+    response = Response(export(rows), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename="challans.{export_format}"'
+    return response
+
+@app.route('/api/challans/import', methods=['POST'])
+def api_import_challans():
+    """
+    Bulk-loads challans from a CSV (header row of column names) or NDJSON request body,
+    chosen by ?format= or the Content-Type. The body is parsed as it streams in and
+    inserted in chunked transactions (see database.add_challans).
+    """
+    if not session.get('logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    import_format = request.args.get('format') or \
+        ('ndjson' if request.mimetype in ('application/x-ndjson', 'application/jsonl') else 'csv')
+    if import_format not in challan_io.FORMATS:
+        return jsonify({"error": f"Unknown format '{import_format}'"}), 400
+    _, _, read = challan_io.FORMATS[import_format]
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    try:
+        inserted = database.add_challans(read(lines))
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"error": f"Import stopped: {e}"}), 400
+    return jsonify({"success": True, "inserted": inserted})
+
 @app.route('/api/challans/<area_name>')
 def api_get_challans(area_name):
     """
     API endpoint to get challan data for a specific area.
     Supports optional 'status' filter (e.g., /api/challans/Sayajigunj?status=pending).
+    Passing any of 'limit', 'after', 'since' or 'fields' switches to the paginated form,
+    which returns {'challans', 'next_cursor', 'sync_cursor'} (see database.get_challans_page):
+    /api/challans/Sayajigunj?status=pending&limit=50&fields=vehicle_number,status
+    /api/challans/Sayajigunj?after=<next_cursor>   (next page)
+    /api/challans/Sayajigunj?since=<sync_cursor>   (only challans created or changed since)
+    Responses carry an ETag, so unchanged polls get 304 (see _conditional()).
     """
     if not session.get('logged_in'):
         return jsonify({"error": "Unauthorized"}), 401
 
     status_filter = request.args.get('status')
-    challans = database.get_challans(area_name, status=status_filter)
-    return jsonify(challans)
+    if not any(param in request.args for param in ('limit', 'after', 'since', 'fields')):
+        return _conditional(_etag(database.get_challans_generation(area_name)), lambda: jsonify(
+            database.get_challans(area_name, status=status_filter)))
+
+    def challans_page():
+        fields = request.args.get('fields')
+        try:
+            page = database.get_challans_page(
+                area_name,
+                status=status_filter,
+                limit=request.args.get('limit', database.CHALLAN_PAGE_SIZE, type=int),
+                after=request.args.get('after'),
+                since=request.args.get('since'),
+                fields=fields.split(',') if fields else None
+            )
+        except ValueError as e:
+            return jsonify({"error": f"Invalid pagination parameters: {e}"}), 400
+        return jsonify(page)
+
+    return _conditional(_etag(database.get_challans_generation(area_name)), challans_page)
 
 @app.route('/api/update_challan_status', methods=['POST'])
 def api_update_challan_status():
@@ -285,10 +470,113 @@ def api_update_challan_status():
 
     try:
         database.update_challan_status(challan_id, new_status)
+        challan_pdf.invalidate(challan_id)
         return jsonify({"success": True, "message": f"Challan {challan_id} status updated to {new_status}"})
     except Exception as e:
         return jsonify({"error": f"An error occurred: {e}"}), 500
 
+@app.route('/api/update_challan_statuses', methods=['POST'])
+def api_update_challan_statuses():
+    """
+    API endpoint to update many challans in one transaction, e.g. from a payment settlement file.
+    Body: {"updates": [{"transaction_id": "TXN-...", "new_status": "paid"}, ...]}; each update
+    names one of challan_id, challan_number or transaction_id. Returns a result per update
+    (see database.update_challan_statuses).
+    """
+    if not session.get('logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    updates = data.get('updates')
+    if not isinstance(updates, list) or not updates:
+        return jsonify({"error": "Missing updates"}), 400
+
+    try:
+        results = database.update_challan_statuses(updates)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": f"An error occurred: {e}"}), 500
+    counts = {}
+    for result in results:
+        counts[result['result']] = counts.get(result['result'], 0) + 1
+        if result['result'] == 'updated':
+            for updated_id in result['challan_ids']:
+                challan_pdf.invalidate(updated_id)
+    return jsonify({"success": True, "counts": counts, "results": results})
+
+@app.route('/api/vehicles')
+def api_search_vehicles():
+    """
+    API endpoint for partial-plate search: ?prefix=GJ06AB returns up to ?limit= registered
+    vehicles whose RC number starts with the prefix (spacing and case are ignored).
+    """
+    if not session.get('logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    prefix = request.args.get('prefix', '')
+    if not vehicle_registry.normalize_rc(prefix):
+        return jsonify({"error": "Missing prefix"}), 400
+    limit = min(max(request.args.get('limit', vehicle_registry.MAX_PREFIX_RESULTS, type=int), 1),
+                vehicle_registry.MAX_PREFIX_RESULTS)
+    return jsonify({"prefix": prefix, "vehicles": traffic_data.VEHICLE_REGISTRY.search_prefix(prefix, limit)})
+
+@app.route('/api/vehicles/<rc_number>')
+def api_vehicle(rc_number):
+    """
+    API endpoint for the owner/vehicle details registered under an RC number.
+    """
+    if not session.get('logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    vehicle = traffic_data.VEHICLE_REGISTRY.get(rc_number)
+    if vehicle is None:
+        return jsonify({"error": f"Vehicle '{rc_number}' not found"}), 404
+    return jsonify(vehicle)
+
+@app.route('/api/alert_events/<area_name>')
+def api_alert_events(area_name):
+    """
+    API endpoint listing an area's congestion alert transitions (see alerts.py), newest first.
+    Optional filters: 'lane', 'kind' ('raised' or 'cleared'), and 'start'/'end' ISO timestamps;
+    'limit' sets the page size and 'after' takes the previous page's 'next_cursor':
+    /api/alert_events/Sayajigunj?kind=raised&start=2024-06-03&limit=50
+    """
+    if not session.get('logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    kind = request.args.get('kind')
+    if kind is not None and kind not in alerts.EVENT_KINDS:
+        return jsonify({"error": f"Invalid kind '{kind}'; expected one of {', '.join(alerts.EVENT_KINDS)}."}), 400
+    try:
+        page = database.get_alert_events(
+            area_name,
+            lane_id=request.args.get('lane'),
+            kind=kind,
+            start=request.args.get('start'),
+            end=request.args.get('end'),
+            limit=request.args.get('limit', database.ALERT_EVENT_PAGE_SIZE, type=int),
+            after=request.args.get('after')
+        )
+    except ValueError as e:
+        return jsonify({"error": f"Invalid parameters: {e}"}), 400
+    return jsonify(page)
+
+@app.route('/api/cache_stats')
+def api_cache_stats():
+    """
+    API endpoint reporting this worker's read-cache and PDF-cache hit/miss counters.
+    """
+    if not session.get('logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+    return jsonify(dict(database.get_cache_stats(), challan_pdf=challan_pdf.get_cache_stats()))
+
+def _challan_pdf_response(challan, kind):
+    """Serves a challan's `kind` PDF (see challan_pdf) as a download."""
+    response = Response(challan_pdf.render(challan, kind), mimetype='application/pdf')
+    response.headers['Content-Disposition'] = f'attachment; filename={challan_pdf.filename(challan, kind)}'
+    return response
+
 @app.route('/generate_pending_challan_pdf/<int:challan_id>')
 def generate_pending_challan_pdf(challan_id):
     """
@@ -304,87 +592,7 @@ def generate_pending_challan_pdf(challan_id):
     if challan['status'] != 'pending':
         return "This is a pending challan print. Please use 'Generate Receipt' for paid challans.", 400
 
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-
-    # Header
-    pdf.set_fill_color(220, 220, 220) # Light grey background
-    pdf.cell(0, 10, "Traffic Challan (Amount Due)", 0, 1, 'C', 1)
-    pdf.ln(10)
-
-    # Challan Details Section
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 8, "Challan Details:", 0, 1, 'L')
-    pdf.set_font("Arial", size=10)
-    pdf.ln(2)
-
-    # Data for Challan Details table
-    challan_data = [
-        ("Challan ID:", challan['id']),
-        ("Challan Number:", challan.get('challan_number', 'N/A')),
-        ("Area:", challan['area_name']),
-        ("Lane of Violation:", challan['lane_id']),
-        ("Violation Type:", challan['violation_type']),
-        ("Violation Timestamp:", datetime.fromisoformat(challan['timestamp']).strftime('%Y-%m-%d %H:%M:%S')),
-    ]
-
-    # Draw Challan Details table
-    col_width_label = 60 # Width for labels
-    col_width_value = 130 # Width for values
-    row_height = 7
-
-    for label, value in challan_data:
-        pdf.cell(col_width_label, row_height, label, 1, 0, 'L')
-        pdf.cell(col_width_value, row_height, str(value), 1, 1, 'L')
-
-    pdf.ln(10)
-
-    # Violator and Vehicle Details Section
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 8, "Violator and Vehicle Details:", 0, 1, 'L')
-    pdf.set_font("Arial", size=10)
-    pdf.ln(2)
-
-    violator_vehicle_data = [
-        ("Violator Name:", challan['owner_name']),
-        ("Violator Phone:", challan['owner_phone']),
-        ("Vehicle Type:", challan['vehicle_type']),
-        ("Vehicle Number:", challan['vehicle_number']),
-        ("Vehicle State:", challan.get('state', 'N/A')),
-    ]
-
-    # Draw Violator and Vehicle Details table
-    for label, value in violator_vehicle_data:
-        pdf.cell(col_width_label, row_height, label, 1, 0, 'L')
-        pdf.cell(col_width_value, row_height, str(value), 1, 1, 'L')
-
-    pdf.ln(10)
-
-    # Amount Due Section
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 8, "Amount Due:", 0, 1, 'L')
-    pdf.set_font("Arial", size=10)
-    pdf.ln(2)
-
-    pdf.cell(col_width_label, row_height, "Fine Amount:", 1, 0, 'L')
-    pdf.cell(col_width_value, row_height, f"Rs. {challan.get('fine_amount', 0)}", 1, 1, 'L')
-    pdf.cell(col_width_label, row_height, "Status:", 1, 0, 'L')
-    pdf.cell(col_width_value, row_height, challan['status'].upper(), 1, 1, 'L')
-
-    pdf.ln(15)
-
-    # Instructions/Disclaimer
-    pdf.set_font("Arial", size=9)
-    pdf.multi_cell(0, 5, "Please pay this challan amount by visiting the nearest traffic police station or through online payment portals. Failure to pay within the stipulated time may result in additional penalties.")
-    pdf.ln(5)
-    pdf.set_font("Arial", size=8)
-    pdf.cell(0, 5, "This is an electronically generated challan and does not require a signature.", 0, 1, 'C')
-
-    # Output PDF
-    response = Response(pdf.output(dest='S').encode('latin-1'), mimetype='application/pdf')
-    response.headers['Content-Disposition'] = f'attachment; filename=challan_print_{challan_id}.pdf'
-    return response
+    return _challan_pdf_response(challan, 'pending')
 
 @app.route('/generate_paid_challan_pdf/<int:challan_id>')
 def generate_paid_challan_pdf(challan_id):
@@ -401,92 +609,62 @@ def generate_paid_challan_pdf(challan_id):
     if challan['status'] != 'paid':
         return "Receipt can only be generated for paid challans. This challan is still pending.", 400
 
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=12)
-
-    # Header
-    pdf.set_fill_color(220, 220, 220) # Light grey background
-    pdf.cell(0, 10, "Traffic Challan Payment Receipt", 0, 1, 'C', 1)
-    pdf.ln(10)
-
-    # Challan Details Section
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 8, "Challan Details:", 0, 1, 'L')
-    pdf.set_font("Arial", size=10)
-    pdf.ln(2)
-
-    # Data for Challan Details table
-    challan_data = [
-        ("Challan ID:", challan['id']),
-        ("Challan Number:", challan.get('challan_number', 'N/A')),
-        ("Transaction ID:", challan.get('transaction_id', 'N/A')),
-        ("Area:", challan['area_name']),
-        ("Lane of Violation:", challan['lane_id']),
-        ("Violation Type:", challan['violation_type']),
-        ("Violation Timestamp:", datetime.fromisoformat(challan['timestamp']).strftime('%Y-%m-%d %H:%M:%S')),
-    ]
-
-    # Draw Challan Details table
-    col_width_label = 60 # Width for labels
-    col_width_value = 130 # Width for values
-    row_height = 7
-
-    for label, value in challan_data:
-        pdf.cell(col_width_label, row_height, label, 1, 0, 'L')
-        pdf.cell(col_width_value, row_height, str(value), 1, 1, 'L')
-
-    pdf.ln(10)
-
-    # Violator and Vehicle Details Section
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 8, "Violator and Vehicle Details:", 0, 1, 'L')
-    pdf.set_font("Arial", size=10)
-    pdf.ln(2)
-
-    violator_vehicle_data = [
-        ("Violator Name:", challan['owner_name']),
-        ("Violator Phone:", challan['owner_phone']),
-        ("Vehicle Type:", challan['vehicle_type']),
-        ("Vehicle Number:", challan['vehicle_number']),
-        ("Vehicle State:", challan.get('state', 'N/A')),
-    ]
-
-    # Draw Violator and Vehicle Details table
-    for label, value in violator_vehicle_data:
-        pdf.cell(col_width_label, row_height, label, 1, 0, 'L')
-        pdf.cell(col_width_value, row_height, str(value), 1, 1, 'L')
-
-    pdf.ln(10)
-
-    # Payment Summary Section
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 8, "Payment Summary:", 0, 1, 'L')
-    pdf.set_font("Arial", size=10)
-    pdf.ln(2)
-
-    pdf.cell(col_width_label, row_height, "Amount Paid:", 1, 0, 'L')
-    pdf.cell(col_width_value, row_height, f"Rs. {challan.get('fine_amount', 0)}", 1, 1, 'L')
-    pdf.cell(col_width_label, row_height, "Payment Status:", 1, 0, 'L')
-    pdf.cell(col_width_value, row_height, challan['status'].upper(), 1, 1, 'L')
-    pdf.cell(col_width_label, row_height, "Payment Date:", 1, 0, 'L')
-    pdf.cell(col_width_value, row_height, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), 1, 1, 'L') # Use current time for payment date
-
-    pdf.ln(15)
-
-    # Footer/Thank you message
-    pdf.set_font("Arial", 'B', 12)
-    pdf.cell(0, 10, "Thank you for your payment.", 0, 1, 'C')
-    pdf.ln(5)
-    pdf.set_font("Arial", size=8)
-    pdf.cell(0, 5, "This is an electronically generated receipt and does not require a signature.", 0, 1, 'C')
-
-
-    # Output PDF
-    response = Response(pdf.output(dest='S').encode('latin-1'), mimetype='application/pdf')
-    response.headers['Content-Disposition'] = f'attachment; filename=challan_receipt_{challan_id}.pdf'
-    return response
+    return _challan_pdf_response(challan, 'paid')
+
+@app.route('/api/challan_pdf_jobs', methods=['POST'])
+def api_submit_challan_pdf_job():
+    """
+    Queues a bulk PDF job and returns 202 with its id right away; rendering runs in the background.
+    Body: {"kind": "pending"|"paid", "format": "zip"|"pdf", "area": ..., "start": ..., "end": ...}
+    renders every pending challan (or paid receipt) of the area and/or ISO date range as a ZIP
+    of single PDFs or one merged PDF. Poll /api/challan_pdf_jobs/<job_id> for progress.
+    """
+    if not session.get('logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    data = request.get_json(silent=True) or {}
+    try:
+        job_id = pdf_jobs.submit(data.get('kind', 'pending'), data.get('format', 'zip'),
+                                 data.get('area'), data.get('start'), data.get('end'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"success": True, "job_id": job_id,
+                    "status_url": url_for('api_challan_pdf_job', job_id=job_id)}), 202
+
+@app.route('/api/challan_pdf_jobs/<job_id>')
+def api_challan_pdf_job(job_id):
+    """
+    API endpoint reporting a bulk PDF job's state ('queued', 'running', 'done' or 'failed'),
+    rendered/total counts and progress; includes the download URL once the file is ready.
+    """
+    if not session.get('logged_in'):
+        return jsonify({"error": "Unauthorized"}), 401
+
+    job = pdf_jobs.get_status(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    if job['has_output']:
+        job['download_url'] = url_for('download_challan_pdf_job', job_id=job_id)
+    return jsonify(job)
+
+@app.route('/api/challan_pdf_jobs/<job_id>/download')
+def download_challan_pdf_job(job_id):
+    """
+    Serves the merged PDF or ZIP of a finished bulk PDF job.
+    """
+    if not session.get('logged_in'):
+        return "Unauthorized", 401
+
+    job = database.get_pdf_job(job_id)
+    if job is None:
+        return "Job not found.", 404
+    if job['state'] != 'done':
+        return f"Job is {job['state']}.", 409
+    if not job['path'] or not os.path.exists(job['path']):
+        return "No challans matched this job.", 404
+    return send_file(job['path'], mimetype=pdf_jobs.OUTPUT_FORMATS[job['format']][0], as_attachment=True,
+                     download_name=os.path.basename(job['path']))
 
 
 if __name__ == '__main__':
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    create_app().run(debug=True, host='0.0.0.0', port=5000)
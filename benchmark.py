@@ -0,0 +1,1365 @@
+"""
+Offline benchmarks for the traffic management backend.
+
+Every benchmark runs against a throwaway SQLite file (never traffic_data.db)
+and prints a JSON report so results can be compared release to release.
+
+Usage:
+    python benchmark.py connections [--iterations 2000]
+    python benchmark.py history [--iterations 2000] [--ticks 5000]
+    python benchmark.py ingest [--calls 20000]
+    python benchmark.py stream [--viewers 100] [--ticks 100]
+    python benchmark.py rollups [--days 7] [--iterations 20]
+    python benchmark.py schema [--rows 2000000] [--iterations 200]
+    python benchmark.py cache [--iterations 20000]
+    python benchmark.py simulate [--areas 300] [--ticks 200]
+    python benchmark.py lane_state [--lanes 10000] [--ticks 50]
+    python benchmark.py green_lanes [--areas 2500] [--ticks 200]
+    python benchmark.py signals [--areas 500] [--ticks 500] [--tick-interval 3]
+    python benchmark.py registry [--vehicles 1000000] [--iterations 20000]
+    python benchmark.py challan_io [--rows 200000] [--single-rows 5000]
+    python benchmark.py status_batch [--updates 50000] [--single-updates 5000]
+    python benchmark.py pdf [--challans 2000] [--downloads 20000]
+    python benchmark.py pdf_jobs [--challans 20000] [--max-workers <cpu count>]
+    python benchmark.py polling [--dashboards 20] [--minutes 10] [--challans 2000]
+    python benchmark.py json [--iterations 20000]
+    python benchmark.py startup [--runs 9]
+    python benchmark.py alerts [--areas 500] [--lanes 4] [--ticks 1200] [--tick-interval 3]
+    python benchmark.py pipeline [--areas 12] [--lanes 4] [--ticks 500] [--violation-rate 0.05]
+                                 [--seed 42] [--signals webster] [--tick-interval 3]
+"""
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import alerts
+import database
+import engine
+import signal_controller
+import traffic_data
+import vehicle_registry
+
+BENCH_AREA = "Sayajigunj"
+
+
+@contextlib.contextmanager
+def temp_database():
+    """Points database.DATABASE_FILE at a fresh temporary file for the duration of a benchmark."""
+    original = database.DATABASE_FILE
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE_FILE = os.path.join(tmp, 'bench.db')
+        try:
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                database.init_db()
+            yield database.DATABASE_FILE
+        finally:
+            database.shutdown_traffic_log_writer()
+            database.close_all_connections()
+            database.DATABASE_FILE = original
+
+
+# traffic_logs and alert_thresholds as they were before schema v2, with the indexes they had then
+LEGACY_SCHEMA = (
+    '''CREATE TABLE traffic_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        area_name TEXT NOT NULL,
+        lane_id TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        two_wheelers INTEGER,
+        four_wheelers INTEGER,
+        density INTEGER
+    )''',
+    "CREATE TABLE alert_thresholds (area_name TEXT PRIMARY KEY, max_density INTEGER NOT NULL DEFAULT 150)",
+    "CREATE INDEX idx_traffic_logs_area_lane_ts ON traffic_logs (area_name, lane_id, timestamp, density)",
+    "CREATE INDEX idx_traffic_logs_area_ts_lane ON traffic_logs (area_name, timestamp, lane_id, density)",
+)
+
+
+@contextlib.contextmanager
+def legacy_database():
+    """Yields the path of a throwaway SQLite file with the pre-v2 LEGACY_SCHEMA."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'legacy.db')
+        conn = sqlite3.connect(path)
+        for statement in LEGACY_SCHEMA:
+            conn.execute(statement)
+        conn.commit()
+        conn.close()
+        yield path
+
+
+def percentile(samples, pct):
+    """Returns the pct-th percentile (0-100) of samples using nearest-rank."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def summarize(samples, elapsed):
+    """Builds the latency/throughput summary shared by all benchmarks (latencies in ms)."""
+    return {
+        'count': len(samples),
+        'ops_per_sec': round(len(samples) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 4) if samples else 0.0,
+        'p50_ms': round(percentile(samples, 50) * 1000, 4),
+        'p95_ms': round(percentile(samples, 95) * 1000, 4),
+        'p99_ms': round(percentile(samples, 99) * 1000, 4),
+    }
+
+
+def _timed_each(fn, items):
+    """Calls fn(item) for each item and returns (per-call latencies, total elapsed seconds)."""
+    samples = []
+    start = time.perf_counter()
+    for item in items:
+        t0 = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - t0)
+    return samples, time.perf_counter() - start
+
+
+def _timed(fn, iterations):
+    """Calls fn() iterations times and returns (per-call latencies, total elapsed seconds)."""
+    samples = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return samples, time.perf_counter() - start
+
+
+# --- Connection pool benchmark ---
+
+def _legacy_poll(database_file, area_name, lanes_info):
+    """One dashboard poll the way database.py used to do it: a fresh connection per call."""
+    conn = sqlite3.connect(database_file)
+    conn.execute("SELECT max_density FROM alert_thresholds WHERE area_name = ?", (area_name,)).fetchone()
+    conn.close()
+
+    conn = sqlite3.connect(database_file)
+    timestamp = datetime.now().isoformat()
+    for lane_id, data in lanes_info.items():
+        conn.execute('''
+            INSERT INTO traffic_logs (area_name, lane_id, timestamp, two_wheelers, four_wheelers, density)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', (area_name, lane_id, timestamp, data['two_wheelers'], data['four_wheelers'], data['density']))
+    conn.commit()
+    conn.close()
+
+    for lane_id in lanes_info:
+        conn = sqlite3.connect(database_file)
+        conn.execute("SELECT timestamp, density FROM traffic_logs WHERE area_name = ? AND lane_id = ? ORDER BY timestamp DESC LIMIT ?",
+                     (area_name, lane_id, 30)).fetchall()
+        conn.close()
+
+
+def _pooled_poll(area_name, lanes_info):
+    """The same dashboard poll through database.py's pooled connection."""
+    database.get_alert_threshold(area_name)
+    database.log_traffic_data(area_name, lanes_info)
+    for lane_id in lanes_info:
+        database.get_historical_traffic_data(area_name, lane_id=lane_id, limit=30)
+
+
+def bench_connections(iterations):
+    """Compares per-call sqlite3.connect() against the pooled connection layer on a dashboard poll mix."""
+    lanes_info, _ = traffic_data.simulate_traffic_data(BENCH_AREA)
+    report = {'benchmark': 'connections', 'iterations': iterations}
+
+    with legacy_database() as db_file:
+        samples, elapsed = _timed(lambda: _legacy_poll(db_file, BENCH_AREA, lanes_info), iterations)
+        report['before'] = summarize(samples, elapsed)
+
+    with temp_database():
+        samples, elapsed = _timed(lambda: _pooled_poll(BENCH_AREA, lanes_info), iterations)
+        report['after'] = summarize(samples, elapsed)
+
+    report['speedup'] = round(report['before']['mean_ms'] / report['after']['mean_ms'], 2)
+    return report
+
+
+# --- Multi-lane history benchmark ---
+
+def bench_history(iterations, ticks):
+    """Compares one history query per lane against the single UNION ALL statement of per-lane seeks."""
+    lanes = traffic_data.AREAS[BENCH_AREA]
+    report = {'benchmark': 'history', 'iterations': iterations, 'ticks': ticks, 'lanes': len(lanes)}
+
+    with temp_database():
+        for _ in range(ticks):
+            lanes_info, _ = traffic_data.simulate_traffic_data(BENCH_AREA)
+            database.log_traffic_data(BENCH_AREA, lanes_info)
+        database.flush_traffic_logs()
+
+        def per_lane():
+            for lane_id in lanes:
+                database.get_historical_traffic_data(BENCH_AREA, lane_id=lane_id, limit=30)
+
+        samples, elapsed = _timed(per_lane, iterations)
+        report['before'] = summarize(samples, elapsed)
+        samples, elapsed = _timed(lambda: database.get_area_historical_traffic_data(BENCH_AREA, lanes, limit=30), iterations)
+        report['after'] = summarize(samples, elapsed)
+
+    report['speedup'] = round(report['before']['mean_ms'] / report['after']['mean_ms'], 2)
+    return report
+
+
+# --- Write-behind ingestion benchmark ---
+
+def _area_samples(count):
+    """Pre-simulates count (area_name, lanes_info) samples cycling through every area."""
+    areas = traffic_data.get_available_areas()
+    return [(areas[i % len(areas)], traffic_data.simulate_traffic_data(areas[i % len(areas)])[0]) for i in range(count)]
+
+
+def bench_ingest(calls):
+    """Sustained traffic_logs rows/sec: one commit per log call vs the batched background writer."""
+    samples = _area_samples(calls)
+    rows = sum(len(lanes_info) for _, lanes_info in samples)
+    report = {'benchmark': 'ingest', 'calls': calls, 'rows': rows}
+
+    def rows_for(area_name, lanes_info):
+        ts_ms = database._to_epoch_ms(datetime.now())
+        return [(area_name, lane_id, ts_ms, d['two_wheelers'], d['four_wheelers'], d['density'])
+                for lane_id, d in lanes_info.items()]
+
+    with temp_database():
+        latencies, elapsed = _timed_each(lambda s: database._insert_traffic_logs(rows_for(*s)), samples)
+        report['before'] = dict(summarize(latencies, elapsed), rows_per_sec=round(rows / elapsed, 1))
+
+    with temp_database():
+        start = time.perf_counter()
+        latencies, _ = _timed_each(lambda s: database.log_traffic_data(*s), samples)
+        database.flush_traffic_logs()
+        elapsed = time.perf_counter() - start
+        report['after'] = dict(summarize(latencies, elapsed), rows_per_sec=round(rows / elapsed, 1))
+
+    report['speedup'] = round(report['after']['rows_per_sec'] / report['before']['rows_per_sec'], 2)
+    return report
+
+
+# --- Polling vs push stream benchmark ---
+
+# The dashboard's polling mix: endpoint -> seconds between polls per viewer
+POLL_INTERVALS = {'traffic_data': 3.0, 'historical_traffic_data': 10.0, 'challans': 15.0}
+
+
+def bench_stream(viewers, ticks):
+    """
+    Models `viewers` dashboards on one area: requests/sec and response-body bytes/sec
+    for the setInterval polling mix vs one Server-Sent Events stream each.
+    HTTP headers and cookies are not counted, which understates polling's cost.
+    """
+    import engine
+    import stream
+
+    report = {'benchmark': 'stream', 'viewers': viewers, 'ticks': ticks, 'tick_interval_s': engine.TICK_INTERVAL}
+    with temp_database():
+        traffic_engine = engine.TrafficEngine(areas=[BENCH_AREA])
+        lanes = traffic_data.AREAS[BENCH_AREA]
+        poll_bytes = {name: [] for name in POLL_INTERVALS}
+        event_bytes = []
+        traffic_engine.tick()
+        previous = traffic_engine.snapshot(BENCH_AREA)
+        for _ in range(ticks):
+            traffic_engine.tick()
+            current = traffic_engine.snapshot(BENCH_AREA)
+            database.flush_traffic_logs()
+            poll_bytes['traffic_data'].append(len(current.payload_json))
+            history = database.get_area_historical_traffic_data(BENCH_AREA, lanes, limit=30)
+            poll_bytes['historical_traffic_data'].append(len(json.dumps(history)))
+            poll_bytes['challans'].append(len(json.dumps(database.get_challans(BENCH_AREA, status='pending'))))
+            new_challans = traffic_engine.challans_since(BENCH_AREA, previous.version)
+            event_bytes.append(sum(len(message.encode('utf-8'))
+                                   for message in stream.diff_events(previous, current, new_challans)))
+            previous = current
+
+    poll_rps = sum(viewers / interval for interval in POLL_INTERVALS.values())
+    poll_bps = sum(viewers * (sum(sizes) / len(sizes)) / POLL_INTERVALS[name] for name, sizes in poll_bytes.items())
+    report['polling'] = {'requests_per_sec': round(poll_rps, 1), 'bytes_per_sec': round(poll_bps)}
+    report['stream'] = {
+        'requests_per_sec': 0.0, # One long-lived request per viewer
+        'open_connections': viewers,
+        'bytes_per_sec': round(viewers * (sum(event_bytes) / len(event_bytes)) / engine.TICK_INTERVAL),
+    }
+    report['bytes_reduction'] = round(1 - report['stream']['bytes_per_sec'] / report['polling']['bytes_per_sec'], 3)
+    return report
+
+
+# --- Rollup history benchmark ---
+
+def _synthetic_rows(area_name, start, days, interval_s, rng, iso=False):
+    """
+    Yields batches of traffic log rows for area_name, one sample per lane every interval_s.
+    Timestamps are epoch milliseconds as queued for the writer, or v1 ISO strings with iso=True.
+    """
+    lanes = traffic_data.AREAS[area_name]
+    ticks = int(days * 86400 / interval_s)
+    batch = []
+    for i in range(ticks):
+        moment = start + timedelta(seconds=i * interval_s)
+        timestamp = moment.isoformat() if iso else database._to_epoch_ms(moment)
+        for lane_id in lanes:
+            two, four = rng.randint(10, 80), rng.randint(5, 60)
+            batch.append((area_name, lane_id, timestamp, two, four, traffic_data.calculate_lane_density(two, four)))
+        if len(batch) >= 20000:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def bench_rollups(days, iterations):
+    """Week/month-style range queries: raw rows vs the tier chosen by 'auto' resolution."""
+    import random
+    rng = random.Random(42)
+    lanes = traffic_data.AREAS[BENCH_AREA]
+    end = datetime.now().replace(microsecond=0)
+    start = end - timedelta(days=days)
+    report = {'benchmark': 'rollups', 'days': days, 'iterations': iterations}
+
+    with temp_database():
+        rows = 0
+        for batch in _synthetic_rows(BENCH_AREA, start, days, 3.0, rng):
+            database._insert_traffic_logs(batch)
+            rows += len(batch)
+        report['raw_rows'] = rows
+        for label, resolution in (('raw', 'raw'), ('auto', 'auto')):
+            result = {}
+            samples, elapsed = _timed(lambda: result.update(
+                zip(('resolution', 'lanes'), database.get_traffic_history(BENCH_AREA, lanes, start, end, resolution))),
+                iterations)
+            report[label] = dict(summarize(samples, elapsed), resolution=result['resolution'],
+                                 points_per_lane=len(result['lanes'][lanes[0]]['timestamps']))
+    report['speedup'] = round(report['raw']['mean_ms'] / report['auto']['mean_ms'], 1)
+    return report
+
+
+# --- Schema v2 benchmark ---
+
+# The same reads against each schema: (v1 SQL, v2 SQL).
+SCHEMA_QUERIES = {
+    'lane_history': (
+        "SELECT timestamp, density FROM traffic_logs WHERE area_name = ? AND lane_id = ? ORDER BY timestamp DESC LIMIT 30",
+        "SELECT ts_ms, density FROM traffic_logs WHERE lane_id = ? ORDER BY ts_ms DESC LIMIT 30",
+    ),
+    'raw_range_30min': (
+        "SELECT lane_id, timestamp, density FROM traffic_logs WHERE area_name = ? AND timestamp >= ? AND timestamp <= ? ORDER BY timestamp",
+        "SELECT lane_id, ts_ms, density FROM traffic_logs WHERE area_id = ? AND ts_ms >= ? AND ts_ms <= ? ORDER BY ts_ms",
+    ),
+    'day_average': (
+        "SELECT COUNT(*), AVG(density) FROM traffic_logs WHERE area_name = ? AND timestamp >= ? AND timestamp < ?",
+        "SELECT COUNT(*), AVG(density) FROM traffic_logs WHERE area_id = ? AND ts_ms >= ? AND ts_ms < ?",
+    ),
+}
+LEGACY_INSERT_SQL = '''
+    INSERT INTO traffic_logs (area_name, lane_id, timestamp, two_wheelers, four_wheelers, density)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+
+def _time_queries(conn, version, params, iterations):
+    """Times every SCHEMA_QUERIES entry for schema version (0 or 1) with params[name] as its parameters."""
+    report = {}
+    for name, queries in SCHEMA_QUERIES.items():
+        sql, args = queries[version], params[name]
+        samples, elapsed = _timed(lambda: conn.execute(sql, args).fetchall(), iterations)
+        report[name] = summarize(samples, elapsed)
+    return report
+
+
+def bench_schema(rows, iterations):
+    """
+    DB size and read latency of the v1 text traffic_logs vs schema v2 for `rows` synthetic
+    samples spread over every area; the file is converted in place by migrate.py.
+    """
+    import random
+    import migrate
+
+    rng = random.Random(42)
+    areas = traffic_data.get_available_areas()
+    interval_s = 3.0
+    days = rows / sum(len(traffic_data.AREAS[area_name]) for area_name in areas) * interval_s / 86400
+    start = datetime(2024, 1, 1, 0, 0, 0, 123456) # Microseconds, like datetime.now().isoformat() wrote
+    lane_name = traffic_data.AREAS[BENCH_AREA][0]
+    mid = start + timedelta(days=days / 2)
+    window = (mid, mid + timedelta(minutes=30))
+    day = (mid - timedelta(hours=12), mid + timedelta(hours=12))
+    report = {'benchmark': 'schema', 'rows': rows, 'days': round(days, 2), 'iterations': iterations}
+
+    with legacy_database() as db_file:
+        conn = sqlite3.connect(db_file)
+        for area_name in areas:
+            for batch in _synthetic_rows(area_name, start, days, interval_s, rng, iso=True):
+                conn.executemany(LEGACY_INSERT_SQL, batch)
+        conn.commit()
+        conn.execute("VACUUM")
+        report['before'] = {'bytes': os.path.getsize(db_file), 'queries': _time_queries(conn, 0, {
+            'lane_history': (BENCH_AREA, lane_name),
+            'raw_range_30min': (BENCH_AREA, window[0].isoformat(), window[1].isoformat()),
+            'day_average': (BENCH_AREA, day[0].isoformat(), day[1].isoformat()),
+        }, iterations)}
+        conn.close()
+
+        migration = migrate.migrate(db_file)
+        report['migrate_seconds'] = migration['migrate_seconds']
+
+        conn = sqlite3.connect(db_file)
+        area_id = conn.execute("SELECT id FROM areas WHERE name = ?", (BENCH_AREA,)).fetchone()[0]
+        lane_key = conn.execute("SELECT id FROM lanes WHERE area_id = ? AND name = ?", (area_id, lane_name)).fetchone()[0]
+        report['after'] = {'bytes': migration['bytes_after'], 'queries': _time_queries(conn, 1, {
+            'lane_history': (lane_key,),
+            'raw_range_30min': (area_id, database._to_epoch_ms(window[0]), database._to_epoch_ms(window[1])),
+            'day_average': (area_id, database._to_epoch_ms(day[0]), database._to_epoch_ms(day[1])),
+        }, iterations)}
+        conn.close()
+
+    report['bytes_reduction'] = round(1 - report['after']['bytes'] / report['before']['bytes'], 3)
+    report['speedup'] = {name: round(report['before']['queries'][name]['mean_ms']
+                                     / report['after']['queries'][name]['mean_ms'], 2) for name in SCHEMA_QUERIES}
+    return report
+
+
+# --- Read cache benchmark ---
+
+def bench_cache(iterations):
+    """Alert threshold and challan-by-id lookups with the read caches disabled (TTL 0) vs enabled."""
+    report = {'benchmark': 'cache', 'iterations': iterations}
+    caches = (database._threshold_cache, database._challan_cache)
+    ttls = [cache.ttl for cache in caches]
+    with temp_database():
+        challan_ids = [row[0] for row in database.get_connection().execute("SELECT id FROM challans")]
+        lookups = {
+            'alert_threshold': lambda: database.get_alert_threshold(BENCH_AREA),
+            'challan_by_id': lambda: database.get_challan_by_id(challan_ids[0]),
+        }
+        try:
+            for label, ttl in (('before', 0.0), ('after', None)):
+                for cache, default in zip(caches, ttls):
+                    cache.ttl = default if ttl is None else ttl
+                    cache.clear()
+                report[label] = {name: summarize(*_timed(lookup, iterations)) for name, lookup in lookups.items()}
+            report['stats'] = database.get_cache_stats()
+        finally:
+            for cache, default in zip(caches, ttls):
+                cache.ttl = default
+    report['speedup'] = {name: round(report['before'][name]['mean_ms'] / report['after'][name]['mean_ms'], 2)
+                         for name in report['before']}
+    return report
+
+
+# --- Batched simulation benchmark ---
+
+def synthetic_areas(count, lanes_per_area=4):
+    """Returns an AREAS-shaped mapping of count synthetic junctions."""
+    return {f"Junction {i:04d}": [f"Lane {lane + 1}" for lane in range(lanes_per_area)] for i in range(count)}
+
+
+def bench_simulate(areas, ticks):
+    """Ticks/sec for `areas` 4-lane junctions: per-area simulate_traffic_data() vs one TrafficSimulator pass."""
+    from unittest import mock
+
+    layout = synthetic_areas(areas)
+    report = {'benchmark': 'simulate', 'areas': areas, 'lanes': sum(map(len, layout.values())), 'ticks': ticks}
+
+    with mock.patch.dict(traffic_data.AREAS, layout, clear=True):
+        samples, elapsed = _timed(lambda: [traffic_data.simulate_traffic_data(area_name) for area_name in layout], ticks)
+    report['before'] = summarize(samples, elapsed)
+
+    simulator = traffic_data.TrafficSimulator(layout, seed=42)
+    samples, elapsed = _timed(simulator.simulate, ticks)
+    report['after_arrays'] = summarize(samples, elapsed)
+
+    def simulate_with_views():
+        batch = simulator.simulate()
+        return [batch.result(area_name) for area_name in layout]
+
+    samples, elapsed = _timed(simulate_with_views, ticks)
+    report['after_dict_views'] = summarize(samples, elapsed)
+
+    report['speedup'] = {label: round(report['before']['mean_ms'] / report[label]['mean_ms'], 2)
+                         for label in ('after_arrays', 'after_dict_views')}
+    return report
+
+
+# --- Lane state memory benchmark ---
+
+def _publish_dicts(batch, areas):
+    """One publish of every area the pre-AreaState way: per-lane dicts, proxies and json.dumps."""
+    from types import MappingProxyType
+    published = {}
+    for area_name in areas:
+        lanes_info = batch.area_view(area_name)
+        green = traffic_data.determine_green_lane(lanes_info)
+        for lane_id, data in lanes_info.items():
+            data['signal_status'] = 'GREEN' if lane_id == green else 'RED'
+        frozen = MappingProxyType({lane_id: MappingProxyType(dict(data)) for lane_id, data in lanes_info.items()})
+        payload = {'lanes_info': lanes_info, 'lane_labels': tuple(lanes_info.keys()),
+                   'lane_densities': tuple(data['density'] for data in lanes_info.values())}
+        published[area_name] = (frozen, json.dumps(payload).encode('utf-8'))
+    return published
+
+
+def _publish_states(batch, states):
+    """The same publish through reused AreaStates: refill in place, freeze, write JSON directly."""
+    published = {}
+    for area_name, state in states.items():
+        batch.fill(state)
+        state.set_green_lane(traffic_data.determine_green_lane(state))
+        frozen = state.freeze()
+        payload = json.dumps({'lane_labels': frozen.lane_ids, 'lane_densities': frozen.density})
+        published[area_name] = (frozen, ('{"lanes_info": ' + frozen.to_json() + ', ' + payload[1:]).encode('utf-8'))
+    return published
+
+
+def bench_lane_state(lanes, ticks):
+    """
+    Time, memory and allocations per tick at `lanes` lanes (4 per junction): per-lane dicts vs
+    AreaState. retained_bytes/blocks are what the latest published states keep alive between ticks.
+    """
+    import tracemalloc
+
+    layout = synthetic_areas(lanes // 4)
+    simulator = traffic_data.TrafficSimulator(layout, seed=42)
+    batches = [simulator.simulate() for _ in range(ticks)]
+    report = {'benchmark': 'lane_state', 'lanes': len(simulator.lane_ids), 'ticks': ticks}
+    states = simulator.area_states()
+    runs = {'before': lambda batch: _publish_dicts(batch, layout), 'after': lambda batch: _publish_states(batch, states)}
+
+    for label, publish in runs.items():
+        samples, elapsed = _timed_each(publish, batches) # Untraced, so timings exclude tracemalloc overhead
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        published, peaks = None, []
+        for batch in batches:
+            tracemalloc.reset_peak()
+            published = publish(batch)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        snapshot = tracemalloc.take_snapshot()
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+        blocks = sum(stat.count for stat in snapshot.statistics('filename'))
+        report[label] = dict(summarize(samples, elapsed), retained_bytes=retained,
+                             retained_blocks=blocks, peak_tick_bytes=max(peaks))
+        del published, snapshot
+
+    report['retained_reduction'] = round(1 - report['after']['retained_bytes'] / report['before']['retained_bytes'], 3)
+    report['speedup'] = round(report['before']['mean_ms'] / report['after']['mean_ms'], 2)
+    return report
+
+
+# --- Signal decision benchmark ---
+
+def bench_green_lanes(areas, ticks):
+    """Per-area determine_green_lane() over lane dicts vs one determine_green_lanes() pass per tick."""
+    layout = synthetic_areas(areas)
+    simulator = traffic_data.TrafficSimulator(layout, seed=42)
+    batches = [simulator.simulate() for _ in range(ticks)]
+    views = [[batch.area_view(area_name) for area_name in layout] for batch in batches] # Built outside the timing
+    report = {'benchmark': 'green_lanes', 'areas': areas, 'lanes': len(simulator.lane_ids), 'ticks': ticks}
+
+    decisions = {}
+    samples, elapsed = _timed_each(
+        lambda i: decisions.__setitem__(('before', i), [traffic_data.determine_green_lane(v) for v in views[i]]),
+        range(ticks))
+    report['before'] = summarize(samples, elapsed)
+    samples, elapsed = _timed_each(
+        lambda i: decisions.__setitem__(('after', i), traffic_data.determine_green_lanes(batches[i])), range(ticks))
+    report['after'] = summarize(samples, elapsed)
+
+    report['identical_decisions'] = all(decisions[('before', i)] == decisions[('after', i)] for i in range(ticks))
+    report['speedup'] = round(report['before']['mean_ms'] / report['after']['mean_ms'], 2)
+    return report
+
+
+def bench_signals(areas, ticks, tick_interval):
+    """Greedy per-tick green decisions vs the adaptive SignalController, per timing mode."""
+    layout = synthetic_areas(areas)
+    simulator = traffic_data.TrafficSimulator(layout, seed=42)
+    batches = [simulator.simulate() for _ in range(ticks)]
+    report = {'benchmark': 'signals', 'areas': areas, 'lanes': len(simulator.lane_ids), 'ticks': ticks,
+              'tick_interval': tick_interval}
+
+    samples, elapsed = _timed_each(lambda i: traffic_data.determine_green_lanes(batches[i]), range(ticks))
+    report['greedy'] = summarize(samples, elapsed)
+    for mode in signal_controller.TIMING_MODES:
+        controller = signal_controller.SignalController(simulator, mode)
+        samples, elapsed = _timed_each(lambda i: controller.update(batches[i], i * tick_interval), range(ticks))
+        report[mode] = summarize(samples, elapsed)
+        report[mode]['preemptions'] = controller.preemptions
+        schedule_start = time.perf_counter()
+        schedules = [controller.schedule(area_name, ticks * tick_interval) for area_name in layout]
+        report[mode]['schedule_ms_per_area'] = round((time.perf_counter() - schedule_start) * 1000 / areas, 4)
+        report[mode]['mean_cycle_seconds'] = round(sum(s['cycle_length'] for s in schedules) / areas, 1)
+    return report
+
+
+# --- Vehicle registry benchmark ---
+
+def _synthetic_vehicles(count, seed=42):
+    """Yields count registrations with random GJ plates (duplicates collapse in the registry)."""
+    rng = random.Random(seed)
+    for i in range(count):
+        yield {
+            'rc_number': traffic_data.generate_random_vehicle_number(rng),
+            'name': f"Owner {i}",
+            'phone': f"9{rng.randint(0, 999999999):09d}",
+            'vehicle_type': rng.choice(("Car", "Motorcycle", "Scooter", "Truck")),
+        }
+
+
+def bench_registry(vehicles, iterations):
+    """
+    Load time and lookup latency for `vehicles` registrations: exact RC lookups and
+    partial-plate prefix searches, linear scans over a list of dicts (the
+    DUMMY_PEOPLE_VEHICLES shape) vs the VehicleRegistry indexes.
+    """
+    import csv
+    import tracemalloc
+
+    report = {'benchmark': 'registry', 'vehicles': vehicles, 'iterations': iterations}
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, db_path = os.path.join(tmp, 'vehicles.csv'), os.path.join(tmp, 'vehicles.db')
+        with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=vehicle_registry.FIELDS)
+            writer.writeheader()
+            writer.writerows(_synthetic_vehicles(vehicles))
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE vehicles (rc_number TEXT, name TEXT, phone TEXT, vehicle_type TEXT)")
+        conn.executemany("INSERT INTO vehicles VALUES (:rc_number, :name, :phone, :vehicle_type)",
+                         _synthetic_vehicles(vehicles))
+        conn.commit()
+        conn.close()
+
+        report['load'] = {}
+        for label, path in (('csv', csv_path), ('sqlite', db_path)):
+            start = time.perf_counter()
+            registry = vehicle_registry.VehicleRegistry.from_file(path)
+            elapsed = time.perf_counter() - start
+            report['load'][label] = {'seconds': round(elapsed, 2), 'rows_per_sec': round(vehicles / elapsed, 1),
+                                     'file_bytes': os.path.getsize(path)}
+        del registry
+        tracemalloc.start()
+        registry = vehicle_registry.VehicleRegistry.from_file(db_path)
+        report['load']['registry_bytes'] = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        report['load']['unique_vehicles'] = len(registry)
+        listed = list(vehicle_registry.iter_csv(csv_path))
+
+    rng = random.Random(7)
+    hits = [listed[rng.randrange(len(listed))]['rc_number'] for _ in range(iterations)]
+    misses = [f"MH{rng.randint(10, 99)}ZZ{rng.randint(1000, 9999)}" for _ in range(iterations)]
+    prefixes = [rc[:6] for rc in hits] # State + district + series, e.g. GJ06AB
+
+    def scan_exact(rc_number):
+        return next((v for v in listed if v['rc_number'] == rc_number), None)
+
+    def scan_prefix(prefix):
+        return [v for v in listed if v['rc_number'].startswith(prefix)][:vehicle_registry.MAX_PREFIX_RESULTS]
+
+    scans = max(1, min(iterations, 20)) # The linear scans are O(n); a few calls are enough
+    for label, items, before, after in (('exact_hit', hits, scan_exact, registry.get),
+                                        ('exact_miss', misses, scan_exact, registry.get),
+                                        ('prefix', prefixes, scan_prefix, registry.search_prefix)):
+        samples, elapsed = _timed_each(before, items[:scans])
+        report[f'{label}_before'] = summarize(samples, elapsed)
+        samples, elapsed = _timed_each(after, items)
+        report[f'{label}_after'] = summarize(samples, elapsed)
+        report[f'{label}_speedup'] = round(report[f'{label}_before']['mean_ms'] / report[f'{label}_after']['mean_ms'], 1)
+    report['prefix_matches_scan'] = all(
+        sorted({v['rc_number'] for v in listed if v['rc_number'].startswith(p)})[:vehicle_registry.MAX_PREFIX_RESULTS]
+        == [v['rc_number'] for v in registry.search_prefix(p)] for p in prefixes[:scans])
+    return report
+
+
+# --- Bulk challan export/import benchmark ---
+
+def _synthetic_challans(count, seed=42):
+    """Yields count challan mappings for BENCH_AREA, the way the field cameras would send them."""
+    rng = random.Random(seed)
+    lanes = traffic_data.AREAS[BENCH_AREA]
+    for _ in range(count):
+        violation = traffic_data.simulate_violation(lanes, rng)
+        yield dict(violation, area_name=BENCH_AREA)
+
+
+def _traced_peak(fn):
+    """Runs fn() under tracemalloc and returns the peak bytes it allocated."""
+    import tracemalloc
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    fn()
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return peak
+
+
+def bench_challan_io(rows, single_rows):
+    """
+    rows/s and peak memory of bulk challan I/O. Import: one add_challan() per row (timed
+    over single_rows rows) vs database.add_challans(). Export: get_challans() + json.dumps
+    of the whole list vs the streaming CSV/NDJSON exporters, at rows and rows / 4 to show
+    whether memory grows with the export size.
+    """
+    import challan_io
+
+    challans = list(_synthetic_challans(rows))
+    report = {'benchmark': 'challan_io', 'rows': rows}
+    with temp_database():
+        conn = database.get_connection()
+        conn.execute("DELETE FROM challans")
+        conn.commit()
+        start = time.perf_counter()
+        for challan in challans[:single_rows]:
+            engine.record_violation(BENCH_AREA, challan)
+        elapsed = time.perf_counter() - start
+        report['import_before'] = {'rows': single_rows, 'rows_per_sec': round(single_rows / elapsed, 1)}
+        conn.execute("DELETE FROM challans")
+        conn.commit()
+
+        start = time.perf_counter()
+        inserted = database.add_challans(challans)
+        elapsed = time.perf_counter() - start
+        report['import_after'] = {'rows': inserted, 'rows_per_sec': round(inserted / elapsed, 1)}
+        report['import_speedup'] = round(report['import_after']['rows_per_sec'] /
+                                         report['import_before']['rows_per_sec'], 1)
+        del challans
+
+        exports = {
+            'before_list_json': lambda: json.dumps(database.get_challans(BENCH_AREA)),
+            'csv_stream': lambda: sum(map(len, challan_io.export_csv(database.iter_challans(BENCH_AREA)))),
+            'ndjson_stream': lambda: sum(map(len, challan_io.export_ndjson(database.iter_challans(BENCH_AREA)))),
+        }
+        for label, export in exports.items():
+            start = time.perf_counter()
+            export() # Untraced, so the rate excludes tracemalloc overhead
+            elapsed = time.perf_counter() - start
+            report[f'export_{label}'] = {
+                'rows_per_sec': round(inserted / elapsed, 1),
+                'peak_bytes': _traced_peak(export),
+            }
+        # Same exports over a quarter of the rows: constant-memory exporters keep the same peak
+        conn.execute("DELETE FROM challans WHERE id % 4 != 0")
+        conn.commit()
+        for label, export in exports.items():
+            report[f'export_{label}']['peak_bytes_quarter_rows'] = _traced_peak(export)
+    return report
+
+
+def bench_status_batch(updates, single_updates):
+    """
+    Challan status updates/s: one update_challan_status() commit per challan vs one
+    update_challan_statuses() batch, matched by id and by transaction_id (with and
+    without the transaction_id index).
+    """
+    report = {'benchmark': 'status_batch', 'updates': updates}
+    with temp_database():
+        conn = database.get_connection()
+        conn.execute("DELETE FROM challans")
+        conn.commit()
+        database.add_challans(_synthetic_challans(updates))
+        ids, transactions = zip(*conn.execute("SELECT id, transaction_id FROM challans ORDER BY id"))
+
+        def rate(count, elapsed):
+            return {'updates': count, 'seconds': round(elapsed, 3), 'updates_per_sec': round(count / elapsed, 1)}
+
+        start = time.perf_counter()
+        for challan_id in ids[:single_updates]:
+            database.update_challan_status(challan_id, 'paid')
+        report['before'] = rate(min(single_updates, updates), time.perf_counter() - start)
+
+        runs = (('after_by_id', 'challan_id', ids, 'disputed'),
+                ('after_by_transaction_id', 'transaction_id', transactions, 'paid'))
+        for label, key, values, status in runs:
+            batch = [{key: value, 'new_status': status} for value in values]
+            start = time.perf_counter()
+            results = database.update_challan_statuses(batch)
+            report[label] = rate(len(batch), time.perf_counter() - start)
+            report[label]['all_updated'] = all(result['result'] == 'updated' for result in results)
+
+        conn.execute("DROP INDEX idx_challans_transaction_id")
+        sample = [{'transaction_id': value, 'new_status': 'pending'} for value in transactions[:max(1, updates // 100)]]
+        start = time.perf_counter()
+        database.update_challan_statuses(sample)
+        report['after_by_transaction_id_unindexed'] = rate(len(sample), time.perf_counter() - start)
+
+    report['speedup_by_id'] = round(report['after_by_id']['updates_per_sec'] / report['before']['updates_per_sec'], 1)
+    return report
+
+
+# --- Challan PDF benchmark ---
+
+def bench_pdf(challans, iterations):
+    """
+    Challan PDF renders/s: full FPDF layout per download vs filling the pre-built
+    template, and cache hits for repeat downloads of `challans` distinct challans.
+    """
+    import challan_pdf
+    import re
+    import zlib
+
+    rng = random.Random(42)
+    now = datetime.now().isoformat()
+    documents = [dict(violation, id=i + 1, area_name=BENCH_AREA, timestamp=now, updated_at=now,
+                      status=rng.choice(('pending', 'paid')))
+                 for i, violation in enumerate(_synthetic_challans(challans))]
+    downloads = [documents[rng.randrange(challans)] for _ in range(iterations)]
+    report = {'benchmark': 'pdf', 'challans': challans, 'downloads': iterations}
+
+    samples, elapsed = _timed_each(lambda c: challan_pdf.render_fpdf(c, c['status']), downloads)
+    report['before'] = summarize(samples, elapsed)
+    template_fill = lambda c: challan_pdf._template(c['status']).fill(challan_pdf.field_values(c))
+    samples, elapsed = _timed_each(template_fill, downloads)
+    report['after_template'] = summarize(samples, elapsed)
+    challan_pdf._cache.clear()
+    samples, elapsed = _timed_each(lambda c: challan_pdf.render(c, c['status']), downloads)
+    report['after_cached'] = dict(summarize(samples, elapsed), cache=challan_pdf.get_cache_stats())
+
+    def page_content(pdf):
+        match = re.search(rb'/Length (\d+)>>\nstream\n', pdf)
+        return zlib.decompress(pdf[match.end():match.end() + int(match.group(1))])
+
+    report['identical_page_content'] = all(page_content(challan_pdf.render_fpdf(c, c['status'])) ==
+                                           page_content(template_fill(c)) for c in documents[:200])
+    report['speedup_template'] = round(report['before']['mean_ms'] / report['after_template']['mean_ms'], 1)
+    report['speedup_cached'] = round(report['before']['mean_ms'] / report['after_cached']['mean_ms'], 1)
+    return report
+
+
+def _warm_pdf_worker(kind):
+    """Runs in a render process: builds the kind's template there before the timed job."""
+    import challan_pdf
+
+    challan_pdf._template(kind)
+    return os.getpid()
+
+
+def _run_pdf_job(runner, kind, output_format):
+    """Submits a job on runner and waits for it; returns (submit seconds, job seconds, job row)."""
+    t0 = time.perf_counter()
+    job_id = runner.submit(kind, output_format)
+    submitted = time.perf_counter()
+    while True:
+        job = database.get_pdf_job(job_id)
+        if job['state'] in ('done', 'failed'):
+            return submitted - t0, time.perf_counter() - t0, job
+        time.sleep(0.01)
+
+
+def bench_pdf_jobs(challans, max_workers):
+    """
+    Pages/s of bulk PDF jobs over `challans` pending challans, rendered in the
+    coordinator thread (workers=0) and on process pools of 1, 2, 4, ... max_workers,
+    for both the ZIP and the merged-PDF output.
+    """
+    import pdf_jobs
+
+    worker_counts = [0] + [n for n in (1, 2, 4, 8, 16, 32, 64) if n < max_workers] + [max_workers]
+    report = {'benchmark': 'pdf_jobs', 'challans': challans, 'cpu_count': os.cpu_count(), 'runs': []}
+    with temp_database() as path, tempfile.TemporaryDirectory() as output_dir:
+        database.get_connection().execute("DELETE FROM challans")
+        database.get_connection().commit()
+        database.add_challans(dict(c, status='pending') for c in _synthetic_challans(challans))
+        for output_format in pdf_jobs.OUTPUT_FORMATS:
+            for workers in sorted(set(worker_counts)):
+                runner = pdf_jobs.PdfJobRunner(workers, output_dir)
+                pool = runner._get_pool()
+                if pool is not None: # Spawn the processes and load the templates before timing
+                    list(pool.map(_warm_pdf_worker, ['pending'] * workers))
+                submit_s, elapsed, job = _run_pdf_job(runner, 'pending', output_format)
+                runner.shutdown()
+                report['runs'].append({
+                    'format': output_format,
+                    'workers': workers,
+                    'state': job['state'],
+                    'pages': job['rendered'],
+                    'submit_ms': round(submit_s * 1000, 2),
+                    'elapsed_s': round(elapsed, 3),
+                    'pages_per_sec': round(job['rendered'] / elapsed, 1),
+                    'output_bytes': os.path.getsize(job['path']) if job['path'] else 0,
+                })
+    for output_format in pdf_jobs.OUTPUT_FORMATS:
+        runs = [run for run in report['runs'] if run['format'] == output_format]
+        baseline = runs[0]['pages_per_sec']
+        report[f'{output_format}_speedup_vs_inline'] = {run['workers']: round(run['pages_per_sec'] / baseline, 2)
+                                                        for run in runs}
+    return report
+
+
+# --- Dashboard polling: conditional GET and compression ---
+
+DASHBOARD_CHALLAN_FIELDS = ('owner_name,vehicle_number,owner_phone,vehicle_type,challan_number,transaction_id,'
+                            'fine_amount,timestamp,status')
+
+
+def _replay_polling(dashboards, minutes, challans, conditional):
+    """
+    Replays the dashboard's polling mix against the Flask app on a fresh temp DB: a
+    traffic tick every 3 s (lane logs plus the odd violation), history polls every 10 s
+    and challan syncs every 15 s per dashboard, each opening with the first challan page.
+    With conditional, clients send If-None-Match and Accept-Encoding: gzip.
+    Returns {endpoint: (latencies, body bytes, 304 count)}.
+    """
+    import app
+
+    rng = random.Random(42)
+    lanes = traffic_data.AREAS[BENCH_AREA]
+    results = {name: ([], [0], [0]) for name in ('challan_page', 'challan_sync', 'history')}
+    with temp_database():
+        database.add_challans(_synthetic_challans(challans))
+        client = app.app.test_client()
+        with client.session_transaction() as session:
+            session['logged_in'] = True
+
+        start_ms = database._to_epoch_ms(datetime.now())
+
+        def body(response):
+            data = response.get_data()
+            return gzip.decompress(data) if response.headers.get('Content-Encoding') == 'gzip' else data
+
+        def get(name, url, state):
+            headers = {'Accept-Encoding': 'gzip'} if conditional else {}
+            if conditional and url in state:
+                headers['If-None-Match'] = state[url]
+            t0 = time.perf_counter()
+            response = client.get(url, headers=headers)
+            results[name][0].append(time.perf_counter() - t0)
+            if response.status_code == 304:
+                results[name][2][0] += 1
+            else:
+                results[name][1][0] += len(response.data)
+                state[url] = response.headers.get('ETag')
+            return response
+
+        base = f'/api/challans/{BENCH_AREA}?fields={DASHBOARD_CHALLAN_FIELDS}&limit=50'
+        clients = []
+        for _ in range(dashboards):
+            state = {}
+            page = json.loads(body(get('challan_page', base + '&status=pending', state)))
+            clients.append((rng.randrange(30), state, page['sync_cursor']))
+        for second in range(minutes * 60):
+            if second % 3 == 0:
+                database._insert_traffic_logs([(BENCH_AREA, lane, start_ms + second * 1000, rng.randrange(20),
+                                                rng.randrange(10), rng.randrange(400)) for lane in lanes])
+                if rng.random() < traffic_data.VIOLATION_PROBABILITY:
+                    database.add_challans(_synthetic_challans(1, rng.randrange(1 << 30)))
+            for number, (offset, state, cursor) in enumerate(clients):
+                if (second + offset) % 10 == 0:
+                    get('history', f'/api/historical_traffic_data/{BENCH_AREA}', state)
+                if (second + offset) % 15 == 0:
+                    response = get('challan_sync', base + f'&since={cursor}', state)
+                    if response.status_code == 200:
+                        clients[number] = (offset, state, json.loads(body(response))['sync_cursor'])
+    return results
+
+
+def bench_polling(dashboards, minutes, challans):
+    """
+    Bytes on the wire and p95 latency of the dashboard polling mix, before (plain
+    200 responses) vs after (ETag revalidation and gzip) the conditional-GET layer.
+    """
+    report = {'benchmark': 'polling', 'dashboards': dashboards, 'simulated_minutes': minutes, 'challans': challans}
+    for label, conditional in (('before', False), ('after', True)):
+        results = _replay_polling(dashboards, minutes, challans, conditional)
+        report[label] = {name: {'requests': len(samples), 'not_modified': not_modified[0], 'body_bytes': size[0],
+                                'p50_ms': round(percentile(samples, 50) * 1000, 3),
+                                'p95_ms': round(percentile(samples, 95) * 1000, 3)}
+                         for name, (samples, size, not_modified) in results.items()}
+    before = sum(endpoint['body_bytes'] for endpoint in report['before'].values())
+    after = sum(endpoint['body_bytes'] for endpoint in report['after'].values())
+    report['body_bytes_saved_pct'] = round(100.0 * (before - after) / before, 1) if before else None
+    return report
+
+
+# --- JSON encoding ---
+
+def bench_json(iterations):
+    """
+    Encode time and size of the dashboard's JSON payloads with each available
+    json_provider backend: /api/traffic_data in schema 1 (as jsonify() built it per
+    request before snapshots were pre-encoded) and schema 2, a 50-row challan page
+    and the 4-lane, 30-point history poll.
+    """
+    import app
+    import json_provider
+
+    backends = [backend for backend in json_provider.JSON_BACKENDS
+                if backend != 'orjson' or json_provider.orjson is not None]
+    providers = {backend: type('BenchProvider', (json_provider.FastJSONProvider,), {'backend': backend})(app.app)
+                 for backend in backends}
+
+    lanes = traffic_data.AREAS[BENCH_AREA]
+    rng = random.Random(42)
+    state = traffic_data.AreaState.from_lanes_data(BENCH_AREA, {lane: {
+        'two_wheelers': rng.randrange(50), 'four_wheelers': rng.randrange(50), 'density': rng.randrange(300),
+        'is_emergency': False, 'is_vip': False} for lane in lanes})
+    snapshot = engine.build_snapshot(BENCH_AREA, 1, 1, datetime.now().isoformat(), state, lanes[0], 150)
+    now = datetime.now()
+    payloads = {
+        'traffic_data_v1': json.loads(snapshot.payload_json),
+        'traffic_data_v2': json.loads(snapshot.payload_v2_json),
+        'challan_page': {'challans': [dict(challan, id=i, timestamp=now.isoformat(), status='pending')
+                                      for i, challan in enumerate(_synthetic_challans(50))],
+                         'next_cursor': None, 'sync_cursor': None},
+        'history': {lane: {'timestamps': [(now - timedelta(seconds=3 * i)).isoformat() for i in range(30)],
+                           'densities': [rng.randrange(300) for _ in range(30)]} for lane in lanes},
+    }
+
+    report = {'benchmark': 'json', 'iterations': iterations, 'backends': backends, 'payloads': {}}
+    with app.app.app_context():
+        for name, payload in payloads.items():
+            entry = report['payloads'][name] = {}
+            for backend, provider in providers.items():
+                samples, elapsed = _timed(lambda: provider.response(payload), iterations)
+                entry[backend] = dict(summarize(samples, elapsed), bytes=len(provider.response(payload).get_data()))
+            if 'orjson' in entry:
+                entry['speedup_orjson'] = round(entry['json']['mean_ms'] / entry['orjson']['mean_ms'], 1)
+    v1, v2 = (report['payloads'][name]['json']['bytes'] for name in ('traffic_data_v1', 'traffic_data_v2'))
+    report['traffic_data_v2_size_reduction_pct'] = round(100.0 * (v1 - v2) / v1, 1)
+    return report
+
+
+# --- Startup and first request ---
+# Runs in a fresh interpreter per measurement (argv: mode, database file) so imports
+# and caches start cold. 'lazy' serves the module-level app, whose first request runs
+# startup() (app.ensure_startup, as under 'gunicorn app:app'); 'startup' runs
+# create_app() and the worker start up front, as gunicorn.conf.py does before a
+# worker accepts requests.
+STARTUP_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import database
+database.DATABASE_FILE = sys.argv[2]
+import app
+report = {'import_ms': (time.perf_counter() - started) * 1000}
+if sys.argv[1] == 'startup':
+    app.create_app()
+    report.update(app.startup())
+    t0 = time.perf_counter()
+    app.start_worker()
+    report['start_worker_ms'] = (time.perf_counter() - t0) * 1000
+report['ready_ms'] = (time.perf_counter() - started) * 1000
+client = app.app.test_client()
+with client.session_transaction() as session:
+    session['logged_in'] = True
+area_name = next(iter(app.traffic_data.AREAS))
+for name, url in (('traffic_data', f'/api/traffic_data/{area_name}'), ('challans', f'/api/challans/{area_name}')):
+    for attempt in ('first', 'second'):
+        t0 = time.perf_counter()
+        assert client.get(url).status_code == 200
+        report[f'{attempt}_{name}_ms'] = (time.perf_counter() - t0) * 1000
+        report.setdefault('first_response_ms', (time.perf_counter() - started) * 1000)
+app.engine.stop_engine()
+print(json.dumps(report))
+"""
+
+
+def _run_startup_probe(mode, path):
+    result = subprocess.run([sys.executable, '-c', STARTUP_PROBE, mode, path], capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def bench_startup(runs):
+    """
+    Process start to first response with initialization in the first request ('lazy',
+    the old behaviour) vs at startup ('startup'), on a new database file (schema
+    creation and seeding) and on an existing one. Medians of `runs` fresh processes.
+    """
+    report = {'benchmark': 'startup', 'runs': runs}
+    with tempfile.TemporaryDirectory() as tmp:
+        existing = os.path.join(tmp, 'existing.db')
+        _run_startup_probe('startup', existing)
+        for database_state in ('new', 'existing'):
+            for mode in ('lazy', 'startup'):
+                probes = []
+                for run in range(runs):
+                    path = existing if database_state == 'existing' else os.path.join(tmp, f'{mode}-{run}.db')
+                    probes.append(_run_startup_probe(mode, path))
+                report[f'{database_state}_db_{mode}'] = {key: round(statistics.median(probe[key] for probe in probes), 1)
+                                                         for key in probes[0]}
+    return report
+
+
+# --- Congestion alerts ---
+
+def bench_alerts(areas, lanes_per_area, ticks, tick_interval, threshold=150):
+    """
+    Alert transitions and evaluation cost for `areas` synthetic junctions: the old rule
+    (alert whenever density > threshold, re-decided every tick) against alerts.AlertEvaluator's
+    hysteresis, over the same simulated ticks. The simulated clock advances tick_interval per tick.
+    """
+    simulator = traffic_data.TrafficSimulator(synthetic_areas(areas, lanes_per_area), seed=42)
+    evaluator = alerts.AlertEvaluator(simulator)
+    thresholds = [threshold] * len(simulator.areas)
+    previous = np.zeros(len(simulator.lane_ids), dtype=bool)
+    naive_transitions = naive_active = hysteresis_active = events = 0
+    samples = []
+    for tick in range(ticks):
+        batch = simulator.simulate()
+        congested = batch.density > threshold
+        naive_transitions += int(np.count_nonzero(congested != previous))
+        naive_active += int(np.count_nonzero(congested))
+        previous = congested
+        t0 = time.perf_counter()
+        events += len(evaluator.update(batch, thresholds, tick * tick_interval, '2024-01-01T00:00:00'))
+        samples.append(time.perf_counter() - t0)
+        hysteresis_active += int(np.count_nonzero(evaluator.active))
+
+    lane_hours = len(simulator.lane_ids) * ticks * tick_interval / 3600
+    evaluation = summarize(samples, sum(samples))
+    return {
+        'benchmark': 'alerts', 'areas': areas, 'lanes': len(simulator.lane_ids), 'ticks': ticks,
+        'tick_interval_s': tick_interval, 'threshold': threshold,
+        'raise_after_s': evaluator.raise_after, 'clear_after_s': evaluator.clear_after,
+        'clear_ratio': evaluator.clear_ratio,
+        'naive': {'transitions': naive_transitions, 'transitions_per_lane_hour': round(naive_transitions / lane_hours, 1),
+                  'alerting_lane_share': round(naive_active / (len(simulator.lane_ids) * ticks), 3)},
+        'hysteresis': {'transitions': events, 'raised': evaluator.raised, 'cleared': evaluator.cleared,
+                       'transitions_per_lane_hour': round(events / lane_hours, 1),
+                       'alerting_lane_share': round(hysteresis_active / (len(simulator.lane_ids) * ticks), 3)},
+        'evaluate_per_tick': evaluation,
+        'evaluate_ns_per_lane': round(evaluation['mean_ms'] * 1e6 / len(simulator.lane_ids), 1),
+    }
+
+
+# --- Full pipeline replay ---
+
+PIPELINE_STAGES = ('simulate', 'signals', 'alerts', 'lane_state', 'log', 'challans', 'snapshot', 'tick')
+PIPELINE_TABLES = ('traffic_logs', 'challans', 'alert_events') + tuple(f'traffic_rollup_{tier}' for tier in database.ROLLUP_TIERS)
+
+
+def _database_size(path):
+    """Size of a SQLite file plus its WAL, in bytes."""
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def _table_counts(conn):
+    return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in PIPELINE_TABLES}
+
+
+def bench_pipeline(areas, lanes_per_area, ticks, violation_rate, seed, signals, tick_interval):
+    """
+    Replays the engine's tick pipeline offline against a temporary database: simulate,
+    signal decisions, alerts, lane state, traffic log, challans and snapshots for `areas`
+    synthetic junctions. Reports per-stage latency per tick, throughput and DB growth.
+    The simulated clock advances tick_interval per tick, so no time is spent sleeping.
+    """
+    layout = synthetic_areas(areas, lanes_per_area)
+    simulator = traffic_data.TrafficSimulator(layout, seed=seed, violation_probability=violation_rate)
+    controller = None if signals == 'greedy' else signal_controller.SignalController(simulator, signals)
+    evaluator = alerts.AlertEvaluator(simulator)
+    states = simulator.area_states()
+    samples = {stage: [] for stage in PIPELINE_STAGES}
+    challan_samples = []
+    report = {'benchmark': 'pipeline', 'areas': areas, 'lanes': len(simulator.lane_ids), 'ticks': ticks,
+              'violation_rate': violation_rate, 'seed': seed, 'signals': signals}
+
+    with temp_database() as path:
+        conn = database.get_connection()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size_before, counts_before = _database_size(path), _table_counts(conn)
+
+        start = time.perf_counter()
+        for tick in range(ticks):
+            t0 = time.perf_counter()
+            batch = simulator.simulate()
+            t1 = time.perf_counter()
+            if controller is not None:
+                green_lanes = controller.update(batch, tick * tick_interval)
+            else:
+                green_lanes = traffic_data.determine_green_lanes(batch)
+            t2 = time.perf_counter()
+            thresholds = [database.get_alert_threshold(area_name) for area_name in simulator.areas]
+            events = evaluator.update(batch, thresholds, tick * tick_interval, datetime.now().isoformat())
+            if events:
+                database.log_alert_events(events)
+            t2a = time.perf_counter()
+            for area_name, green_lane in zip(simulator.areas, green_lanes):
+                state = states[area_name]
+                batch.fill(state)
+                state.set_green_lane(green_lane)
+            t3 = time.perf_counter()
+            for area_name in simulator.areas:
+                database.log_traffic_data(area_name, states[area_name])
+            t4 = time.perf_counter()
+            for area_name, violation_details in batch.violations.items():
+                c0 = time.perf_counter()
+                database.get_challan_by_id(engine.record_violation(area_name, violation_details))
+                challan_samples.append(time.perf_counter() - c0)
+            t5 = time.perf_counter()
+            timestamp = datetime.now().isoformat()
+            for area_i, (area_name, green_lane, threshold) in enumerate(zip(simulator.areas, green_lanes, thresholds)):
+                engine.build_snapshot(area_name, tick, tick, timestamp, states[area_name], green_lane, threshold,
+                                      evaluator.active_lanes(area_i))
+            t6 = time.perf_counter()
+            for stage, elapsed in zip(PIPELINE_STAGES, (t1 - t0, t2 - t1, t2a - t2, t3 - t2a, t4 - t3, t5 - t4, t6 - t5,
+                                                        t6 - t0)):
+                samples[stage].append(elapsed)
+        ticks_elapsed = time.perf_counter() - start
+        flush_start = time.perf_counter()
+        database.flush_traffic_logs() # Rows still queued for the write-behind writer
+        flush_seconds = time.perf_counter() - flush_start
+        total_elapsed = time.perf_counter() - start
+
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        size_after, counts_after = _database_size(path), _table_counts(conn)
+
+    report['stages'] = {stage: summarize(stage_samples, sum(stage_samples)) for stage, stage_samples in samples.items()}
+    report['challan_insert'] = summarize(challan_samples, sum(challan_samples))
+    lane_ticks = len(simulator.lane_ids) * ticks
+    report['throughput'] = {
+        'ticks_per_sec': round(ticks / ticks_elapsed, 1),
+        'lane_updates_per_sec': round(lane_ticks / ticks_elapsed, 1),
+        'log_rows_per_sec_incl_flush': round(lane_ticks / total_elapsed, 1),
+        'final_flush_ms': round(flush_seconds * 1000, 2),
+    }
+    growth = {table: counts_after[table] - counts_before[table] for table in PIPELINE_TABLES}
+    report['db_growth'] = {
+        'bytes_before': size_before,
+        'bytes_after': size_after,
+        'bytes_per_traffic_log_row': round((size_after - size_before) / growth['traffic_logs'], 1)
+        if growth['traffic_logs'] else None,
+        'rows_added': growth,
+    }
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the traffic management backend.")
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    connections = subparsers.add_parser('connections', help="per-call connect vs pooled connections")
+    connections.add_argument('--iterations', type=int, default=2000)
+    connections.set_defaults(run=lambda args: bench_connections(args.iterations))
+
+    history = subparsers.add_parser('history', help="per-lane history queries vs one batched query")
+    history.add_argument('--iterations', type=int, default=2000)
+    history.add_argument('--ticks', type=int, default=5000)
+    history.set_defaults(run=lambda args: bench_history(args.iterations, args.ticks))
+
+    ingest = subparsers.add_parser('ingest', help="per-call commits vs the write-behind traffic log writer")
+    ingest.add_argument('--calls', type=int, default=20000)
+    ingest.set_defaults(run=lambda args: bench_ingest(args.calls))
+
+    push = subparsers.add_parser('stream', help="dashboard polling mix vs Server-Sent Events at N viewers")
+    push.add_argument('--viewers', type=int, default=100)
+    push.add_argument('--ticks', type=int, default=100)
+    push.set_defaults(run=lambda args: bench_stream(args.viewers, args.ticks))
+
+    rollups = subparsers.add_parser('rollups', help="raw vs rollup-tier range queries over synthetic history")
+    rollups.add_argument('--days', type=float, default=7)
+    rollups.add_argument('--iterations', type=int, default=20)
+    rollups.set_defaults(run=lambda args: bench_rollups(args.days, args.iterations))
+
+    schema = subparsers.add_parser('schema', help="v1 text traffic_logs vs schema v2 size and query time")
+    schema.add_argument('--rows', type=int, default=2000000)
+    schema.add_argument('--iterations', type=int, default=200)
+    schema.set_defaults(run=lambda args: bench_schema(args.rows, args.iterations))
+
+    cache = subparsers.add_parser('cache', help="uncached vs cached threshold and challan lookups")
+    cache.add_argument('--iterations', type=int, default=20000)
+    cache.set_defaults(run=lambda args: bench_cache(args.iterations))
+
+    simulate = subparsers.add_parser('simulate', help="per-area simulation vs the vectorized TrafficSimulator")
+    simulate.add_argument('--areas', type=int, default=300)
+    simulate.add_argument('--ticks', type=int, default=200)
+    simulate.set_defaults(run=lambda args: bench_simulate(args.areas, args.ticks))
+
+    lane_state = subparsers.add_parser('lane_state', help="per-lane dicts vs reused AreaState (tracemalloc)")
+    lane_state.add_argument('--lanes', type=int, default=10000)
+    lane_state.add_argument('--ticks', type=int, default=50)
+    lane_state.set_defaults(run=lambda args: bench_lane_state(args.lanes, args.ticks))
+
+    green_lanes = subparsers.add_parser('green_lanes', help="per-area vs bulk vectorized signal decisions")
+    green_lanes.add_argument('--areas', type=int, default=2500)
+    green_lanes.add_argument('--ticks', type=int, default=200)
+    green_lanes.set_defaults(run=lambda args: bench_green_lanes(args.areas, args.ticks))
+
+    signals = subparsers.add_parser('signals', help="greedy green decisions vs the adaptive signal controller")
+    signals.add_argument('--areas', type=int, default=500)
+    signals.add_argument('--ticks', type=int, default=500)
+    signals.add_argument('--tick-interval', type=float, default=3.0)
+    signals.set_defaults(run=lambda args: bench_signals(args.areas, args.ticks, args.tick_interval))
+
+    registry = subparsers.add_parser('registry', help="vehicle registry load time and RC/prefix lookup latency")
+    registry.add_argument('--vehicles', type=int, default=1000000)
+    registry.add_argument('--iterations', type=int, default=20000)
+    registry.set_defaults(run=lambda args: bench_registry(args.vehicles, args.iterations))
+
+    bulk = subparsers.add_parser('challan_io', help="per-row vs bulk challan import, list vs streamed export")
+    bulk.add_argument('--rows', type=int, default=200000)
+    bulk.add_argument('--single-rows', type=int, default=5000, help="rows imported one add_challan() at a time")
+    bulk.set_defaults(run=lambda args: bench_challan_io(args.rows, args.single_rows))
+
+    status_batch = subparsers.add_parser('status_batch', help="per-request vs batched challan status updates")
+    status_batch.add_argument('--updates', type=int, default=50000)
+    status_batch.add_argument('--single-updates', type=int, default=5000,
+                              help="updates applied one update_challan_status() at a time")
+    status_batch.set_defaults(run=lambda args: bench_status_batch(args.updates, args.single_updates))
+
+    pdf = subparsers.add_parser('pdf', help="per-download FPDF layout vs template fill and cached PDFs")
+    pdf.add_argument('--challans', type=int, default=2000)
+    pdf.add_argument('--downloads', type=int, default=20000)
+    pdf.set_defaults(run=lambda args: bench_pdf(args.challans, args.downloads))
+
+    jobs = subparsers.add_parser('pdf_jobs', help="bulk PDF job pages/s inline vs on 1..N render processes")
+    jobs.add_argument('--challans', type=int, default=20000)
+    jobs.add_argument('--max-workers', type=int, default=os.cpu_count() or 1)
+    jobs.set_defaults(run=lambda args: bench_pdf_jobs(args.challans, args.max_workers))
+
+    polling = subparsers.add_parser('polling', help="dashboard polling mix without vs with ETags and gzip")
+    polling.add_argument('--dashboards', type=int, default=20)
+    polling.add_argument('--minutes', type=int, default=10, help="simulated minutes of polling")
+    polling.add_argument('--challans', type=int, default=2000)
+    polling.set_defaults(run=lambda args: bench_polling(args.dashboards, args.minutes, args.challans))
+
+    encode = subparsers.add_parser('json', help="dashboard payload encoding with the stdlib vs orjson backend")
+    encode.add_argument('--iterations', type=int, default=20000)
+    encode.set_defaults(run=lambda args: bench_json(args.iterations))
+
+    startup = subparsers.add_parser('startup', help="cold start and first-request latency, lazy vs startup init")
+    startup.add_argument('--runs', type=int, default=9)
+    startup.set_defaults(run=lambda args: bench_startup(args.runs))
+
+    congestion = subparsers.add_parser('alerts', help="alert transitions with vs without hysteresis, per-tick cost")
+    congestion.add_argument('--areas', type=int, default=500)
+    congestion.add_argument('--lanes', type=int, default=4, help="lanes per area")
+    congestion.add_argument('--ticks', type=int, default=1200)
+    congestion.add_argument('--tick-interval', type=float, default=3.0, help="simulated seconds per tick")
+    congestion.set_defaults(run=lambda args: bench_alerts(args.areas, args.lanes, args.ticks, args.tick_interval))
+
+    pipeline = subparsers.add_parser('pipeline', help="offline replay of the full tick pipeline on a temp DB")
+    pipeline.add_argument('--areas', type=int, default=12)
+    pipeline.add_argument('--lanes', type=int, default=4, help="lanes per area")
+    pipeline.add_argument('--ticks', type=int, default=500)
+    pipeline.add_argument('--violation-rate', type=float, default=traffic_data.VIOLATION_PROBABILITY,
+                          help="per-area chance of a violation each tick")
+    pipeline.add_argument('--seed', type=int, default=42)
+    pipeline.add_argument('--signals', choices=('greedy',) + signal_controller.TIMING_MODES, default='webster')
+    pipeline.add_argument('--tick-interval', type=float, default=3.0, help="simulated seconds per tick")
+    pipeline.set_defaults(run=lambda args: bench_pipeline(args.areas, args.lanes, args.ticks, args.violation_rate,
+                                                          args.seed, args.signals, args.tick_interval))
+
+    args = parser.parse_args(argv)
+    print(json.dumps(args.run(args), indent=2))
+
+
+if __name__ == '__main__':
+    main()
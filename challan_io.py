@@ -0,0 +1,74 @@
+"""
+Streaming CSV and NDJSON formats for bulk challan export and import.
+
+Exports format rows straight from database.iter_challans() and emit them in
+batches of a few hundred rows, so a response never holds more than one batch;
+imports parse the request body line by line into the mappings that
+database.add_challans() inserts in chunked transactions.
+"""
+import csv
+import io
+import json
+
+import database
+import json_provider
+
+BATCH_ROWS = 500 # Rows formatted per yielded chunk of an export
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def export_csv(rows, batch_rows=BATCH_ROWS):
+    """Yields a header line, then CSV text for CHALLAN_COLUMNS-ordered rows, batch_rows rows per chunk."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(database.CHALLAN_COLUMNS)
+    yield buffer.getvalue()
+    for batch in _batched(rows, batch_rows):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue()
+
+
+def export_ndjson(rows, batch_rows=BATCH_ROWS):
+    """Yields one JSON object per line for CHALLAN_COLUMNS-ordered rows, batch_rows rows per chunk."""
+    columns = database.CHALLAN_COLUMNS
+    for batch in _batched(rows, batch_rows):
+        yield ''.join(json_provider.dumps(dict(zip(columns, row))) + '\n' for row in batch)
+
+
+def read_csv(lines):
+    """Yields a dict per data row of a CSV text stream with a header row of challan column names."""
+    for row in csv.DictReader(lines):
+        yield {column: value for column, value in row.items() if column is not None}
+
+
+def read_ndjson(lines):
+    """Yields the object on each non-blank line of an NDJSON text stream; raises ValueError on anything else."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            challan = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Line {number}: invalid JSON ({e.msg}).") from None
+        if not isinstance(challan, dict):
+            raise ValueError(f"Line {number}: expected a JSON object.")
+        yield challan
+
+
+# format -> (mimetype, exporter, reader)
+FORMATS = {
+    'csv': ('text/csv', export_csv, read_csv),
+    'ndjson': ('application/x-ndjson', export_ndjson, read_ndjson),
+}
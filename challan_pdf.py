@@ -0,0 +1,408 @@
+"""
+Challan PDFs (pending challan prints and paid receipts) from pre-built templates.
+
+Each document kind is laid out with FPDF once per process, uncompressed, with
+a {{placeholder}} wherever a per-challan value goes. Every field is drawn in a
+fixed-width, left-aligned cell, so a value never moves anything else on the
+page. Rendering a challan therefore only substitutes the escaped values into
+the page's content stream, compresses it and reassembles the file with a
+fresh xref table; the rest of the document is reused byte for byte.
+
+Bulk jobs (see pdf_jobs) use the same templates: render_batch() renders a
+chunk of challans in a pool process, and MergedPdfWriter streams many pages
+into one file that shares a single copy of the fonts and resources.
+
+Rendered files are cached in a size-bounded LRU keyed by (challan_id,
+status, updated_at). Any status change moves updated_at, so a stale file can
+never be served, and invalidate() drops a changed challan's entries right away.
+"""
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+
+from fpdf import FPDF
+
+PDF_CACHE_MAX_BYTES = int(os.environ.get('TRAFFIC_PDF_CACHE_MAX_BYTES', 32 * 1024 * 1024))
+
+LABEL_WIDTH = 60 # Width for labels
+VALUE_WIDTH = 130 # Width for values
+ROW_HEIGHT = 7
+
+VIOLATOR_ROWS = (
+    ("Violator Name:", 'owner_name'),
+    ("Violator Phone:", 'owner_phone'),
+    ("Vehicle Type:", 'vehicle_type'),
+    ("Vehicle Number:", 'vehicle_number'),
+    ("Vehicle State:", 'state'),
+)
+
+# kind -> layout: download filename, title, challan detail rows and the summary
+# section. Rows are (label, field) pairs.
+DOCUMENTS = {
+    'pending': {
+        'filename': 'challan_print_{id}.pdf',
+        'title': "Traffic Challan (Amount Due)",
+        'details': (
+            ("Challan ID:", 'id'),
+            ("Challan Number:", 'challan_number'),
+            ("Area:", 'area_name'),
+            ("Lane of Violation:", 'lane_id'),
+            ("Violation Type:", 'violation_type'),
+            ("Violation Timestamp:", 'violation_time'),
+        ),
+        'summary': ("Amount Due:", (
+            ("Fine Amount:", 'fine'),
+            ("Status:", 'status_label'),
+        )),
+    },
+    'paid': {
+        'filename': 'challan_receipt_{id}.pdf',
+        'title': "Traffic Challan Payment Receipt",
+        'details': (
+            ("Challan ID:", 'id'),
+            ("Challan Number:", 'challan_number'),
+            ("Transaction ID:", 'transaction_id'),
+            ("Area:", 'area_name'),
+            ("Lane of Violation:", 'lane_id'),
+            ("Violation Type:", 'violation_type'),
+            ("Violation Timestamp:", 'violation_time'),
+        ),
+        'summary': ("Payment Summary:", (
+            ("Amount Paid:", 'fine'),
+            ("Payment Status:", 'status_label'),
+            ("Payment Date:", 'payment_time'),
+        )),
+    },
+}
+
+_PLACEHOLDER_RE = re.compile(r'\{\{(\w+)\}\}')
+_OBJECT_RE = re.compile(r'(\d+) 0 obj\n(.*?)endobj\n', re.S)
+
+
+def _format_time(value):
+    try:
+        return datetime.fromisoformat(value).strftime('%Y-%m-%d %H:%M:%S')
+    except (TypeError, ValueError):
+        return str(value or 'N/A')
+
+
+def field_values(challan):
+    """The text of every template field for one challan."""
+    values = {field: str(challan.get(field) or 'N/A')
+              for field in ('challan_number', 'transaction_id', 'area_name', 'lane_id', 'violation_type',
+                            'owner_name', 'owner_phone', 'vehicle_type', 'vehicle_number', 'state')}
+    values['id'] = str(challan['id'])
+    values['violation_time'] = _format_time(challan.get('timestamp'))
+    # A paid challan's last status change is its payment, so receipts stay the same on every download
+    values['payment_time'] = _format_time(challan.get('updated_at'))
+    values['fine'] = f"Rs. {challan.get('fine_amount', 0)}"
+    values['status_label'] = str(challan.get('status', '')).upper()
+    return values
+
+
+def draw(pdf, kind, value):
+    """Lays out a `kind` document on pdf; value(field) returns the text drawn for a field."""
+    layout = DOCUMENTS[kind]
+    pdf.add_page()
+    pdf.set_font("Arial", size=12)
+
+    # Header
+    pdf.set_fill_color(220, 220, 220) # Light grey background
+    pdf.cell(0, 10, layout['title'], 0, 1, 'C', 1)
+    pdf.ln(10)
+
+    summary_heading, summary_rows = layout['summary']
+    sections = (("Challan Details:", layout['details']),
+                ("Violator and Vehicle Details:", VIOLATOR_ROWS),
+                (summary_heading, summary_rows))
+    for number, (heading, rows) in enumerate(sections):
+        if number:
+            pdf.ln(10)
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(0, 8, heading, 0, 1, 'L')
+        pdf.set_font("Arial", size=10)
+        pdf.ln(2)
+        for label, field in rows:
+            pdf.cell(LABEL_WIDTH, ROW_HEIGHT, label, 1, 0, 'L')
+            pdf.cell(VALUE_WIDTH, ROW_HEIGHT, value(field), 1, 1, 'L')
+
+    pdf.ln(15)
+    if kind == 'pending':
+        # Instructions/Disclaimer
+        pdf.set_font("Arial", size=9)
+        pdf.multi_cell(0, 5, "Please pay this challan amount by visiting the nearest traffic police station or through online payment portals. Failure to pay within the stipulated time may result in additional penalties.")
+        pdf.ln(5)
+        pdf.set_font("Arial", size=8)
+        pdf.cell(0, 5, "This is an electronically generated challan and does not require a signature.", 0, 1, 'C')
+    else:
+        # Footer/Thank you message
+        pdf.set_font("Arial", 'B', 12)
+        pdf.cell(0, 10, "Thank you for your payment.", 0, 1, 'C')
+        pdf.ln(5)
+        pdf.set_font("Arial", size=8)
+        pdf.cell(0, 5, "This is an electronically generated receipt and does not require a signature.", 0, 1, 'C')
+
+
+def render_fpdf(challan, kind):
+    """Reference path: lays out the whole document for one challan with FPDF and returns the PDF bytes."""
+    values = field_values(challan)
+    pdf = FPDF()
+    draw(pdf, kind, values.__getitem__)
+    return pdf.output(dest='S').encode('latin-1')
+
+
+def _escape(text):
+    """Escapes text for a PDF string literal, as FPDF does."""
+    return text.replace('\\', '\\\\').replace(')', '\\)').replace('(', '\\(').replace('\r', '\\r')
+
+
+class PdfTemplate:
+    """One document kind, pre-laid-out with placeholders; fill() renders a challan into it."""
+
+    def __init__(self, kind):
+        pdf = FPDF()
+        pdf.set_compression(False) # Keeps the page content readable for substitution
+        draw(pdf, kind, lambda field: '{{' + field + '}}')
+        document = pdf.output(dest='S')
+
+        self._objects = [] # (object number, bytes), with None in place of the page content
+        for number, body in _OBJECT_RE.findall(document):
+            if body.startswith('<</Length ') and '\nstream\n' in body:
+                length = int(body[len('<</Length '):body.index('>>')])
+                start = body.index('\nstream\n') + len('\nstream\n')
+                self._content = body[start:start + length]
+                self.content_number = int(number)
+                self._objects.append((int(number), None))
+            else:
+                if body.startswith('<</Type /Pages\n'):
+                    self.pages_number = int(number)
+                elif body.startswith('<</Type /Page\n'):
+                    self.page_number = int(number)
+                    self._page = body.encode('latin-1')
+                self._objects.append((int(number), body.encode('latin-1')))
+        trailer = document[document.index('trailer\n'):document.index('startxref')]
+        self._trailer = trailer.encode('latin-1')
+
+    def content_stream(self, values):
+        """The compressed page content with every {{field}} replaced by values[field]."""
+        content = _PLACEHOLDER_RE.sub(lambda match: _escape(values[match.group(1)]), self._content)
+        return zlib.compress(content.encode('latin-1', 'replace'))
+
+    def page_object(self, content_number):
+        """The template's page dictionary pointing at content object content_number instead."""
+        return re.sub(rb'/Contents \d+ 0 R', b'/Contents %d 0 R' % content_number, self._page)
+
+    def objects(self):
+        """The template's (object number, bytes) pairs, with None in place of the page content."""
+        return list(self._objects)
+
+    def trailer(self, size):
+        """The trailer dictionary for a file whose highest object number is size - 1."""
+        return re.sub(rb'/Size \d+', b'/Size %d' % size, self._trailer)
+
+    def fill(self, values):
+        """Returns the PDF bytes with every {{field}} replaced by values[field]."""
+        stream = self.content_stream(values)
+
+        parts = [b'%PDF-1.3\n']
+        position = len(parts[0])
+        offsets = []
+        for number, body in self._objects:
+            if body is None:
+                body = _stream_object(stream)
+            chunk = b'%d 0 obj\n%sendobj\n' % (number, body)
+            offsets.append((number, position))
+            parts.append(chunk)
+            position += len(chunk)
+
+        by_number = dict(offsets)
+        xref = [b'xref\n0 %d\n0000000000 65535 f \n' % (len(by_number) + 1)]
+        xref.extend(b'%010d 00000 n \n' % by_number[number] for number in range(1, len(by_number) + 1))
+        parts.extend(xref)
+        parts.append(self._trailer)
+        parts.append(b'startxref\n%d\n%%%%EOF\n' % position)
+        return b''.join(parts)
+
+
+def _stream_object(stream):
+    return b'<</Filter /FlateDecode /Length %d>>\nstream\n%s\nendstream\n' % (len(stream), stream)
+
+
+class MergedPdfWriter:
+    """
+    Writes one PDF of a document kind with a page per challan to a binary file,
+    page by page, so a document of any length is never held in memory. Every page
+    shares the template's fonts and resources; only its content stream differs.
+    """
+
+    def __init__(self, kind, f):
+        self._template = _template(kind)
+        self._f = f
+        self._position = 0
+        self._offsets = {} # object number -> byte offset, for the xref table
+        self._kids = [] # page object numbers in order
+        self._next_number = len(self._template.objects()) + 1
+        self._write(b'%PDF-1.3\n')
+
+    def _write(self, data):
+        self._f.write(data)
+        self._position += len(data)
+
+    def _write_object(self, number, body):
+        self._offsets[number] = self._position
+        self._write(b'%d 0 obj\n%sendobj\n' % (number, body))
+
+    def add_page(self, stream):
+        """Appends a page with stream, a compressed content stream from PdfTemplate.content_stream()."""
+        template = self._template
+        if not self._kids: # The first page keeps the template's numbers, which the catalog refers to
+            page_number, content_number = template.page_number, template.content_number
+        else:
+            page_number, content_number = self._next_number, self._next_number + 1
+            self._next_number += 2
+        self._write_object(page_number, template.page_object(content_number))
+        self._write_object(content_number, _stream_object(stream))
+        self._kids.append(page_number)
+
+    def __len__(self):
+        return len(self._kids)
+
+    def close(self):
+        """Writes the shared objects, the page tree, the xref table and the trailer. Needs at least one page."""
+        if not self._kids:
+            raise ValueError("A merged PDF needs at least one page.")
+        template = self._template
+        for number, body in template.objects():
+            if number == template.pages_number:
+                kids = b''.join(b'%d 0 R ' % kid for kid in self._kids)
+                body = re.sub(rb'/Kids \[.*?\]\n/Count \d+', lambda _: b'/Kids [%s]\n/Count %d' % (kids, len(self._kids)),
+                              body, flags=re.S)
+            elif number in (template.page_number, template.content_number):
+                continue
+            self._write_object(number, body)
+
+        xref_position = self._position
+        self._write(b'xref\n0 %d\n0000000000 65535 f \n' % self._next_number)
+        self._write(b''.join(b'%010d 00000 n \n' % self._offsets[number] for number in range(1, self._next_number)))
+        self._write(template.trailer(self._next_number))
+        self._write(b'startxref\n%d\n%%%%EOF\n' % xref_position)
+
+
+class PdfCache:
+    """Thread-safe LRU of rendered PDF bytes, bounded by their total size."""
+
+    def __init__(self, max_bytes=PDF_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self._entries = OrderedDict() # (challan_id, status, updated_at) -> bytes
+        self._keys_by_id = {} # challan_id -> its cached keys, for invalidate()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = data
+            self._keys_by_id.setdefault(key[0], set()).add(key)
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, challan_id):
+        """Drops every cached rendering of challan_id."""
+        with self._lock:
+            for key in list(self._keys_by_id.get(challan_id, ())):
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_id.clear()
+            self._size = 0
+
+    def _discard(self, key):
+        data = self._entries.pop(key, None)
+        if data is not None:
+            self._size -= len(data)
+            keys = self._keys_by_id[key[0]]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_id[key[0]]
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'bytes': self._size, 'max_bytes': self.max_bytes,
+                    'hits': self.hits, 'misses': self.misses}
+
+
+_templates = {}
+_templates_lock = threading.Lock()
+_cache = PdfCache()
+
+
+def _template(kind):
+    template = _templates.get(kind)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(kind)
+            if template is None:
+                template = _templates[kind] = PdfTemplate(kind)
+    return template
+
+
+def warm_templates():
+    """Builds every document kind's template up front (done once at startup, before workers fork)."""
+    for kind in DOCUMENTS:
+        _template(kind)
+
+
+def render(challan, kind):
+    """Returns the `kind` PDF for a challan dict, from the cache when this version was rendered before."""
+    key = (challan['id'], challan.get('status'), challan.get('updated_at'))
+    data = _cache.get(key)
+    if data is None:
+        data = _template(kind).fill(field_values(challan))
+        _cache.put(key, data)
+    return data
+
+
+def render_batch(kind, challans, pages_only=False):
+    """
+    Renders a list of challan dicts without the cache, for bulk jobs (see pdf_jobs);
+    runs in process-pool workers. Returns a complete PDF per challan, or with
+    pages_only the compressed page content for MergedPdfWriter.add_page().
+    """
+    template = _template(kind)
+    if pages_only:
+        return [template.content_stream(field_values(challan)) for challan in challans]
+    return [template.fill(field_values(challan)) for challan in challans]
+
+
+def filename(challan, kind):
+    """The download filename for a challan's `kind` PDF."""
+    return DOCUMENTS[kind]['filename'].format(id=challan['id'])
+
+
+def invalidate(challan_id):
+    """Drops challan_id's cached PDFs, e.g. after its status changed."""
+    _cache.invalidate(int(challan_id))
+
+
+def get_cache_stats():
+    """Hit/miss counters and size of this process's PDF cache."""
+    return _cache.stats()
@@ -1,17 +1,458 @@
 import sqlite3
 import os
-from datetime import datetime
+import logging
+import threading
+import time
+import queue
+import atexit
+from datetime import datetime, timedelta
 import random # Import random for dummy data generation
 import traffic_data # Import traffic_data to get AREA information and generate vehicle numbers/types
 
 DATABASE_FILE = 'traffic_data.db'
 
-def init_db():
-    """Initializes the SQLite database and creates the necessary tables."""
-    conn = sqlite3.connect(DATABASE_FILE)
+logger = logging.getLogger(__name__)
+
+# --- Connection Pool ---
+# Every thread (and every gunicorn worker) keeps one long-lived connection to
+# DATABASE_FILE instead of connecting and closing on every call. The sqlite3
+# module caches prepared statements per connection keyed by SQL text, so the
+# queries below are module-level constants to keep hitting that cache.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",      # Readers don't block the writer and vice versa
+    "PRAGMA synchronous=NORMAL",    # Safe with WAL, avoids an fsync per commit
+    "PRAGMA cache_size=-16000",     # ~16 MB page cache per connection
+    "PRAGMA mmap_size=268435456",   # Up to 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",     # Wait up to 5 s on a locked database
+)
+STATEMENT_CACHE_SIZE = 128
+
+_local = threading.local()
+_all_connections = {} # (pid, thread id, database file) -> connection, for close_all_connections()
+_connections_lock = threading.Lock()
+
+def _open_connection(database_file):
+    """Opens a new connection to database_file with the tuned pragmas applied."""
+    conn = sqlite3.connect(database_file, timeout=5.0, cached_statements=STATEMENT_CACHE_SIZE,
+                           check_same_thread=False)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+def get_connection():
+    """
+    Returns the calling thread's pooled connection to DATABASE_FILE, opening it on first use.
+    A connection inherited across fork() or opened for a different DATABASE_FILE is replaced.
+    """
+    key = (os.getpid(), threading.get_ident(), DATABASE_FILE)
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and _local.key == key:
+        return conn
+
+    if conn is not None and _local.key[0] == key[0]:
+        # Same process, DATABASE_FILE was switched: close the stale handle
+        _close_pooled(_local.key)
+    conn = _open_connection(DATABASE_FILE)
+    _local.conn = conn
+    _local.key = key
+    with _connections_lock:
+        _all_connections[key] = conn
+    _prune_dead_threads()
+    return conn
+
+def _prune_dead_threads():
+    """Closes pooled connections whose owning thread has exited (e.g. per-request threads of the dev server)."""
+    pid = os.getpid()
+    alive = {thread.ident for thread in threading.enumerate()}
+    with _connections_lock:
+        dead = [key for key in _all_connections if key[0] == pid and key[1] not in alive]
+        conns = [_all_connections.pop(key) for key in dead]
+    for conn in conns:
+        conn.close()
+
+def _close_pooled(key):
+    with _connections_lock:
+        conn = _all_connections.pop(key, None)
+    if conn is not None:
+        conn.close()
+
+def close_connection():
+    """Closes the calling thread's pooled connection, if it has one."""
+    if getattr(_local, 'conn', None) is not None:
+        if _local.key[0] == os.getpid():
+            _close_pooled(_local.key)
+        _local.conn = None
+
+def close_all_connections():
+    """Closes every pooled connection opened by this process (e.g. on worker shutdown)."""
+    pid = os.getpid()
+    with _connections_lock:
+        keys = [key for key in _all_connections if key[0] == pid]
+        conns = [_all_connections.pop(key) for key in keys]
+    for conn in conns:
+        conn.close()
+    _local.conn = None
+
+# --- Queries ---
+# Kept as constants so each pooled connection prepares them once.
+INSERT_TRAFFIC_LOG_SQL = '''
+    INSERT INTO traffic_logs (area_id, lane_id, ts_ms, two_wheelers, four_wheelers, density)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+SELECT_HISTORY_SQL = "SELECT ts_ms, density FROM traffic_logs WHERE area_id = ? ORDER BY ts_ms DESC LIMIT ?"
+SELECT_LANE_HISTORY_SQL = "SELECT ts_ms, density FROM traffic_logs WHERE lane_id = ? ORDER BY ts_ms DESC LIMIT ?"
+# Last N points of every lane of an area in one statement: a UNION ALL of one
+# LIMITed seek on idx_traffic_logs_lane_ts per lane, so each lane costs the same
+# index walk as SELECT_LANE_HISTORY_SQL without a round trip (or sort) per lane.
+# Rows come back lane by lane, newest first. Keyed by lane count.
+_AREA_HISTORY_SQL = {}
+
+def _area_history_sql(lane_count):
+    sql = _AREA_HISTORY_SQL.get(lane_count)
+    if sql is None:
+        sql = _AREA_HISTORY_SQL[lane_count] = " UNION ALL ".join(
+            ["SELECT * FROM (SELECT lane_id, ts_ms, density FROM traffic_logs WHERE lane_id = ? ORDER BY ts_ms DESC LIMIT ?)"]
+            * lane_count)
+    return sql
+
+INSERT_AREA_SQL = "INSERT OR IGNORE INTO areas (name) VALUES (?)"
+SELECT_AREA_ID_SQL = "SELECT id FROM areas WHERE name = ?"
+INSERT_LANE_SQL = "INSERT OR IGNORE INTO lanes (area_id, name) VALUES (?, ?)"
+SELECT_LANE_ID_SQL = "SELECT id FROM lanes WHERE area_id = ? AND name = ?"
+SELECT_ALERT_THRESHOLD_SQL = "SELECT max_density FROM alert_thresholds WHERE area_name = ?"
+UPSERT_ALERT_THRESHOLD_SQL = "INSERT OR REPLACE INTO alert_thresholds (area_name, max_density) VALUES (?, ?)"
+# updated_at starts out equal to timestamp (?12) and moves on every status change
+INSERT_CHALLAN_SQL = '''
+    INSERT INTO challans (area_name, lane_id, violation_type, vehicle_number, owner_name, owner_phone, vehicle_type, challan_number, transaction_id, state, fine_amount, timestamp, status, updated_at)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?12, ?13, ?12)
+'''
+# Imported challans keep their own timestamp but change now (?14), which moves sync cursors and ETags
+IMPORT_CHALLAN_SQL = '''
+    INSERT INTO challans (area_name, lane_id, violation_type, vehicle_number, owner_name, owner_phone, vehicle_type, challan_number, transaction_id, state, fine_amount, timestamp, status, updated_at)
+    VALUES (?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9, ?10, ?11, ?12, ?13, ?14)
+'''
+CHALLAN_COLUMNS = ('id', 'area_name', 'lane_id', 'violation_type', 'vehicle_number', 'owner_name', 'owner_phone',
+                   'vehicle_type', 'challan_number', 'transaction_id', 'state', 'fine_amount', 'timestamp', 'status',
+                   'updated_at')
+_CHALLAN_SELECT = f"SELECT {', '.join(CHALLAN_COLUMNS)} FROM challans"
+SELECT_CHALLANS_SQL = _CHALLAN_SELECT + " WHERE area_name = ? ORDER BY timestamp DESC"
+SELECT_CHALLANS_BY_STATUS_SQL = _CHALLAN_SELECT + " WHERE area_name = ? AND status = ? ORDER BY timestamp DESC"
+SELECT_CHALLAN_BY_ID_SQL = _CHALLAN_SELECT + " WHERE id = ?"
+UPDATE_CHALLAN_STATUS_SQL = "UPDATE challans SET status = ?, updated_at = ? WHERE id = ?"
+CHALLAN_STATUSES = ('pending', 'paid', 'disputed')
+# update_challan_statuses() matches challans by any of these (the primary key or an index)
+CHALLAN_MATCH_KEYS = {'challan_id': 'id', 'challan_number': 'challan_number', 'transaction_id': 'transaction_id'}
+# ?1 new status, ?2 updated_at, ?3 key value; challans already in the new status are left alone
+UPDATE_CHALLAN_STATUS_BY_SQL = {
+    key: f"UPDATE challans SET status = ?1, updated_at = ?2 WHERE {column} = ?3 AND status != ?1 RETURNING id"
+    for key, column in CHALLAN_MATCH_KEYS.items()}
+SELECT_CHALLAN_IDS_BY_SQL = {key: f"SELECT id FROM challans WHERE {column} = ?"
+                             for key, column in CHALLAN_MATCH_KEYS.items()}
+SELECT_CHALLAN_SYNC_CURSOR_SQL = "SELECT updated_at, id FROM challans WHERE area_name = ? ORDER BY updated_at DESC, id DESC LIMIT 1"
+# Generation inputs for response ETags: the table's change counter (updates, deletes,
+# pruning) and the area's newest row (inserts), both read from indexes in one statement
+SELECT_CHALLANS_GENERATION_SQL = '''
+    SELECT (SELECT generation FROM cache_generations WHERE name = 'challans'),
+           (SELECT updated_at || '|' || id FROM challans WHERE area_name = ? ORDER BY updated_at DESC, id DESC LIMIT 1)
+'''
+SELECT_TRAFFIC_GENERATION_SQL = '''
+    SELECT (SELECT generation FROM cache_generations WHERE name = 'traffic_logs'),
+           (SELECT MAX(ts_ms) FROM traffic_logs WHERE area_id = ?)
+'''
+BUMP_GENERATION_SQL = "UPDATE cache_generations SET generation = generation + 1 WHERE name = ?"
+CHALLAN_PAGE_SIZE = 50
+CHALLAN_MAX_PAGE_SIZE = 500
+ALERT_EVENT_COLUMNS = ('id', 'area_name', 'lane_id', 'kind', 'timestamp', 'density', 'threshold', 'duration_s',
+                       'peak_density')
+INSERT_ALERT_EVENT_SQL = f'''
+    INSERT INTO alert_events ({', '.join(ALERT_EVENT_COLUMNS[1:])})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+'''
+SELECT_ALERT_EVENTS_SQL = f"SELECT {', '.join(ALERT_EVENT_COLUMNS)} FROM alert_events WHERE area_name = ?"
+ALERT_EVENT_PAGE_SIZE = 100
+ALERT_EVENT_MAX_PAGE_SIZE = 1000
+ENGINE_SNAPSHOT_COLUMNS = ('area_name', 'version', 'tick', 'payload', 'signal_plan', 'challans')
+UPSERT_ENGINE_SNAPSHOT_SQL = f"INSERT OR REPLACE INTO engine_snapshots ({', '.join(ENGINE_SNAPSHOT_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)"
+SELECT_ENGINE_SNAPSHOTS_SQL = f"SELECT {', '.join(ENGINE_SNAPSHOT_COLUMNS)} FROM engine_snapshots WHERE version > ?"
+SELECT_ENGINE_SNAPSHOT_VERSION_SQL = "SELECT COALESCE(MAX(version), 0) FROM engine_snapshots"
+
+# --- Rollups ---
+# Per-minute, per-hour and per-day aggregates of traffic_logs, keyed by
+# (area_name, bucket, lane_id). A bucket is the ISO timestamp truncated to the
+# tier's prefix length, e.g. '2024-05-01T09:15' for minutes. They are updated
+# incrementally in the same transaction as each batch of raw rows.
+ROLLUP_TIERS = {'minute': 16, 'hour': 13, 'day': 10} # tier -> ISO prefix length
+ROLLUP_TIER_SECONDS = {'minute': 60, 'hour': 3600, 'day': 86400}
+RAW_RETENTION_DAYS = float(os.environ.get('TRAFFIC_RAW_RETENTION_DAYS', 7))
+MINUTE_ROLLUP_RETENTION_DAYS = float(os.environ.get('TRAFFIC_MINUTE_ROLLUP_RETENTION_DAYS', 90))
+RETENTION_CHECK_INTERVAL = 600 # Seconds between retention sweeps by the background writer
+HISTORY_MAX_POINTS = 720 # Most buckets per lane the 'auto' resolution will return
+
+_ROLLUP_TABLE_SQL = '''
+    CREATE TABLE IF NOT EXISTS traffic_rollup_{tier} (
+        area_name TEXT NOT NULL,
+        bucket TEXT NOT NULL,
+        lane_id TEXT NOT NULL,
+        samples INTEGER NOT NULL,
+        min_density INTEGER,
+        max_density INTEGER,
+        sum_density INTEGER,
+        sum_two_wheelers INTEGER,
+        sum_four_wheelers INTEGER,
+        PRIMARY KEY (area_name, bucket, lane_id)
+    ) WITHOUT ROWID
+'''
+_ROLLUP_BACKFILL_SQL = '''
+    INSERT OR REPLACE INTO traffic_rollup_{tier}
+    SELECT area_name, substr(timestamp, 1, {prefix}), lane_id, COUNT(*), MIN(density), MAX(density),
+           SUM(density), SUM(two_wheelers), SUM(four_wheelers)
+    FROM traffic_logs GROUP BY area_name, substr(timestamp, 1, {prefix}), lane_id
+'''
+UPSERT_ROLLUP_SQL = {tier: f'''
+    INSERT INTO traffic_rollup_{tier} (area_name, bucket, lane_id, samples, min_density, max_density,
+                                       sum_density, sum_two_wheelers, sum_four_wheelers)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (area_name, bucket, lane_id) DO UPDATE SET
+        samples = samples + excluded.samples,
+        min_density = MIN(min_density, excluded.min_density),
+        max_density = MAX(max_density, excluded.max_density),
+        sum_density = sum_density + excluded.sum_density,
+        sum_two_wheelers = sum_two_wheelers + excluded.sum_two_wheelers,
+        sum_four_wheelers = sum_four_wheelers + excluded.sum_four_wheelers
+''' for tier in ROLLUP_TIERS}
+SELECT_ROLLUP_RANGE_SQL = {tier: f'''
+    SELECT lane_id, bucket, samples, min_density, max_density, sum_density, sum_two_wheelers, sum_four_wheelers
+    FROM traffic_rollup_{tier} WHERE area_name = ? AND bucket >= ? AND bucket <= ? ORDER BY bucket
+''' for tier in ROLLUP_TIERS}
+SELECT_RAW_RANGE_SQL = '''
+    SELECT lane_id, ts_ms, density FROM traffic_logs
+    WHERE area_id = ? AND ts_ms >= ? AND ts_ms <= ? ORDER BY ts_ms
+'''
+DELETE_RAW_BEFORE_SQL = "DELETE FROM traffic_logs WHERE area_id = ? AND ts_ms < ?"
+DELETE_MINUTE_ROLLUPS_BEFORE_SQL = "DELETE FROM traffic_rollup_minute WHERE area_name = ? AND bucket < ?"
+
+# --- Schema v2 ---
+# traffic_logs rows reference the areas and lanes lookup tables by integer id and
+# store the sample time as integer Unix epoch milliseconds instead of repeating
+# the area name, lane name and an ISO-8601 string on every row. The public
+# functions below still take names and return local ISO timestamps.
+_TRAFFIC_LOGS_V2_SQL = '''
+    CREATE TABLE traffic_logs_v2 (
+        id INTEGER PRIMARY KEY,
+        area_id INTEGER NOT NULL REFERENCES areas (id),
+        lane_id INTEGER NOT NULL REFERENCES lanes (id),
+        ts_ms INTEGER NOT NULL, -- Unix epoch milliseconds
+        two_wheelers INTEGER,
+        four_wheelers INTEGER,
+        density INTEGER
+    )
+'''
+# Converts v1 rows in id order. The 'utc' modifier turns the local-time ISO
+# strings written by datetime.now().isoformat() into UTC before taking the epoch.
+_TRAFFIC_LOGS_V2_COPY_SQL = '''
+    INSERT INTO traffic_logs_v2 (area_id, lane_id, ts_ms, two_wheelers, four_wheelers, density)
+    SELECT l.area_id, l.id, CAST(round((julianday(t.timestamp, 'utc') - 2440587.5) * 86400000.0) AS INTEGER),
+           t.two_wheelers, t.four_wheelers, t.density
+    FROM traffic_logs t
+    JOIN areas a ON a.name = t.area_name
+    JOIN lanes l ON l.area_id = a.id AND l.name = t.lane_id
+    ORDER BY t.id
+'''
+
+# --- Schema Migrations ---
+# PRAGMA user_version records how many of these have been applied to a database
+# file, so existing traffic_data.db files are upgraded in place by init_db().
+SCHEMA_MIGRATIONS = [
+    # 1: Covering indexes for the dashboard's hot read paths
+    [
+        "CREATE INDEX IF NOT EXISTS idx_traffic_logs_area_lane_ts ON traffic_logs (area_name, lane_id, timestamp, density)",
+        "CREATE INDEX IF NOT EXISTS idx_traffic_logs_area_ts ON traffic_logs (area_name, timestamp, density)",
+        "CREATE INDEX IF NOT EXISTS idx_challans_area_status_ts ON challans (area_name, status, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_challans_area_ts ON challans (area_name, timestamp)",
+        "ANALYZE",
+    ],
+    # 2: Let the batched multi-lane history query read lane_id from the index too
+    [
+        "DROP INDEX IF EXISTS idx_traffic_logs_area_ts",
+        "CREATE INDEX IF NOT EXISTS idx_traffic_logs_area_ts_lane ON traffic_logs (area_name, timestamp, lane_id, density)",
+        "ANALYZE",
+    ],
+    # 3: Minute/hour/day rollup tables, backfilled from the raw logs already on disk
+    [_ROLLUP_TABLE_SQL.format(tier=tier) for tier in ROLLUP_TIERS]
+    + [_ROLLUP_BACKFILL_SQL.format(tier=tier, prefix=prefix) for tier, prefix in ROLLUP_TIERS.items()],
+    # 4: Track when a challan last changed so clients can fetch only new or changed rows
+    [
+        "ALTER TABLE challans ADD COLUMN updated_at TEXT",
+        "UPDATE challans SET updated_at = timestamp",
+        "CREATE INDEX IF NOT EXISTS idx_challans_area_updated ON challans (area_name, updated_at)",
+    ],
+    # 5: Schema v2 - areas/lanes lookup tables, integer ids and epoch-millisecond timestamps in traffic_logs
+    [
+        "CREATE TABLE IF NOT EXISTS areas (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)",
+        '''CREATE TABLE IF NOT EXISTS lanes (
+               id INTEGER PRIMARY KEY,
+               area_id INTEGER NOT NULL REFERENCES areas (id),
+               name TEXT NOT NULL,
+               UNIQUE (area_id, name)
+           )''',
+        "INSERT OR IGNORE INTO areas (name) SELECT DISTINCT area_name FROM traffic_logs ORDER BY area_name",
+        '''INSERT OR IGNORE INTO lanes (area_id, name)
+           SELECT DISTINCT a.id, t.lane_id FROM traffic_logs t JOIN areas a ON a.name = t.area_name
+           ORDER BY a.id, t.lane_id''',
+        _TRAFFIC_LOGS_V2_SQL,
+        _TRAFFIC_LOGS_V2_COPY_SQL,
+        "DROP TABLE traffic_logs",
+        "ALTER TABLE traffic_logs_v2 RENAME TO traffic_logs",
+        "CREATE INDEX IF NOT EXISTS idx_traffic_logs_lane_ts ON traffic_logs (lane_id, ts_ms, density)",
+        "CREATE INDEX IF NOT EXISTS idx_traffic_logs_area_ts_lane ON traffic_logs (area_id, ts_ms, lane_id, density)",
+        "ANALYZE",
+    ],
+    # 6: Per-table change counters that tell every process when its read caches are stale
+    [
+        "CREATE TABLE IF NOT EXISTS cache_generations (name TEXT PRIMARY KEY, generation INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID",
+        "INSERT OR IGNORE INTO cache_generations (name) VALUES ('alert_thresholds'), ('challans')",
+    ] + [f'''CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_generation AFTER {event} ON {table}
+           BEGIN UPDATE cache_generations SET generation = generation + 1 WHERE name = '{table}'; END'''
+         # New challans cannot make a cached one stale, so inserting one leaves the generation alone
+         for table, events in (('alert_thresholds', ('INSERT', 'UPDATE', 'DELETE')), ('challans', ('UPDATE', 'DELETE')))
+         for event in events],
+    # 7: Match payment settlements and batch status updates by challan number or transaction id
+    [
+        "CREATE INDEX IF NOT EXISTS idx_challans_challan_number ON challans (challan_number)",
+        "CREATE INDEX IF NOT EXISTS idx_challans_transaction_id ON challans (transaction_id)",
+        "ANALYZE",
+    ],
+    # 8: Bulk PDF jobs (shared by every worker so any of them can report progress), and
+    # date-range selection of one status across all areas for those jobs
+    [
+        '''CREATE TABLE IF NOT EXISTS pdf_jobs (
+               id TEXT PRIMARY KEY,
+               kind TEXT NOT NULL,
+               format TEXT NOT NULL,
+               area_name TEXT,
+               range_start TEXT,
+               range_end TEXT,
+               state TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'done', 'failed'
+               total INTEGER,
+               rendered INTEGER NOT NULL DEFAULT 0,
+               path TEXT,
+               error TEXT,
+               created_at TEXT NOT NULL,
+               finished_at TEXT
+           )''',
+        "CREATE INDEX IF NOT EXISTS idx_challans_status_ts ON challans (status, timestamp)",
+        "ANALYZE",
+    ],
+    # 9: Change counter for traffic history, bumped when retention pruning deletes rows
+    [
+        "INSERT OR IGNORE INTO cache_generations (name) VALUES ('traffic_logs')",
+    ],
+    # 10: Congestion alert transitions recorded by the engine's alert evaluator (see alerts.py)
+    [
+        '''CREATE TABLE IF NOT EXISTS alert_events (
+               id INTEGER PRIMARY KEY,
+               area_name TEXT NOT NULL,
+               lane_id TEXT NOT NULL,
+               kind TEXT NOT NULL, -- 'raised', 'cleared'
+               timestamp TEXT NOT NULL,
+               density INTEGER NOT NULL,
+               threshold INTEGER NOT NULL,
+               duration_s REAL, -- How long the alert lasted, on 'cleared' events
+               peak_density INTEGER
+           )''',
+        "CREATE INDEX IF NOT EXISTS idx_alert_events_area_ts ON alert_events (area_name, timestamp)",
+    ],
+    # 11: Latest snapshot of every area, published by the process that runs the engine for the others
+    [
+        '''CREATE TABLE IF NOT EXISTS engine_snapshots (
+               area_name TEXT PRIMARY KEY,
+               version INTEGER NOT NULL,
+               tick INTEGER NOT NULL,
+               payload TEXT NOT NULL, -- /api/traffic_data body in response schema 2
+               signal_plan TEXT, -- SignalController.schedule() as JSON; NULL without adaptive control
+               challans TEXT NOT NULL -- JSON [[version, challan id], ...] of the area's recent challans
+           )''',
+    ],
+]
+
+# Queries that run on every dashboard poll, with representative parameters.
+# check_query_plans() warns at startup if any of them stops using an index.
+HOT_QUERIES = {
+    'lane_history': (SELECT_LANE_HISTORY_SQL, (1, 30)),
+    'area_history': (SELECT_HISTORY_SQL, (1, 100)),
+    'area_lanes_history': (_area_history_sql(2), (1, 30, 2, 30)),
+    'raw_range': (SELECT_RAW_RANGE_SQL, (1, 1704067200000, 1704070800000)),
+    'area_id': (SELECT_AREA_ID_SQL, ('area',)),
+    'lane_id': (SELECT_LANE_ID_SQL, (1, 'lane')),
+    'rollup_minute_range': (SELECT_ROLLUP_RANGE_SQL['minute'], ('area', '2024-01-01T00:00', '2024-01-01T12:00')),
+    'rollup_hour_range': (SELECT_ROLLUP_RANGE_SQL['hour'], ('area', '2024-01-01T00', '2024-01-31T00')),
+    'rollup_day_range': (SELECT_ROLLUP_RANGE_SQL['day'], ('area', '2024-01-01', '2024-12-31')),
+    'alert_threshold': (SELECT_ALERT_THRESHOLD_SQL, ('area',)),
+    'challans': (SELECT_CHALLANS_SQL, ('area',)),
+    'challans_by_status': (SELECT_CHALLANS_BY_STATUS_SQL, ('area', 'pending')),
+    'challan_by_id': (SELECT_CHALLAN_BY_ID_SQL, (1,)),
+    'challan_sync_cursor': (SELECT_CHALLAN_SYNC_CURSOR_SQL, ('area',)),
+    'challan_by_number': (SELECT_CHALLAN_IDS_BY_SQL['challan_number'], ('CHLN-2024-000001',)),
+    'challan_by_transaction': (SELECT_CHALLAN_IDS_BY_SQL['transaction_id'], ('TXN-ABC123DEF456',)),
+    'challans_generation': (SELECT_CHALLANS_GENERATION_SQL, ('area',)),
+    'traffic_generation': (SELECT_TRAFFIC_GENERATION_SQL, (1,)),
+    'alert_events': (SELECT_ALERT_EVENTS_SQL + " AND timestamp >= ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+                     ('area', '2024-01-01T00:00:00', 101)),
+}
+
+def _apply_migrations(conn):
+    """
+    Applies any SCHEMA_MIGRATIONS newer than the database's user_version, one transaction each.
+    Returns (version before, version after).
+    """
+    version = before = conn.execute("PRAGMA user_version").fetchone()[0]
+    while version < len(SCHEMA_MIGRATIONS):
+        with conn:
+            # Also covers the DDL, which sqlite3 would otherwise autocommit, and takes the
+            # write lock up front so processes migrating the same file apply each step once
+            conn.execute("BEGIN IMMEDIATE")
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(SCHEMA_MIGRATIONS):
+                break # Another process finished the upgrade while this one waited
+            for statement in SCHEMA_MIGRATIONS[version]:
+                conn.execute(statement)
+            version += 1
+            conn.execute(f"PRAGMA user_version = {version}")
+        logger.info("Applied schema migration %d to '%s'.", version, DATABASE_FILE)
+    return before, max(version, len(SCHEMA_MIGRATIONS))
+
+def check_query_plans(conn=None):
+    """
+    Runs EXPLAIN QUERY PLAN on every HOT_QUERIES entry and logs a warning for any
+    that falls back to a full table scan or a temporary sort.
+    Returns a dict of query name -> plan details for the offending queries.
+    """
+    conn = conn or get_connection()
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    problems = {}
+    for name, (sql, params) in HOT_QUERIES.items():
+        details = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        bad = [d for d in details
+               if (d.startswith('SCAN ') and d.split()[1] in tables and 'INDEX' not in d)
+               or 'TEMP B-TREE' in d]
+        if bad:
+            problems[name] = details
+            logger.warning("Query plan for '%s' is not index-backed: %s", name, '; '.join(bad))
+    return problems
+
+def migrate_db():
+    """
+    Creates any missing tables and upgrades DATABASE_FILE in place to the latest schema.
+    Returns (schema version before, schema version after).
+    """
+    conn = get_connection()
     cursor = conn.cursor()
+    _dictionary_cache.pop(DATABASE_FILE, None) # The file may have been recreated since ids were cached
+    clear_caches()
 
     # Create traffic_logs table to store historical traffic data
+    # (the original layout; migration 5 converts it to schema v2)
     cursor.execute('''
         CREATE TABLE IF NOT EXISTS traffic_logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -54,22 +495,36 @@ def init_db():
     ''')
 
     conn.commit()
+    return _apply_migrations(conn)
 
-    # Check if challans table is empty and pre-populate if it is
-    cursor.execute("SELECT COUNT(*) FROM challans")
-    if cursor.fetchone()[0] == 0:
-        _add_initial_dummy_challans(conn)
+def init_db():
+    """
+    Initializes the SQLite database: creates or upgrades the schema and seeds dummy
+    challans into an empty challans table. Called once at startup (see app.startup()),
+    not per request. Returns the number of challans seeded.
+    """
+    migrate_db()
+    conn = get_connection()
 
-    conn.close()
-    print(f"Database '{DATABASE_FILE}' initialized successfully.")
+    # The emptiness check and the seed share one write transaction, so processes
+    # initializing the same file at once seed it exactly once
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        seeded = 0
+        if conn.execute("SELECT COUNT(*) FROM challans").fetchone()[0] == 0:
+            seeded = _add_initial_dummy_challans(conn)
+
+    check_query_plans(conn)
+    logger.info("Database '%s' initialized.", DATABASE_FILE)
+    return seeded
 
 def _add_initial_dummy_challans(conn):
     """
     Adds initial dummy challan data for each area if the challans table is empty.
-    This ensures there's always some data to display.
+    This ensures there's always some data to display. The caller commits.
     """
     cursor = conn.cursor()
-    print("Populating initial dummy challans...")
+    seeded = 0
 
     for area_name, lanes in traffic_data.AREAS.items():
         # Add at least two challans per area
@@ -92,164 +547,964 @@ def _add_initial_dummy_challans(conn):
             timestamp = datetime.now().isoformat()
             status = 'pending' if i == 0 else random.choice(['pending', 'paid']) # Make one pending, one random
 
-            cursor.execute('''
-                INSERT INTO challans (area_name, lane_id, violation_type, vehicle_number, owner_name, owner_phone, vehicle_type, challan_number, transaction_id, state, fine_amount, timestamp, status)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (area_name, lane_id, violation_type, vehicle_number, owner_name, owner_phone, vehicle_type, challan_number, transaction_id, state, fine_amount, timestamp, status))
-    conn.commit()
-    print("Initial dummy challans added.")
+            cursor.execute(INSERT_CHALLAN_SQL, (area_name, lane_id, violation_type, vehicle_number, owner_name, owner_phone, vehicle_type, challan_number, transaction_id, state, fine_amount, timestamp, status))
+            seeded += 1
+    logger.info("Added %d initial dummy challans.", seeded)
+    return seeded
+
+def warm_caches(areas):
+    """
+    Preloads the area/lane id dictionary and the alert-threshold cache for areas
+    (names), so the first requests and engine ticks don't each pay a lookup.
+    """
+    _sync_cache_generations()
+    for area_name in areas:
+        for lane_name in traffic_data.AREAS.get(area_name, ()):
+            _lane_key(area_name, lane_name, create=True)
+        get_alert_threshold(area_name)
+
+
+# --- Area/Lane Dictionary ---
+# Maps area and lane names to the integer ids stored in traffic_logs. Ids are
+# cached per database file; rows are only ever added to areas and lanes, so a
+# cached id never goes stale. Unknown names are looked up again on every call
+# because another worker may register them at any time.
+_dictionary_cache = {} # database file -> {'areas': {name: id}, 'lanes': {(area name, lane name): (area id, lane id)}}
+
+def _dictionary():
+    return _dictionary_cache.setdefault(DATABASE_FILE, {'areas': {}, 'lanes': {}})
+
+def _area_id(area_name, create=False):
+    """Returns the areas.id for area_name, registering it when create is true; None if unknown."""
+    areas = _dictionary()['areas']
+    area_id = areas.get(area_name)
+    if area_id is None:
+        conn = get_connection()
+        if create:
+            with conn:
+                conn.execute(INSERT_AREA_SQL, (area_name,))
+        row = conn.execute(SELECT_AREA_ID_SQL, (area_name,)).fetchone()
+        if row is None:
+            return None
+        area_id = areas[area_name] = row[0]
+    return area_id
+
+def _lane_key(area_name, lane_name, create=False):
+    """Returns (areas.id, lanes.id) for a lane, registering it when create is true; None if unknown."""
+    lanes = _dictionary()['lanes']
+    key = lanes.get((area_name, lane_name))
+    if key is None:
+        area_id = _area_id(area_name, create)
+        if area_id is None:
+            return None
+        conn = get_connection()
+        if create:
+            with conn:
+                conn.execute(INSERT_LANE_SQL, (area_id, lane_name))
+        row = conn.execute(SELECT_LANE_ID_SQL, (area_id, lane_name)).fetchone()
+        if row is None:
+            return None
+        key = lanes[(area_name, lane_name)] = (area_id, row[0])
+    return key
+
+def _lane_names(area_name, lane_names):
+    """Returns {lanes.id: lane name} for the known lanes among lane_names."""
+    keys = {}
+    for lane_name in lane_names:
+        key = _lane_key(area_name, lane_name)
+        if key is not None:
+            keys[key[1]] = lane_name
+    return keys
+
+def _to_epoch_ms(moment):
+    """Converts a naive local datetime to integer Unix epoch milliseconds."""
+    return round(moment.timestamp() * 1000)
+
+def parse_local_timestamp(value):
+    """
+    Parses an ISO-8601 timestamp into the naive local datetime the tables store; one with
+    a UTC offset is converted to local time. Raises ValueError if value is malformed.
+    """
+    return _local_naive(datetime.fromisoformat(value))
+
+def _local_naive(moment):
+    return moment if moment.tzinfo is None else moment.astimezone().replace(tzinfo=None)
+
+def _from_epoch_ms(ts_ms):
+    """Converts Unix epoch milliseconds back to the local ISO-8601 string the API returns."""
+    return datetime.fromtimestamp(ts_ms / 1000).isoformat(timespec='milliseconds')
+
+
+# --- Read Cache ---
+# Alert thresholds and challans by id are read far more often than they change,
+# so they are served from per-process caches. Writes through this module
+# invalidate the affected entries immediately. Writes from other processes
+# (gunicorn workers) are caught through the cache_generations table: triggers
+# bump a table's generation on every change, and a reader re-reads the
+# generations only when PRAGMA data_version says another connection committed.
+# Each thread checks at most once per CACHE_SYNC_INTERVAL, so hot reads cost no
+# query at all and other processes' writes show within that interval.
+# The TTL bounds staleness should anything slip past both.
+ALERT_THRESHOLD_CACHE_TTL = 30.0 # Seconds
+CHALLAN_CACHE_TTL = 60.0         # Seconds
+CHALLAN_CACHE_MAX_ENTRIES = 1024
+CACHE_SYNC_INTERVAL = 1.0        # Seconds between a thread's checks for other connections' writes
+
+SELECT_CACHE_GENERATIONS_SQL = "SELECT name, generation FROM cache_generations"
+
+class TTLCache:
+    """Thread-safe mapping of key -> value with per-entry expiry, a size bound and hit/miss counters."""
+
+    def __init__(self, name, ttl, max_entries=None):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = {} # key -> (expires at, value); insertion order is eviction order
+        self._epoch = 0 # Bumped by clear() so loads that raced a clear are not stored
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        """Returns the cached value for key, calling loader() on a miss. None results are not cached."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            epoch = self._epoch
+        value = loader()
+        if value is not None:
+            with self._lock:
+                if epoch == self._epoch:
+                    self._entries.pop(key, None)
+                    self._entries[key] = (now + self.ttl, value)
+                    if self.max_entries is not None and len(self._entries) > self.max_entries:
+                        del self._entries[next(iter(self._entries))]
+        return value
+
+    def invalidate(self, key):
+        """Drops the entry for key, if any."""
+        with self._lock:
+            self._epoch += 1
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        """Drops every entry."""
+        with self._lock:
+            self._epoch += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def observe_generation(self, generation):
+        """Clears the cache if the table's generation moved since it was last observed."""
+        with self._lock:
+            changed = self._generation is not None and generation != self._generation
+            self._generation = generation
+        if changed:
+            self.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'invalidations': self.invalidations,
+                'ttl_seconds': self.ttl,
+            }
+
+# cache_generations name -> cache of rows from that table
+_caches = {
+    'alert_thresholds': TTLCache('alert_thresholds', ALERT_THRESHOLD_CACHE_TTL),
+    'challans': TTLCache('challans', CHALLAN_CACHE_TTL, CHALLAN_CACHE_MAX_ENTRIES),
+}
+_threshold_cache = _caches['alert_thresholds']
+_challan_cache = _caches['challans']
+
+def _sync_cache_generations():
+    """
+    Clears caches whose table changed in another connection since this thread last checked,
+    checking at most once per CACHE_SYNC_INTERVAL.
+    """
+    conn = get_connection()
+    now = time.monotonic()
+    checked = getattr(_local, 'data_version', None) # (connection, data_version, checked at)
+    if checked is not None and checked[0] is conn and now - checked[2] < CACHE_SYNC_INTERVAL:
+        return
+    data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+    _local.data_version = (conn, data_version, now)
+    if checked is not None and checked[:2] == (conn, data_version):
+        return
+    for name, generation in conn.execute(SELECT_CACHE_GENERATIONS_SQL):
+        cache = _caches.get(name)
+        if cache is not None:
+            cache.observe_generation(generation)
+
+def clear_caches():
+    """Drops every cached read, e.g. after DATABASE_FILE is switched."""
+    for cache in _caches.values():
+        cache.clear()
+        cache._generation = None
+
+def get_cache_stats():
+    """Returns hit/miss counters for every read cache, keyed by cache name."""
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+# --- Write-behind Ingestion ---
+# Request threads hand lane samples to a background writer instead of inserting
+# and committing themselves; the writer batches samples from every area into
+# one executemany() transaction every TRAFFIC_LOG_FLUSH_INTERVAL seconds or
+# TRAFFIC_LOG_BATCH_SIZE rows, whichever comes first.
+TRAFFIC_LOG_FLUSH_INTERVAL = 0.5    # Seconds between flushes when traffic is light
+TRAFFIC_LOG_BATCH_SIZE = 1000       # Rows that trigger an early flush
+TRAFFIC_LOG_MAX_PENDING = 5000      # Queued log_traffic_data() calls before producers block
+TRAFFIC_LOG_SUBMIT_TIMEOUT = 2.0    # Seconds a producer waits on a full queue before giving up
+TRAFFIC_LOG_WRITE_RETRIES = 4       # Retries of a batch that failed with a transient error (e.g. locked)
+TRAFFIC_LOG_RETRY_BACKOFF = 0.25    # Seconds before the first retry; doubles on each further retry
+
+def _rollup_rows(rows, prefix, timestamps):
+    """
+    Aggregates queued rows into UPSERT_ROLLUP_SQL parameter tuples for one tier.
+    timestamps maps each row's ts_ms to its local ISO string, which buckets are prefixes of.
+    """
+    buckets = {}
+    for area_name, lane_id, ts_ms, two_wheelers, four_wheelers, density in rows:
+        key = (area_name, timestamps[ts_ms][:prefix], lane_id)
+        agg = buckets.get(key)
+        if agg is None:
+            buckets[key] = [1, density, density, density, two_wheelers, four_wheelers]
+        else:
+            agg[0] += 1
+            agg[1] = min(agg[1], density)
+            agg[2] = max(agg[2], density)
+            agg[3] += density
+            agg[4] += two_wheelers
+            agg[5] += four_wheelers
+    return [key + tuple(agg) for key, agg in buckets.items()]
+
+def _insert_traffic_logs(rows, alert_events=()):
+    """
+    Inserts queued (area_name, lane_id, ts_ms, two_wheelers, four_wheelers, density) rows into
+    traffic_logs and folds them into every rollup tier in a single transaction, together
+    with any queued alert_events rows (INSERT_ALERT_EVENT_SQL parameters).
+    """
+    # Resolve ids first: registering a new area or lane commits on its own
+    lane_keys = {}
+    for row in rows:
+        if (row[0], row[1]) not in lane_keys:
+            lane_keys[(row[0], row[1])] = _lane_key(row[0], row[1], create=True)
+    encoded = [lane_keys[(area_name, lane_id)] + (ts_ms, two_wheelers, four_wheelers, density)
+               for area_name, lane_id, ts_ms, two_wheelers, four_wheelers, density in rows]
+    timestamps = {ts_ms: _from_epoch_ms(ts_ms) for ts_ms in {row[2] for row in rows}}
+
+    conn = get_connection()
+    with conn: # Commits once for the whole batch, rolls back on error
+        conn.executemany(INSERT_TRAFFIC_LOG_SQL, encoded)
+        for tier, prefix in ROLLUP_TIERS.items():
+            conn.executemany(UPSERT_ROLLUP_SQL[tier], _rollup_rows(rows, prefix, timestamps))
+        if alert_events:
+            conn.executemany(INSERT_ALERT_EVENT_SQL, alert_events)
+
+def prune_traffic_history(now=None):
+    """
+    Deletes raw traffic_logs older than RAW_RETENTION_DAYS and minute rollups older than
+    MINUTE_ROLLUP_RETENTION_DAYS. Hour and day rollups are kept. Returns rows deleted.
+    """
+    now = now or datetime.now()
+    raw_cutoff = _to_epoch_ms(now - timedelta(days=RAW_RETENTION_DAYS))
+    minute_cutoff = (now - timedelta(days=MINUTE_ROLLUP_RETENTION_DAYS)).isoformat()[:ROLLUP_TIERS['minute']]
+    conn = get_connection()
+    deleted = 0
+    with conn:
+        for area_id, area_name in conn.execute("SELECT id, name FROM areas").fetchall():
+            deleted += conn.execute(DELETE_RAW_BEFORE_SQL, (area_id, raw_cutoff)).rowcount
+            deleted += conn.execute(DELETE_MINUTE_ROLLUPS_BEFORE_SQL, (area_name, minute_cutoff)).rowcount
+        if deleted:
+            conn.execute(BUMP_GENERATION_SQL, ('traffic_logs',)) # Old ranges changed; see get_traffic_generation()
+    return deleted
+
+class TrafficLogWriter:
+    """
+    Background thread that drains queued traffic_logs rows (and the alert events
+    queued alongside them) and writes them in batches. The queue is bounded: when it is full, submit() blocks for up to
+    TRAFFIC_LOG_SUBMIT_TIMEOUT seconds and then raises queue.Full.
+    """
+
+    def __init__(self, flush_interval=TRAFFIC_LOG_FLUSH_INTERVAL, batch_size=TRAFFIC_LOG_BATCH_SIZE,
+                 max_pending=TRAFFIC_LOG_MAX_PENDING, submit_timeout=TRAFFIC_LOG_SUBMIT_TIMEOUT,
+                 write_retries=TRAFFIC_LOG_WRITE_RETRIES, retry_backoff=TRAFFIC_LOG_RETRY_BACKOFF):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.submit_timeout = submit_timeout
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff
+        self.rows_written = 0
+        self.retries = 0
+        self.alert_events_written = 0
+        self._next_retention_check = time.monotonic() + RETENTION_CHECK_INTERVAL
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name='traffic-log-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, rows, alert_events=()):
+        """
+        Queues a list of traffic_logs rows and of alert_events rows, blocking while the
+        queue is full (backpressure).
+        """
+        if self._stopping:
+            raise RuntimeError("TrafficLogWriter is closed.")
+        self._queue.put((rows, alert_events), timeout=self.submit_timeout)
+
+    def flush(self):
+        """Blocks until every row submitted so far has been committed."""
+        self._queue.join()
+
+    def close(self):
+        """Flushes pending rows and stops the writer thread."""
+        if not self._stopping:
+            self._stopping = True
+            self._queue.put(None) # Wakes the writer even if it is idle
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            batch, alert_events, taken = list(item[0]), list(item[1]), 1
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is None:
+                    stop = True
+                    break
+                batch.extend(item[0])
+                alert_events.extend(item[1])
+            self._write(batch, alert_events)
+            for _ in range(taken):
+                self._queue.task_done()
+            if stop:
+                break
+            if time.monotonic() >= self._next_retention_check:
+                self._next_retention_check = time.monotonic() + RETENTION_CHECK_INTERVAL
+                try:
+                    prune_traffic_history()
+                except sqlite3.Error:
+                    logger.exception("Traffic history retention sweep failed.")
+        close_connection()
+
+    def _write(self, batch, alert_events):
+        """
+        Commits a batch, retrying it with exponential backoff while it fails with an
+        OperationalError ('database is locked' once busy_timeout runs out under
+        concurrent writers); the batch is only dropped when the retries are used up
+        or the error is not transient.
+        """
+        delay = self.retry_backoff
+        for attempt in range(self.write_retries + 1):
+            try:
+                _insert_traffic_logs(batch, alert_events)
+            except sqlite3.OperationalError as e:
+                if attempt == self.write_retries:
+                    error = e
+                    break
+                logger.warning("Traffic log batch failed (%s); retrying in %.2f s.", e, delay)
+                time.sleep(delay)
+                delay *= 2
+                self.retries += 1
+                continue
+            except sqlite3.Error as e:
+                error = e
+                break
+            self.rows_written += len(batch)
+            self.alert_events_written += len(alert_events)
+            return
+        logger.error("Dropped a batch of %d traffic log rows and %d alert events: %s", len(batch),
+                     len(alert_events), error)
+
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+def get_traffic_log_writer():
+    """Returns this process's TrafficLogWriter, starting it on first use (and again after fork)."""
+    global _writer, _writer_pid
+    if _writer is not None and _writer_pid == os.getpid():
+        return _writer
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            _writer = TrafficLogWriter()
+            _writer_pid = os.getpid()
+        return _writer
+
+def flush_traffic_logs():
+    """Blocks until every queued traffic log row has been committed."""
+    if _writer is not None and _writer_pid == os.getpid():
+        _writer.flush()
 
+def shutdown_traffic_log_writer():
+    """Flushes and stops the background writer; called automatically at interpreter exit."""
+    global _writer
+    if _writer is not None and _writer_pid == os.getpid():
+        _writer.close()
+        _writer = None
+
+atexit.register(shutdown_traffic_log_writer)
 
 def log_traffic_data(area_name, lanes_info):
-    """Logs current traffic data for all lanes in a given area to the database."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    timestamp = datetime.now().isoformat()
+    """
+    Queues current traffic data for all lanes in a given area for the background writer.
+    Rows are committed within TRAFFIC_LOG_FLUSH_INTERVAL; call flush_traffic_logs() to wait for them.
+    """
+    ts_ms = _to_epoch_ms(datetime.now())
+    rows = [(area_name, lane_id, ts_ms, data['two_wheelers'], data['four_wheelers'], data['density'])
+            for lane_id, data in lanes_info.items()]
+    get_traffic_log_writer().submit(rows)
 
-    for lane_id, data in lanes_info.items():
-        cursor.execute('''
-            INSERT INTO traffic_logs (area_name, lane_id, timestamp, two_wheelers, four_wheelers, density)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (area_name, lane_id, timestamp, data['two_wheelers'], data['four_wheelers'], data['density']))
+def log_alert_events(events):
+    """
+    Queues alert transitions (alerts.AlertEvent tuples) for the background writer, which
+    commits them with its next batch of traffic log rows.
+    """
+    get_traffic_log_writer().submit([], [tuple(event) for event in events])
 
-    conn.commit()
-    conn.close()
+def get_alert_events(area_name, lane_id=None, kind=None, start=None, end=None, limit=ALERT_EVENT_PAGE_SIZE,
+                     after=None):
+    """
+    Keyset-paginated alert transitions of an area, newest first on (timestamp, id),
+    optionally of one lane and/or kind ('raised', 'cleared') with a timestamp in
+    [start, end) (ISO timestamps or dates, converted like parse_local_timestamp()).
+    Pass the returned 'next_cursor' as 'after' for the next page.
+    Returns {'events': [...], 'next_cursor': str or None}; raises ValueError on bad parameters.
+    """
+    limit = max(1, min(int(limit), ALERT_EVENT_MAX_PAGE_SIZE))
+    try: # Compared as strings with the stored naive local timestamps
+        start, end = (parse_local_timestamp(bound).isoformat() if bound is not None else None
+                      for bound in (start, end))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid range '{start}' to '{end}'; expected ISO dates or timestamps.") from None
+    query, params = SELECT_ALERT_EVENTS_SQL, [area_name]
+    for clause, value in (("lane_id = ?", lane_id), ("kind = ?", kind), ("timestamp >= ?", start),
+                          ("timestamp < ?", end)):
+        if value is not None:
+            query += " AND " + clause
+            params.append(value)
+    if after is not None:
+        query += " AND (timestamp, id) < (?, ?)"
+        params.extend(_decode_cursor(after))
+    query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(limit + 1) # One extra row tells us whether another page exists
+
+    rows = get_connection().execute(query, params).fetchall()
+    events = [dict(zip(ALERT_EVENT_COLUMNS, row)) for row in rows[:limit]]
+    next_cursor = _encode_cursor(events[-1]['timestamp'], events[-1]['id']) if len(rows) > limit else None
+    return {'events': events, 'next_cursor': next_cursor}
+
+def publish_snapshots(rows):
+    """Replaces the published snapshots of the given areas (rows in ENGINE_SNAPSHOT_COLUMNS order) in one transaction."""
+    conn = get_connection()
+    with conn:
+        conn.executemany(UPSERT_ENGINE_SNAPSHOT_SQL, rows)
+
+def get_published_snapshots(after_version=0):
+    """Returns the engine_snapshots rows published after after_version, as tuples in ENGINE_SNAPSHOT_COLUMNS order."""
+    return get_connection().execute(SELECT_ENGINE_SNAPSHOTS_SQL, (after_version,)).fetchall()
+
+def get_published_version():
+    """Returns the highest published snapshot version (0 if none), so a new engine continues the sequence."""
+    return get_connection().execute(SELECT_ENGINE_SNAPSHOT_VERSION_SQL).fetchone()[0]
 
 def get_historical_traffic_data(area_name, lane_id=None, limit=100):
     """
     Fetches historical traffic density data for a given area and optionally a specific lane.
     Returns data ordered by timestamp, limited by 'limit'.
     """
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    query = "SELECT timestamp, density FROM traffic_logs WHERE area_name = ?"
-    params = [area_name]
-
+    conn = get_connection()
     if lane_id:
-        query += " AND lane_id = ?"
-        params.append(lane_id)
+        key = _lane_key(area_name, lane_id)
+        data = conn.execute(SELECT_LANE_HISTORY_SQL, (key[1], limit)).fetchall() if key else []
+    else:
+        area_id = _area_id(area_name)
+        data = conn.execute(SELECT_HISTORY_SQL, (area_id, limit)).fetchall() if area_id else []
+    # Reverse the data to get chronological order for charting
+    return [(_from_epoch_ms(ts_ms), density) for ts_ms, density in reversed(data)]
 
-    query += " ORDER BY timestamp DESC LIMIT ?"
-    params.append(limit)
+def get_area_historical_traffic_data(area_name, lane_ids, limit=30):
+    """
+    Fetches the last 'limit' density points for every lane in lane_ids with a single statement.
+    Returns {lane_id: {'timestamps': [...], 'densities': [...]}} in chronological order,
+    with an empty entry for lanes that have no data yet.
+    """
+    history = {lane_id: {'timestamps': [], 'densities': []} for lane_id in lane_ids}
+    area_id = _area_id(area_name)
+    if not history or limit <= 0 or area_id is None:
+        return history
 
-    cursor.execute(query, params)
-    data = cursor.fetchall()
-    conn.close()
-    # Reverse the data to get chronological order for charting
-    return data[::-1]
+    lane_names = _lane_names(area_name, history)
+    if not lane_names:
+        return history
+    params = [value for lane_key in lane_names for value in (lane_key, limit)]
+    rows = get_connection().execute(_area_history_sql(len(lane_names)), params).fetchall()
+    # The lanes of a tick share one ts_ms, so each distinct timestamp is formatted once
+    timestamps = {ts_ms: _from_epoch_ms(ts_ms) for ts_ms in {row[1] for row in rows}}
+    for lane_key, ts_ms, density in rows:
+        series = history[lane_names[lane_key]]
+        series['timestamps'].append(timestamps[ts_ms])
+        series['densities'].append(density)
+    for series in history.values(): # Newest first off the index; charts want oldest first
+        series['timestamps'].reverse()
+        series['densities'].reverse()
+    return history
+
+def get_traffic_generation(area_name):
+    """
+    A value that changes whenever the area's traffic history does: the newest logged
+    timestamp of the area plus the traffic_logs change counter that pruning bumps.
+    Costs one index lookup, so it can gate a history query (e.g. for an ETag).
+    """
+    area_id = _area_id(area_name)
+    return tuple(get_connection().execute(SELECT_TRAFFIC_GENERATION_SQL, (area_id,)).fetchone())
+
+def choose_history_resolution(start, end):
+    """
+    Picks the finest tier that keeps [start, end] within HISTORY_MAX_POINTS points per lane
+    and, for raw samples, within the raw retention window.
+    """
+    start, end = _local_naive(start), _local_naive(end)
+    span = (end - start).total_seconds()
+    raw_oldest = datetime.now() - timedelta(days=RAW_RETENTION_DAYS)
+    if span <= 30 * 60 and start >= raw_oldest:
+        return 'raw'
+    for tier, seconds in ROLLUP_TIER_SECONDS.items():
+        if span / seconds <= HISTORY_MAX_POINTS:
+            return tier
+    return 'day'
+
+def get_traffic_history(area_name, lane_ids, start, end, resolution='auto'):
+    """
+    Fetches density history for every lane in lane_ids between start and end (datetimes)
+    at 'raw', 'minute', 'hour' or 'day' resolution; 'auto' picks one with choose_history_resolution().
+    Returns (resolution, {lane_id: {'timestamps', 'densities', 'min_densities', 'max_densities',
+    'two_wheelers', 'four_wheelers'}}); rollup densities and vehicle counts are per-bucket averages.
+    Offset-aware datetimes are converted to local time first.
+    """
+    start, end = _local_naive(start), _local_naive(end)
+    if resolution == 'auto':
+        resolution = choose_history_resolution(start, end)
+    if resolution != 'raw' and resolution not in ROLLUP_TIERS:
+        raise ValueError(f"Unknown resolution '{resolution}'.")
+
+    fields = ('timestamps', 'densities', 'min_densities', 'max_densities', 'two_wheelers', 'four_wheelers')
+    history = {lane_id: {field: [] for field in fields} for lane_id in lane_ids}
+    conn = get_connection()
+    if resolution == 'raw':
+        area_id = _area_id(area_name)
+        lane_names = _lane_names(area_name, history) if area_id is not None else {}
+        rows = conn.execute(SELECT_RAW_RANGE_SQL, (area_id, _to_epoch_ms(start), _to_epoch_ms(end))) if lane_names else ()
+        for lane_key, ts_ms, density in rows:
+            lane_name = lane_names.get(lane_key)
+            if lane_name is not None:
+                history[lane_name]['timestamps'].append(_from_epoch_ms(ts_ms))
+                history[lane_name]['densities'].append(density)
+        for lane_history in history.values():
+            del lane_history['min_densities'], lane_history['max_densities']
+            del lane_history['two_wheelers'], lane_history['four_wheelers']
+        return resolution, history
+
+    prefix = ROLLUP_TIERS[resolution]
+    suffix = '2000-01-01T00:00:00'[prefix:] # Completes a bucket into the ISO timestamp of its start
+    rows = conn.execute(SELECT_ROLLUP_RANGE_SQL[resolution],
+                        (area_name, start.isoformat()[:prefix], end.isoformat()[:prefix]))
+    for lane_id, bucket, samples, min_density, max_density, sum_density, sum_two, sum_four in rows:
+        lane_history = history.get(lane_id)
+        if lane_history is not None:
+            lane_history['timestamps'].append(bucket + suffix)
+            lane_history['densities'].append(round(sum_density / samples, 1))
+            lane_history['min_densities'].append(min_density)
+            lane_history['max_densities'].append(max_density)
+            lane_history['two_wheelers'].append(round(sum_two / samples, 1))
+            lane_history['four_wheelers'].append(round(sum_four / samples, 1))
+    return resolution, history
 
 def get_alert_threshold(area_name):
-    """Retrieves the alert density threshold for a specific area."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT max_density FROM alert_thresholds WHERE area_name = ?", (area_name,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else 150 # Default to 150 if not set
+    """Retrieves the alert density threshold for a specific area (cached, see TTLCache)."""
+    _sync_cache_generations()
+    def load():
+        result = get_connection().execute(SELECT_ALERT_THRESHOLD_SQL, (area_name,)).fetchone()
+        return result[0] if result else 150 # Default to 150 if not set
+    return _threshold_cache.get((DATABASE_FILE, area_name), load)
 
 def set_alert_threshold(area_name, max_density):
     """Sets or updates the alert density threshold for a specific area."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute('''
-        INSERT OR REPLACE INTO alert_thresholds (area_name, max_density)
-        VALUES (?, ?)
-    ''', (area_name, max_density))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute(UPSERT_ALERT_THRESHOLD_SQL, (area_name, max_density))
+    _threshold_cache.invalidate((DATABASE_FILE, area_name))
 
 def add_challan(area_name, lane_id, violation_type, vehicle_number, owner_name, owner_phone, vehicle_type, challan_number, transaction_id, state, fine_amount):
     """Adds a new challan record to the database with all details."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
+    conn = get_connection()
     timestamp = datetime.now().isoformat()
-    cursor.execute('''
-        INSERT INTO challans (area_name, lane_id, violation_type, vehicle_number, owner_name, owner_phone, vehicle_type, challan_number, transaction_id, state, fine_amount, timestamp, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', (area_name, lane_id, violation_type, vehicle_number, owner_name, owner_phone, vehicle_type, challan_number, transaction_id, state, fine_amount, timestamp, 'pending'))
-    conn.commit()
-    challan_id = cursor.lastrowid
-    conn.close()
-    return challan_id
+    with conn:
+        cursor = conn.execute(INSERT_CHALLAN_SQL, (area_name, lane_id, violation_type, vehicle_number, owner_name, owner_phone, vehicle_type, challan_number, transaction_id, state, fine_amount, timestamp, 'pending'))
+    _challan_cache.invalidate((DATABASE_FILE, cursor.lastrowid))
+    return cursor.lastrowid
+
+def _challan_to_dict(row):
+    """Converts a challan row selected with CHALLAN_COLUMNS into a dictionary for JSON serialization."""
+    return dict(zip(CHALLAN_COLUMNS, row))
 
 def get_challans(area_name, status=None):
     """Fetches challan records for a given area, optionally filtered by status."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    # Updated SELECT statement to include new columns
-    query = "SELECT id, area_name, lane_id, violation_type, vehicle_number, owner_name, owner_phone, vehicle_type, challan_number, transaction_id, state, fine_amount, timestamp, status FROM challans WHERE area_name = ?"
-    params = [area_name]
-
+    conn = get_connection()
     if status and status != 'all':
-        query += " AND status = ?"
-        params.append(status)
-
-    query += " ORDER BY timestamp DESC"
-    cursor.execute(query, params)
-    challans = cursor.fetchall()
-    conn.close()
+        challans = conn.execute(SELECT_CHALLANS_BY_STATUS_SQL, (area_name, status)).fetchall()
+    else:
+        challans = conn.execute(SELECT_CHALLANS_SQL, (area_name,)).fetchall()
     # Convert to list of dictionaries for easier JSON serialization
-    challan_list = []
-    for c in challans:
-        challan_list.append({
-            'id': c[0],
-            'area_name': c[1],
-            'lane_id': c[2],
-            'violation_type': c[3],
-            'vehicle_number': c[4],
-            'owner_name': c[5],
-            'owner_phone': c[6],
-            'vehicle_type': c[7],
-            'challan_number': c[8],
-            'transaction_id': c[9],
-            'state': c[10],
-            'fine_amount': c[11],    # New field
-            'timestamp': c[12],
-            'status': c[13]
-        })
-    return challan_list
+    return [_challan_to_dict(c) for c in challans]
 
 def get_challan_by_id(challan_id):
-    """Fetches a single challan record by its ID."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    # Updated SELECT statement to include new columns
-    query = "SELECT id, area_name, lane_id, violation_type, vehicle_number, owner_name, owner_phone, vehicle_type, challan_number, transaction_id, state, fine_amount, timestamp, status FROM challans WHERE id = ?"
-    cursor.execute(query, (challan_id,))
-    c = cursor.fetchone()
-    conn.close()
-    if c:
-        return {
-            'id': c[0],
-            'area_name': c[1],
-            'lane_id': c[2],
-            'violation_type': c[3],
-            'vehicle_number': c[4],
-            'owner_name': c[5],
-            'owner_phone': c[6],
-            'vehicle_type': c[7],
-            'challan_number': c[8],
-            'transaction_id': c[9],
-            'state': c[10],
-            'fine_amount': c[11],
-            'timestamp': c[12],
-            'status': c[13]
-        }
-    return None
+    """Fetches a single challan record by its ID (cached, see TTLCache)."""
+    _sync_cache_generations()
+    def load():
+        c = get_connection().execute(SELECT_CHALLAN_BY_ID_SQL, (challan_id,)).fetchone()
+        return _challan_to_dict(c) if c else None
+    challan = _challan_cache.get((DATABASE_FILE, int(challan_id)), load)
+    return dict(challan) if challan else None # Callers may modify their copy
+
+def _encode_cursor(sort_value, challan_id):
+    return f"{sort_value}|{challan_id}"
+
+def _decode_cursor(cursor):
+    """Splits a 'value|id' cursor from _encode_cursor(); raises ValueError if it is malformed."""
+    sort_value, sep, challan_id = (cursor or '').rpartition('|')
+    if not sep or not sort_value:
+        raise ValueError(f"Malformed cursor '{cursor}'.")
+    return sort_value, int(challan_id)
+
+def get_challans_page(area_name, status=None, limit=CHALLAN_PAGE_SIZE, after=None, since=None, fields=None):
+    """
+    Keyset-paginated challan listing for a given area.
+
+    Pages run newest first on (timestamp, id); pass the returned 'next_cursor' as
+    'after' for the next page. With 'since' (a 'sync_cursor' from an earlier call)
+    it instead returns challans created or changed after that point, oldest change
+    first and regardless of status, so clients can also drop rows that left their filter.
+    'fields' limits the returned columns ('id' is always included).
+
+    Returns {'challans': [...], 'next_cursor': str or None, 'sync_cursor': str or None}.
+    """
+    limit = max(1, min(int(limit), CHALLAN_MAX_PAGE_SIZE))
+    unknown = set(fields or ()) - set(CHALLAN_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown challan fields: {', '.join(sorted(unknown))}.")
+    fields = [f for f in CHALLAN_COLUMNS if f in set(fields)] if fields else list(CHALLAN_COLUMNS)
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+
+    if since is not None:
+        sort_column = 'updated_at'
+        query = f"SELECT {', '.join(fields)}, updated_at FROM challans WHERE area_name = ? AND (updated_at, id) > (?, ?)"
+        params = [area_name, *_decode_cursor(since)]
+        query += " ORDER BY updated_at, id LIMIT ?"
+    else:
+        sort_column = 'timestamp'
+        query = f"SELECT {', '.join(fields)}, timestamp FROM challans WHERE area_name = ?"
+        params = [area_name]
+        if status and status != 'all':
+            query += " AND status = ?"
+            params.append(status)
+        if after is not None:
+            query += " AND (timestamp, id) < (?, ?)"
+            params.extend(_decode_cursor(after))
+        query += " ORDER BY timestamp DESC, id DESC LIMIT ?"
+    params.append(limit + 1) # One extra row tells us whether another page exists
+
+    conn = get_connection()
+    rows = conn.execute(query, params).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    challans = [dict(zip(fields, row)) for row in rows]
+
+    next_cursor = None
+    if has_more:
+        next_cursor = _encode_cursor(rows[-1][-1], rows[-1][0])
+
+    if since is not None:
+        # Advance to the last change returned; stay put if nothing changed
+        sync_cursor = _encode_cursor(rows[-1][-1], rows[-1][0]) if rows else since
+        if has_more:
+            next_cursor = sync_cursor # Keep calling with since=next_cursor to drain the backlog
+    else:
+        latest = conn.execute(SELECT_CHALLAN_SYNC_CURSOR_SQL, (area_name,)).fetchone()
+        sync_cursor = _encode_cursor(*latest) if latest else _encode_cursor('0', 0)
+
+    return {'challans': challans, 'next_cursor': next_cursor, 'sync_cursor': sync_cursor}
+
+def get_challans_generation(area_name):
+    """
+    A value that changes whenever any listing of the area's challans can: the challans
+    change counter (status updates and deletes) plus the area's newest (updated_at, id),
+    which moves on every insert. Costs two index lookups.
+    """
+    return tuple(get_connection().execute(SELECT_CHALLANS_GENERATION_SQL, (area_name,)).fetchone())
 
 def update_challan_status(challan_id, new_status):
     """Updates the status of a specific challan."""
-    conn = sqlite3.connect(DATABASE_FILE)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE challans SET status = ? WHERE id = ?", (new_status, challan_id))
-    conn.commit()
-    conn.close()
+    conn = get_connection()
+    with conn:
+        conn.execute(UPDATE_CHALLAN_STATUS_SQL, (new_status, datetime.now().isoformat(), challan_id))
+    _challan_cache.invalidate((DATABASE_FILE, int(challan_id)))
     return True
 
+BATCH_UPDATE_MAX_ITEMS = 50000 # Most status updates accepted in one update_challan_statuses() call
+
+def _parse_challan_id(value):
+    """Returns value (an int or a string of digits) as a challan id; raises ValueError for anything else."""
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(f"Invalid challan id {value!r}.")
+    return int(value)
+
+def update_challan_statuses(updates):
+    """
+    Applies many challan status changes in one transaction, e.g. a payment
+    settlement file. Each update is a mapping with 'new_status' and exactly one
+    of CHALLAN_MATCH_KEYS; a challan_number or transaction_id updates every
+    challan carrying it. Matching uses the primary key or an index, so each item
+    costs one index lookup.
+
+    Returns one result dict per update, in order: {'index', 'result', 'challan_ids'}
+    where result is 'updated', 'unchanged' (already in that status), 'not_found'
+    or 'invalid' (with an 'error' message, e.g. for a challan_id that is not an
+    integer); invalid items do not stop the batch.
+    """
+    if len(updates) > BATCH_UPDATE_MAX_ITEMS:
+        raise ValueError(f"At most {BATCH_UPDATE_MAX_ITEMS} updates per batch.")
+    conn = get_connection()
+    now = datetime.now().isoformat()
+    results = []
+    with conn:
+        for index, update in enumerate(updates):
+            result = {'index': index, 'result': 'invalid', 'challan_ids': []}
+            results.append(result)
+            if not isinstance(update, dict):
+                result['error'] = "Expected an object."
+                continue
+            keys = [key for key in CHALLAN_MATCH_KEYS if update.get(key) not in (None, '')]
+            if len(keys) != 1:
+                result['error'] = f"Expected exactly one of {', '.join(CHALLAN_MATCH_KEYS)}."
+                continue
+            new_status = update.get('new_status')
+            if new_status not in CHALLAN_STATUSES:
+                result['error'] = f"Unknown status '{new_status}'."
+                continue
+            key, value = keys[0], update[keys[0]]
+            if key == 'challan_id':
+                try:
+                    value = _parse_challan_id(value)
+                except ValueError:
+                    result['error'] = f"Invalid challan_id {value!r}; expected an integer."
+                    continue
+            elif isinstance(value, bool) or not isinstance(value, (str, int)):
+                result['error'] = f"Invalid {key} {value!r}; expected a string."
+                continue
+            updated = conn.execute(UPDATE_CHALLAN_STATUS_BY_SQL[key], (new_status, now, value)).fetchall()
+            if updated:
+                result['result'] = 'updated'
+                result['challan_ids'] = [row[0] for row in updated]
+            else:
+                matched = conn.execute(SELECT_CHALLAN_IDS_BY_SQL[key], (value,)).fetchall()
+                result['result'] = 'unchanged' if matched else 'not_found'
+                result['challan_ids'] = [row[0] for row in matched]
+    for result in results:
+        if result['result'] == 'updated':
+            for challan_id in result['challan_ids']:
+                _challan_cache.invalidate((DATABASE_FILE, challan_id))
+    return results
+
+# --- Bulk challan export/import ---
+EXPORT_FETCH_ROWS = 1000  # Rows per fetchmany() round trip while exporting
+IMPORT_CHUNK_ROWS = 5000  # Rows per executemany() transaction while importing
+# Columns an imported challan may set; id and updated_at are always assigned by the database
+IMPORT_CHALLAN_COLUMNS = CHALLAN_COLUMNS[1:-1]
+IMPORT_REQUIRED_COLUMNS = ('area_name', 'violation_type')
+
+def _challan_filter(area_name=None, status=None, start=None, end=None):
+    """
+    WHERE clause (empty or with a leading space) and parameters selecting the challans
+    of an area and/or status whose timestamp lies in [start, end); None skips a filter.
+    """
+    clauses, params = [], []
+    if area_name is not None:
+        clauses.append("area_name = ?")
+        params.append(area_name)
+    if status and status != 'all':
+        clauses.append("status = ?")
+        params.append(status)
+    if start is not None:
+        clauses.append("timestamp >= ?")
+        params.append(start)
+    if end is not None:
+        clauses.append("timestamp < ?")
+        params.append(end)
+    return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+def iter_challans(area_name=None, status=None, start=None, end=None):
+    """
+    Yields every challan (optionally of one area and/or status, with a timestamp in
+    [start, end)) as a tuple in CHALLAN_COLUMNS order, oldest first, straight off a
+    database cursor EXPORT_FETCH_ROWS at a time, so exports of any size run in
+    constant memory. Uses its own connection (closed when the generator is
+    exhausted or closed), so a slow consumer never ties up the thread's pooled connection.
+    """
+    where, params = _challan_filter(area_name, status, start, end)
+    # Ordered like idx_challans_area_ts / idx_challans_area_status_ts / idx_challans_status_ts,
+    # so no sort is needed; an unfiltered export simply walks the table
+    order = " ORDER BY timestamp, id" if area_name is not None or (status and status != 'all') else " ORDER BY id"
+    query = _CHALLAN_SELECT + where + order
+
+    conn = _open_connection(DATABASE_FILE)
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_ROWS)
+            if not rows:
+                break
+            yield from rows
+    finally:
+        conn.close()
+
+def count_challans(area_name=None, status=None, start=None, end=None):
+    """Number of challans iter_challans() would yield for the same filters."""
+    where, params = _challan_filter(area_name, status, start, end)
+    return get_connection().execute("SELECT COUNT(*) FROM challans" + where, params).fetchone()[0]
+
+def _import_row(challan, imported_at):
+    """Validates one imported challan mapping and returns its IMPORT_CHALLAN_SQL parameters."""
+    missing = [column for column in IMPORT_REQUIRED_COLUMNS if not challan.get(column)]
+    if missing:
+        raise ValueError(f"Missing {', '.join(missing)}.")
+    not_text = [column for column in IMPORT_CHALLAN_COLUMNS[:10] if not isinstance(challan.get(column), (str, type(None)))]
+    if not_text:
+        raise ValueError(f"Expected text for {', '.join(not_text)}.")
+    status = challan.get('status') or 'pending'
+    if status not in CHALLAN_STATUSES:
+        raise ValueError(f"Unknown status '{status}'.")
+    fine_amount = challan.get('fine_amount')
+    if fine_amount is None or fine_amount == '': # Same default as a simulated violation of that type
+        fine_amount = traffic_data.FINE_AMOUNTS.get(challan['violation_type'], 200)
+    try:
+        fine_amount = int(fine_amount)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid fine_amount '{fine_amount}'.") from None
+    timestamp = challan.get('timestamp')
+    if timestamp:
+        try: # Stored like every other timestamp, so range filters and sorting keep working
+            timestamp = parse_local_timestamp(timestamp).isoformat()
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid timestamp '{timestamp}'.") from None
+    return (challan['area_name'], challan.get('lane_id') or 'N/A', challan['violation_type'],
+            *(challan.get(column) or 'N/A' for column in IMPORT_CHALLAN_COLUMNS[3:10]),
+            fine_amount, timestamp or imported_at, status, imported_at)
+
+def add_challans(challans, chunk_size=IMPORT_CHUNK_ROWS):
+    """
+    Bulk-inserts an iterable of challan mappings (IMPORT_CHALLAN_COLUMNS keys; area_name
+    and violation_type are required, timestamp defaults to now, status to 'pending' and
+    fine_amount to traffic_data.FINE_AMOUNTS of the violation type). Rows count as
+    changed at import time, whatever their timestamp, so sync cursors pick them up.
+    Rows go in with executemany(), one transaction per chunk_size rows, and the
+    iterable is consumed lazily, so any number of rows can be streamed in.
+    Returns the number of rows inserted. A row that fails validation raises
+    ValueError naming its 1-based position; the rows before it stay committed.
+    """
+    conn = get_connection()
+    imported_at = datetime.now().isoformat()
+    inserted, chunk = 0, []
+    for position, challan in enumerate(challans, 1):
+        try:
+            chunk.append(_import_row(challan, imported_at))
+        except ValueError as e:
+            inserted += _insert_challan_chunk(conn, chunk)
+            raise ValueError(f"Row {position}: {e} {inserted} rows before it were imported.") from None
+        if len(chunk) >= chunk_size:
+            inserted += _insert_challan_chunk(conn, chunk)
+            chunk = []
+    return inserted + _insert_challan_chunk(conn, chunk)
+
+def _insert_challan_chunk(conn, chunk):
+    if chunk:
+        with conn:
+            conn.executemany(IMPORT_CHALLAN_SQL, chunk)
+            conn.execute(BUMP_GENERATION_SQL, ('challans',)) # The triggers only count updates and deletes
+    return len(chunk)
+
+# --- Bulk PDF jobs ---
+# Rows of pdf_jobs track each job from submission to its output file (see pdf_jobs)
+PDF_JOB_COLUMNS = ('id', 'kind', 'format', 'area_name', 'range_start', 'range_end', 'state', 'total', 'rendered',
+                   'path', 'error', 'created_at', 'finished_at')
+INSERT_PDF_JOB_SQL = '''
+    INSERT INTO pdf_jobs (id, kind, format, area_name, range_start, range_end, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+SELECT_PDF_JOB_SQL = f"SELECT {', '.join(PDF_JOB_COLUMNS)} FROM pdf_jobs WHERE id = ?"
+DELETE_FINISHED_PDF_JOBS_SQL = "DELETE FROM pdf_jobs WHERE finished_at < ? RETURNING path"
+
+def create_pdf_job(job_id, kind, output_format, area_name=None, range_start=None, range_end=None):
+    """Records a newly submitted bulk PDF job in the 'queued' state."""
+    conn = get_connection()
+    with conn:
+        conn.execute(INSERT_PDF_JOB_SQL, (job_id, kind, output_format, area_name, range_start, range_end,
+                                          datetime.now().isoformat()))
+
+def update_pdf_job(job_id, **fields):
+    """Sets columns of a pdf_jobs row, e.g. update_pdf_job(job_id, state='running', total=120)."""
+    unknown = set(fields) - set(PDF_JOB_COLUMNS[6:])
+    if unknown:
+        raise ValueError(f"Unknown pdf_jobs fields: {', '.join(sorted(unknown))}.")
+    columns = sorted(fields) # Stable SQL text per field set, so the statement cache keeps hitting
+    conn = get_connection()
+    with conn:
+        conn.execute(f"UPDATE pdf_jobs SET {', '.join(f'{column} = ?' for column in columns)} WHERE id = ?",
+                     [fields[column] for column in columns] + [job_id])
+
+def get_pdf_job(job_id):
+    """Fetches a bulk PDF job as a dictionary, or None if there is no such job."""
+    row = get_connection().execute(SELECT_PDF_JOB_SQL, (job_id,)).fetchone()
+    return dict(zip(PDF_JOB_COLUMNS, row)) if row else None
+
+def delete_finished_pdf_jobs(finished_before):
+    """Deletes the jobs that finished before an ISO timestamp; returns their output paths."""
+    conn = get_connection()
+    with conn:
+        paths = [row[0] for row in conn.execute(DELETE_FINISHED_PDF_JOBS_SQL, (finished_before,)).fetchall()]
+    return [path for path in paths if path]
+
 if __name__ == '__main__':
     # Example usage for testing database functions
-    if os.path.exists(DATABASE_FILE):
-        os.remove(DATABASE_FILE) # Clean up for fresh test
+    for path in (DATABASE_FILE, DATABASE_FILE + '-wal', DATABASE_FILE + '-shm'):
+        if os.path.exists(path):
+            os.remove(path) # Clean up for fresh test
 
     init_db()
 
@@ -262,6 +1517,7 @@ if __name__ == '__main__':
         sim_data, _ = simulate_traffic_data(test_area)
         if sim_data:
             log_traffic_data(test_area, sim_data)
+            flush_traffic_logs()
             print(f"Logged data for {test_area}")
             time.sleep(0.5)
 
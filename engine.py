@@ -0,0 +1,553 @@
+"""
+Per-area traffic controller engine.
+
+Each area is simulated on a fixed cadence by one background thread instead of
+on every HTTP request. Every tick publishes an immutable AreaSnapshot per area;
+request handlers only read the latest snapshot, so any number of viewers see
+the same numbers and cause no simulation cycles or database writes.
+
+Exactly one process runs the engine: the one holding the engine lock (an
+advisory lock on a file next to the database). It also writes each tick's
+snapshots to the engine_snapshots table, and every other process (e.g. the
+other gunicorn workers) serves them through a SnapshotMirror that follows that
+table, so all workers show the same data under the same versions. A mirror
+takes over the engine when the lock holder exits.
+"""
+import json
+import logging
+import os
+import itertools
+import threading
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import alerts
+import database
+import json_provider
+import signal_controller
+import traffic_data
+
+TICK_INTERVAL = float(os.environ.get('TRAFFIC_TICK_INTERVAL', 3.0)) # Seconds between simulation cycles
+# Fixed seed for reproducible simulation runs; unset means a fresh random seed per process
+SIMULATION_SEED = int(os.environ['TRAFFIC_SIMULATION_SEED']) if os.environ.get('TRAFFIC_SIMULATION_SEED') else None
+# 'adaptive' runs timed signal cycles (signal_controller); 'greedy' gives the green to the
+# highest-priority lane afresh every tick
+SIGNAL_CONTROL = os.environ.get('TRAFFIC_SIGNAL_CONTROL', 'adaptive')
+RECENT_CHALLANS_PER_AREA = 50 # New challans kept per area for stream subscribers that fall behind
+# Lock file electing the engine's process; unset means the database file name plus '.engine-lock'
+ENGINE_LOCK_FILE = os.environ.get('TRAFFIC_ENGINE_LOCK')
+MIRROR_POLL_INTERVAL = float(os.environ.get('TRAFFIC_MIRROR_POLL_INTERVAL', 0.25)) # Seconds between mirror reads
+
+logger = logging.getLogger(__name__)
+
+# Read-only view of one area after a tick. lanes_info is a frozen traffic_data.AreaState
+# (lane id -> LaneState); payload_json and payload_v2_json are the /api/traffic_data
+# bodies in response schema 1 and 2, encoded once. version increases on every publish
+# (ticks and re-publishes) across all areas.
+AreaSnapshot = namedtuple('AreaSnapshot', [
+    'area_name',
+    'tick',
+    'version',
+    'timestamp',
+    'lanes_info',
+    'current_green_lane',
+    'lane_labels',
+    'lane_densities',
+    'alert_threshold',
+    'alert_triggered',
+    'alert_message',
+    'payload_json',
+    'payload_v2_json',
+])
+
+
+def build_snapshot(area_name, tick, version, timestamp, lanes_info, current_green_lane, alert_threshold,
+                   congested=None):
+    """
+    Freezes one area's lane state, signal decision and alert status into an AreaSnapshot.
+    lanes_info is a traffic_data.AreaState (or a lanes_data dict, which is converted).
+    congested lists the indexes of the lanes with an active alert (see alerts.AlertEvaluator);
+    None derives them from alert_threshold alone, without hysteresis.
+    """
+    if not isinstance(lanes_info, traffic_data.AreaState):
+        lanes_info = traffic_data.AreaState.from_lanes_data(area_name, lanes_info)
+    lanes_info = lanes_info.freeze()
+    if congested is None:
+        congested = [i for i, density in enumerate(lanes_info.density) if density > alert_threshold]
+    alert_triggered = bool(congested)
+    alert_message = ""
+    if alert_triggered:
+        congested_lanes = ', '.join(f"{lanes_info.lane_ids[i]} (Density: {lanes_info.density[i]})" for i in congested)
+        alert_message = f"HIGH CONGESTION ALERT in {area_name}: {congested_lanes}!"
+
+    # Prepare data for Chart.js
+    lane_labels = lanes_info.lane_ids
+    lane_densities = lanes_info.density
+
+    # lanes_info writes its own JSON; the rest of the payload goes through json_provider.dumps
+    payload = {
+        'area_name': area_name,
+        'timestamp': timestamp,
+        'current_green_lane': current_green_lane,
+        'lane_labels': lane_labels,
+        'lane_densities': lane_densities,
+        'alert_triggered': alert_triggered,
+        'alert_message': alert_message,
+        'alert_threshold': alert_threshold,
+    }
+    # Schema 2: lanes as parallel arrays, without the chart arrays that repeat them, and
+    # congested lane indexes instead of the alert text (signal status follows from the green lane)
+    payload_v2 = {
+        'schema': 2,
+        'area_name': area_name,
+        'timestamp': timestamp,
+        'current_green_lane': current_green_lane,
+        'alert_threshold': alert_threshold,
+        'lane_ids': lanes_info.lane_ids,
+        'two_wheelers': lanes_info.two_wheelers,
+        'four_wheelers': lanes_info.four_wheelers,
+        'density': lanes_info.density,
+        'is_emergency': lanes_info.is_emergency,
+        'is_vip': lanes_info.is_vip,
+        'congested': congested,
+    }
+    return AreaSnapshot(
+        area_name=area_name,
+        tick=tick,
+        version=version,
+        timestamp=timestamp,
+        lanes_info=lanes_info,
+        current_green_lane=current_green_lane,
+        lane_labels=lane_labels,
+        lane_densities=lane_densities,
+        alert_threshold=alert_threshold,
+        alert_triggered=alert_triggered,
+        alert_message=alert_message,
+        payload_json=('{"lanes_info": ' + lanes_info.to_json() + ', ' + json_provider.dumps(payload)[1:]).encode('utf-8'),
+        payload_v2_json=json_provider.dumps(payload_v2).encode('utf-8'),
+    )
+
+
+def record_violation(area_name, violation_details):
+    """Issues a challan for one simulated violation (see traffic_data.simulate_violation()) and returns its id."""
+    return database.add_challan(
+        area_name,
+        violation_details['lane_id'],
+        violation_details['violation_type'],
+        violation_details['vehicle_number'],
+        violation_details.get('owner_name', 'N/A'),
+        violation_details.get('owner_phone', 'N/A'),
+        violation_details.get('vehicle_type', 'N/A'),
+        violation_details.get('challan_number', 'N/A'),
+        violation_details.get('transaction_id', 'N/A'),
+        violation_details.get('state', 'N/A'),
+        violation_details.get('fine_amount', 0)
+    )
+
+
+class TrafficEngine:
+    """
+    Ticks every area at a fixed cadence: simulate, pick the green lane, evaluate
+    alerts, queue the traffic log and alert events, record any violation and
+    publish a snapshot.
+    """
+
+    def __init__(self, areas=None, tick_interval=TICK_INTERVAL, seed=SIMULATION_SEED, signal_control=SIGNAL_CONTROL,
+                 publish=False):
+        self.areas = list(areas if areas is not None else traffic_data.get_available_areas())
+        self.tick_interval = tick_interval
+        self.publish = publish # Also write snapshots to engine_snapshots for SnapshotMirror processes
+        self._simulator = traffic_data.TrafficSimulator(self.areas, seed=seed)
+        if signal_control not in ('adaptive', 'greedy'):
+            raise ValueError(f"Unknown signal control '{signal_control}'; expected 'adaptive' or 'greedy'.")
+        self._signals = signal_controller.SignalController(self._simulator) if signal_control == 'adaptive' else None
+        self._alerts = alerts.AlertEvaluator(self._simulator)
+        self._states = self._simulator.area_states() # Refilled in place every tick
+        self.tick_count = 0
+        self._snapshots = {}
+        self._recent_challans = {area_name: deque(maxlen=RECENT_CHALLANS_PER_AREA) for area_name in self.areas}
+        self._versions = itertools.count(1)
+        self._published = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Runs one tick synchronously (so snapshots exist immediately) and starts the tick thread."""
+        if self._thread is not None:
+            return
+        if self.publish: # Continue the published version sequence, so mirrors and clients never see it go back
+            self._versions = itertools.count(database.get_published_version() + 1)
+        self.tick()
+        self._thread = threading.Thread(target=self._run, name='traffic-engine', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the tick thread after the current tick finishes and releases stream waiters."""
+        self._stop_event.set()
+        with self._published:
+            self._published.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def running(self):
+        """True until stop() is called."""
+        return not self._stop_event.is_set()
+
+    def snapshot(self, area_name):
+        """Returns the latest AreaSnapshot for area_name, or None for an unknown area."""
+        return self._snapshots.get(area_name)
+
+    def wait_for_update(self, area_name, after_version, timeout):
+        """
+        Blocks until area_name has a snapshot newer than after_version and returns it,
+        or returns None if nothing new was published within timeout seconds.
+        """
+        with self._published:
+            self._published.wait_for(lambda: self._is_newer(area_name, after_version), timeout)
+        snapshot = self._snapshots.get(area_name)
+        return snapshot if snapshot is not None and snapshot.version > after_version else None
+
+    def signal_schedule(self, area_name):
+        """
+        Returns area_name's current signal cycle (see SignalController.schedule()), or
+        None for an unknown area or when adaptive signal control is off.
+        """
+        if self._signals is None:
+            return None
+        return self._signals.schedule(area_name, time.time())
+
+    def challans_since(self, area_name, after_version):
+        """Returns the challans published for area_name after after_version, oldest first."""
+        return [challan for version, challan in list(self._recent_challans.get(area_name, ()))
+                if version > after_version]
+
+    def _is_newer(self, area_name, after_version):
+        snapshot = self._snapshots.get(area_name)
+        return self._stop_event.is_set() or (snapshot is not None and snapshot.version > after_version)
+
+    def tick(self):
+        """Runs one simulation cycle for every area and publishes the new snapshots."""
+        self.tick_count += 1
+        now = time.time()
+        batch = self._simulator.simulate() # Every lane of every area in one vectorized pass
+        if self._signals is not None:
+            green_lanes = self._signals.update(batch, now) # Likewise every junction's phase
+        else:
+            green_lanes = traffic_data.determine_green_lanes(batch)
+        thresholds = [database.get_alert_threshold(area_name) for area_name in self.areas] # Cached reads
+        events = self._alerts.update(batch, thresholds, now, datetime.fromtimestamp(now).isoformat()) # Likewise
+        if events:
+            try:
+                database.log_alert_events(events)
+            except Exception:
+                logger.exception("Dropped %d alert event(s) of tick %d.", len(events), self.tick_count)
+        for area_i, (area_name, current_green_lane, alert_threshold) in enumerate(
+                zip(self.areas, green_lanes, thresholds)):
+            try:
+                state = self._states[area_name]
+                batch.fill(state)
+                self._snapshots[area_name] = self._tick_area(area_name, state, current_green_lane,
+                                                             batch.violations.get(area_name), alert_threshold,
+                                                             self._alerts.active_lanes(area_i))
+            except Exception:
+                logger.exception("Tick %d failed for area '%s'.", self.tick_count, area_name)
+        if self.publish:
+            self._publish(self.areas, now)
+        with self._published:
+            self._published.notify_all()
+
+    def republish(self, area_name):
+        """
+        Republishes area_name's current lanes with its current alert threshold, e.g. after
+        the threshold changed. Alerts keep their state; the next tick evaluates them against it.
+        """
+        current = self._snapshots.get(area_name)
+        if current is None:
+            return None
+        snapshot = build_snapshot(area_name, current.tick, next(self._versions), current.timestamp,
+                                  current.lanes_info,
+                                  current.current_green_lane, database.get_alert_threshold(area_name),
+                                  self._alerts.active_lanes(self.areas.index(area_name)))
+        self._snapshots[area_name] = snapshot
+        if self.publish:
+            self._publish([area_name], time.time())
+        with self._published:
+            self._published.notify_all()
+        return snapshot
+
+    def _publish(self, area_names, now):
+        """Writes the latest snapshot, signal plan and recent challan ids of the given areas to engine_snapshots."""
+        rows = []
+        for area_name in area_names:
+            snapshot = self._snapshots.get(area_name)
+            if snapshot is None:
+                continue
+            plan = self._signals.schedule(area_name, now) if self._signals is not None else None
+            rows.append((area_name, snapshot.version, snapshot.tick, snapshot.payload_v2_json.decode('utf-8'),
+                         json_provider.dumps(plan) if plan is not None else None,
+                         json_provider.dumps([[version, challan['id']]
+                                              for version, challan in self._recent_challans[area_name]])))
+        try:
+            database.publish_snapshots(rows)
+        except Exception:
+            logger.exception("Failed to publish the snapshots of tick %d.", self.tick_count)
+
+    def _tick_area(self, area_name, lanes_info, current_green_lane, violation_details, alert_threshold, congested):
+        version = next(self._versions)
+
+        # Update the signal status in lanes_info for display
+        lanes_info.set_green_lane(current_green_lane)
+        snapshot = build_snapshot(area_name, self.tick_count, version, datetime.now().isoformat(), lanes_info,
+                                  current_green_lane, alert_threshold, congested)
+
+        # Log current traffic data to the database; a failure (e.g. a full write queue) must not hold back the snapshot
+        try:
+            database.log_traffic_data(area_name, lanes_info)
+        except Exception:
+            logger.exception("Dropped the traffic log of area '%s' for tick %d.", area_name, self.tick_count)
+
+        # Add challan if a violation occurred in this simulation cycle
+        if violation_details:
+            try:
+                challan_id = record_violation(area_name, violation_details)
+                self._recent_challans[area_name].append((version, database.get_challan_by_id(challan_id)))
+            except Exception:
+                logger.exception("Failed to record a violation in area '%s' for tick %d.", area_name, self.tick_count)
+
+        return snapshot
+
+    def _run(self):
+        next_tick = time.monotonic() + self.tick_interval
+        while not self._stop_event.wait(max(0.0, next_tick - time.monotonic())):
+            self.tick()
+            next_tick += self.tick_interval
+            if next_tick < time.monotonic():
+                # Fell behind (e.g. a slow disk); skip missed ticks instead of bursting
+                next_tick = time.monotonic() + self.tick_interval
+        database.close_connection()
+
+
+def snapshot_from_row(row):
+    """Rebuilds the AreaSnapshot of an engine_snapshots row (see TrafficEngine._publish())."""
+    area_name, version, tick, payload = row[:4]
+    data = json.loads(payload)
+    lanes_info = traffic_data.AreaState(area_name, data['lane_ids'])
+    lanes_info.load(data['two_wheelers'], data['four_wheelers'], data['density'], data['is_emergency'],
+                    data['is_vip'])
+    lanes_info.set_green_lane(data['current_green_lane'])
+    return build_snapshot(area_name, tick, version, data['timestamp'], lanes_info, data['current_green_lane'],
+                          data['alert_threshold'], data['congested'])
+
+
+class SnapshotMirror:
+    """
+    The engine as seen from a process that does not run it: polls the engine_snapshots
+    table and serves the published snapshots, signal plans and challans through the
+    same methods as TrafficEngine. Each poll also tries to take the engine lock; once
+    it has it, the mirror starts a TrafficEngine in this process and defers to it.
+    """
+
+    def __init__(self, lock_file, areas=None, poll_interval=MIRROR_POLL_INTERVAL):
+        self.areas = list(areas if areas is not None else traffic_data.get_available_areas())
+        self.poll_interval = poll_interval
+        self._lock_file = lock_file
+        self._snapshots = {}
+        self._plans = {} # area_name -> (schedule without a current phase, cycle start as epoch seconds)
+        self._recent_challans = {area_name: deque(maxlen=RECENT_CHALLANS_PER_AREA) for area_name in self.areas}
+        self._version = 0
+        self._leader = None
+        self._published = threading.Condition()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self, wait=2 * TICK_INTERVAL):
+        """
+        Reads the published snapshots, waiting up to wait seconds for the engine's first
+        tick if some area has none yet, and starts the polling thread.
+        """
+        if self._thread is not None:
+            return
+        deadline = time.monotonic() + wait
+        self._poll()
+        while len(self._snapshots) < len(self.areas) and time.monotonic() < deadline:
+            time.sleep(self.poll_interval)
+            self._poll()
+        self._thread = threading.Thread(target=self._run, name='snapshot-mirror', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops polling (and the engine, if this process took it over) and releases stream waiters."""
+        self._stop_event.set()
+        with self._published:
+            self._published.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._leader is not None:
+            self._leader.stop()
+        self._lock_file.close()
+
+    @property
+    def running(self):
+        """True until stop() is called."""
+        return not self._stop_event.is_set()
+
+    @property
+    def leader(self):
+        """The TrafficEngine this process took over, or None while it mirrors another process."""
+        return self._leader
+
+    def snapshot(self, area_name):
+        """Returns the latest AreaSnapshot for area_name, or None for an unknown area."""
+        if self._leader is not None:
+            return self._leader.snapshot(area_name)
+        return self._snapshots.get(area_name)
+
+    def wait_for_update(self, area_name, after_version, timeout):
+        """
+        Blocks until area_name has a snapshot newer than after_version and returns it,
+        or returns None if nothing new was published within timeout seconds.
+        """
+        if self._leader is None:
+            with self._published:
+                self._published.wait_for(lambda: self._leader is not None or self._is_newer(area_name, after_version),
+                                         timeout)
+        snapshot = self.snapshot(area_name)
+        return snapshot if snapshot is not None and snapshot.version > after_version else None
+
+    def signal_schedule(self, area_name):
+        """Returns area_name's published signal cycle, brought up to the current time, or None."""
+        if self._leader is not None:
+            return self._leader.signal_schedule(area_name)
+        plan = self._plans.get(area_name)
+        if plan is None:
+            return None
+        schedule, cycle_start = plan
+        return dict(schedule, current_phase=signal_controller.current_phase(schedule['phases'],
+                                                                            time.time() - cycle_start))
+
+    def challans_since(self, area_name, after_version):
+        """Returns the challans published for area_name after after_version, oldest first."""
+        if self._leader is not None:
+            return self._leader.challans_since(area_name, after_version)
+        return [challan for version, challan in list(self._recent_challans.get(area_name, ()))
+                if version > after_version]
+
+    def republish(self, area_name):
+        """
+        Only the engine's process can republish; a mirror returns None and picks up
+        the change (e.g. a new alert threshold) from the engine's next tick.
+        """
+        if self._leader is not None:
+            return self._leader.republish(area_name)
+        return None
+
+    def _is_newer(self, area_name, after_version):
+        snapshot = self._snapshots.get(area_name)
+        return self._stop_event.is_set() or (snapshot is not None and snapshot.version > after_version)
+
+    def _poll(self):
+        """Loads the snapshots published since the last poll and wakes stream waiters."""
+        rows = database.get_published_snapshots(self._version)
+        if not rows:
+            return
+        for row in rows:
+            area_name, version, _, _, signal_plan, challans = row
+            if area_name not in self._recent_challans:
+                continue
+            self._snapshots[area_name] = snapshot_from_row(row)
+            if signal_plan is not None:
+                schedule = json.loads(signal_plan)
+                self._plans[area_name] = (schedule, datetime.fromisoformat(schedule['cycle_start']).timestamp())
+            recent = self._recent_challans[area_name]
+            seen = recent[-1][0] if recent else self._version
+            for challan_version, challan_id in json.loads(challans):
+                if challan_version > seen:
+                    challan = database.get_challan_by_id(challan_id)
+                    if challan is not None:
+                        recent.append((challan_version, challan))
+        self._version = max(self._version, max(row[1] for row in rows))
+        with self._published:
+            self._published.notify_all()
+
+    def _run(self):
+        while not self._stop_event.wait(self.poll_interval):
+            if _try_engine_lock(self._lock_file):
+                self._take_over()
+                break
+            try:
+                self._poll()
+            except Exception:
+                logger.exception("Failed to read the published snapshots.")
+        database.close_connection()
+
+    def _take_over(self):
+        logger.info("Process %d took over the traffic engine.", os.getpid())
+        leader = TrafficEngine(self.areas, publish=True)
+        leader.start()
+        self._leader = leader
+        with self._published:
+            self._published.notify_all()
+
+
+def _open_engine_lock():
+    return open(ENGINE_LOCK_FILE or database.DATABASE_FILE + '.engine-lock', 'a')
+
+
+def _try_engine_lock(lock_file):
+    """Takes the engine lock on lock_file without blocking; True if this process holds it now."""
+    if fcntl is None:
+        return True # No advisory locks on this platform: every process runs its own engine
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return False
+    return True
+
+
+_engine = None
+_engine_pid = None
+_engine_lock_file = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """
+    Returns this process's engine, starting it on first use (and again after fork): a
+    publishing TrafficEngine if this process wins the engine lock, else a SnapshotMirror
+    of the process that holds it.
+    """
+    global _engine, _engine_pid, _engine_lock_file
+    if _engine is not None and _engine_pid == os.getpid():
+        return _engine
+    with _engine_lock:
+        if _engine is None or _engine_pid != os.getpid():
+            lock_file = _open_engine_lock()
+            if _try_engine_lock(lock_file):
+                engine = TrafficEngine(publish=True)
+                _engine_lock_file = lock_file # Held until stop_engine() or exit
+            else:
+                engine = SnapshotMirror(lock_file)
+                _engine_lock_file = None
+            engine.start()
+            _engine, _engine_pid = engine, os.getpid()
+        return _engine
+
+
+def stop_engine():
+    """Stops this process's engine or mirror, if it was started, and releases the engine lock."""
+    global _engine, _engine_lock_file
+    if _engine is not None and _engine_pid == os.getpid():
+        _engine.stop()
+        _engine = None
+        if _engine_lock_file is not None:
+            _engine_lock_file.close()
+            _engine_lock_file = None
@@ -0,0 +1,28 @@
+"""
+Gunicorn settings for the dashboard.
+
+Usage:
+    gunicorn -c gunicorn.conf.py
+
+The app is loaded once in the master (preload_app) through app.create_app(),
+which creates or upgrades the schema, seeds an empty database and warms the
+caches before any worker exists, so workers never race to initialize it. Each
+forked worker then calls app.start_worker() before serving requests: the worker
+that takes the engine lock runs the simulation engine and publishes its
+snapshots, the others serve those snapshots (see engine.py), so adding workers
+never adds simulation or database writes.
+"""
+import os
+
+wsgi_app = 'app:create_app()'
+preload_app = True
+bind = os.environ.get('TRAFFIC_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Each open SSE stream holds a thread (see app.api_stream)
+worker_class = 'gthread'
+threads = int(os.environ.get('TRAFFIC_THREADS', 32))
+
+
+def post_worker_init(worker):
+    import app
+    app.start_worker()
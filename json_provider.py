@@ -0,0 +1,77 @@
+"""
+JSON encoding for the web API and the engine's pre-encoded payloads.
+
+orjson is used when it is installed (it is an optional dependency) and the
+standard library otherwise; TRAFFIC_JSON_BACKEND=json forces the fallback.
+Both backends emit compact JSON that decodes to the same values, so clients
+cannot tell them apart: FastJSONProvider keeps Flask's sorted keys and HTTP-date
+datetimes, while non-ASCII text goes out as UTF-8 instead of \\u escapes under orjson.
+
+app.py installs FastJSONProvider as the Flask app's JSON provider, so jsonify()
+goes through it; engine.py, stream.py and challan_io.py call dumps() directly.
+"""
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKENDS = ('orjson', 'json')
+JSON_BACKEND = os.environ.get('TRAFFIC_JSON_BACKEND') or ('orjson' if orjson is not None else 'json')
+if JSON_BACKEND not in JSON_BACKENDS:
+    raise ValueError(f"Unknown JSON backend '{JSON_BACKEND}'; expected one of {', '.join(JSON_BACKENDS)}.")
+if JSON_BACKEND == 'orjson' and orjson is None:
+    raise ValueError("TRAFFIC_JSON_BACKEND=orjson but the orjson package is not installed.")
+
+if orjson is not None:
+    # Integer dict keys and NumPy values are accepted like json.dumps() accepts them (or
+    # better); datetimes are left to the provider's default() so they keep Flask's format.
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(obj, backend=JSON_BACKEND):
+    """Compact JSON text for obj, keys in insertion order."""
+    if backend == 'orjson':
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode('utf-8')
+    return json.dumps(obj, separators=(',', ':'))
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask's default JSON provider with encoding (and decoding) done by orjson when available."""
+
+    backend = JSON_BACKEND
+
+    def dumps(self, obj, **kwargs):
+        if self.backend != 'orjson':
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=kwargs.get('default', self.default),
+                            option=self._options(kwargs.get('sort_keys', self.sort_keys), kwargs.get('indent'))
+                            ).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if self.backend != 'orjson' or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if self.backend != 'orjson':
+            return super().response(*args, **kwargs)
+        # Builds the body as bytes directly instead of str and back
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        data = orjson.dumps(obj, default=self.default,
+                            option=self._options(self.sort_keys, indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(data, mimetype=self.mimetype)
+
+    @staticmethod
+    def _options(sort_keys, indent):
+        option = ORJSON_OPTIONS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
@@ -0,0 +1,66 @@
+"""
+Upgrades a traffic database file in place to the current schema.
+
+Usage:
+    python migrate.py [traffic_data.db] [--no-vacuum]
+
+Applies the database.SCHEMA_MIGRATIONS the file has not seen yet (each in its
+own transaction, so an interrupted run leaves the file at the last completed
+version), then VACUUMs so the pages freed by rewritten tables such as schema
+v2's traffic_logs are returned to the filesystem. Prints a JSON report.
+"""
+import argparse
+import json
+import os
+import time
+
+import database
+
+
+def _file_size(path):
+    """Size of the database file plus its WAL, in bytes."""
+    return sum(os.path.getsize(p) for p in (path, path + '-wal') if os.path.exists(p))
+
+
+def migrate(path, vacuum=True):
+    """Migrates the database at path to the latest schema version and returns a report dict."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No database at '{path}'.")
+    original = database.DATABASE_FILE
+    database.DATABASE_FILE = path
+    try:
+        size_before = _file_size(path)
+        start = time.perf_counter()
+        version_before, version_after = database.migrate_db()
+        migrate_seconds = time.perf_counter() - start
+
+        conn = database.get_connection()
+        if vacuum:
+            conn.execute("VACUUM")
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        rows = conn.execute("SELECT COUNT(*) FROM traffic_logs").fetchone()[0]
+        return {
+            'database': path,
+            'schema_version_before': version_before,
+            'schema_version_after': version_after,
+            'traffic_log_rows': rows,
+            'migrate_seconds': round(migrate_seconds, 2),
+            'bytes_before': size_before,
+            'bytes_after': _file_size(path),
+        }
+    finally:
+        database.close_all_connections()
+        database.DATABASE_FILE = original
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Upgrade a traffic database file in place.")
+    parser.add_argument('database', nargs='?', default=database.DATABASE_FILE)
+    parser.add_argument('--no-vacuum', dest='vacuum', action='store_false',
+                        help="skip reclaiming the space freed by the migration")
+    args = parser.parse_args(argv)
+    print(json.dumps(migrate(args.database, vacuum=args.vacuum), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""
+Bulk challan PDF jobs, e.g. every pending challan of an area or a date range
+for a weekly mail-out, delivered as one merged PDF or a ZIP of per-challan files.
+
+A web request only records the job in the pdf_jobs table and queues it, so it
+returns immediately. A daemon coordinator thread in the same process runs the
+queued jobs one at a time: it streams the matching challans off
+database.iter_challans(), cuts them into chunks and fans the chunks out to a
+process pool that renders them with the challan_pdf templates, keeping a
+bounded number of chunks in flight and writing the results to the output file
+in order as they come back. Memory stays flat however many challans match, and
+rendering runs on every core instead of holding up the web workers' GIL.
+
+Progress, the output path and any error are written back to the job's row, so
+any worker can answer status polls and serve the finished file. The pool is
+spawned rather than forked, because the web process already runs the engine
+and log-writer threads, whose locks a forked child could inherit held.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
+import challan_pdf
+import database
+
+# Render processes; 0 renders in the coordinator thread instead of a pool
+PDF_JOB_WORKERS = int(os.environ.get('TRAFFIC_PDF_JOB_WORKERS', os.cpu_count() or 1))
+PDF_JOB_DIR = os.environ.get('TRAFFIC_PDF_JOB_DIR') or os.path.join(tempfile.gettempdir(), 'traffic-pdf-jobs')
+CHUNK_CHALLANS = 200 # Challans per task sent to a render process
+CHUNKS_IN_FLIGHT = 2 # Per worker; bounds how far rendering runs ahead of the file writer
+PROGRESS_INTERVAL = 0.5 # Seconds between progress updates of a running job
+JOB_RETENTION = timedelta(hours=24) # Finished jobs and their files are deleted after this
+
+# kind -> the challan status it is rendered for (as the single-challan routes enforce)
+KIND_STATUS = {'pending': 'pending', 'paid': 'paid'}
+# output format -> (mimetype, file extension)
+OUTPUT_FORMATS = {'zip': ('application/zip', 'zip'), 'pdf': ('application/pdf', 'pdf')}
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_bound(value, name, end=False):
+    """
+    Normalizes a range bound to a naive local ISO timestamp, as challans are stored.
+    A bare date as the end bound means the end of that day, so start=end=2024-06-03
+    selects the whole day.
+    """
+    if value is None or value == '':
+        return None
+    try:
+        moment = database.parse_local_timestamp(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {name} '{value}'; expected an ISO date or timestamp.") from None
+    if end and len(value) == 10:
+        moment += timedelta(days=1)
+    return moment.isoformat()
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(dict(zip(database.CHALLAN_COLUMNS, row)))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _render_ordered(pool, kind, chunks, pages_only, workers):
+    """
+    Yields (chunk, rendered) for every chunk in order, rendering them on pool with at
+    most CHUNKS_IN_FLIGHT chunks per worker queued or running at a time.
+    """
+    if pool is None:
+        for chunk in chunks:
+            yield chunk, challan_pdf.render_batch(kind, chunk, pages_only)
+        return
+    in_flight = deque()
+    for chunk in chunks:
+        in_flight.append((chunk, pool.submit(challan_pdf.render_batch, kind, chunk, pages_only)))
+        if len(in_flight) >= workers * CHUNKS_IN_FLIGHT:
+            chunk, future = in_flight.popleft()
+            yield chunk, future.result()
+    while in_flight:
+        chunk, future = in_flight.popleft()
+        yield chunk, future.result()
+
+
+def write_output(f, kind, output_format, challans, pool=None, workers=1, progress=None):
+    """
+    Renders an iterable of challan rows (CHALLAN_COLUMNS tuples) into the binary file f
+    as a merged PDF or a ZIP with one PDF per challan. progress(rendered) is called
+    after every chunk. Returns the number of challans rendered.
+    """
+    pages_only = output_format == 'pdf'
+    if pages_only:
+        writer = challan_pdf.MergedPdfWriter(kind, f)
+    else:
+        # The PDFs are already compressed, so they are stored as they are
+        writer = zipfile.ZipFile(f, 'w', zipfile.ZIP_STORED)
+    rendered = 0
+    for chunk, results in _render_ordered(pool, kind, _batched(challans, CHUNK_CHALLANS), pages_only, workers):
+        for challan, data in zip(chunk, results):
+            if pages_only:
+                writer.add_page(data)
+            else:
+                writer.writestr(challan_pdf.filename(challan, kind), data)
+        rendered += len(chunk)
+        if progress is not None:
+            progress(rendered)
+    if rendered or not pages_only: # An empty ZIP is still a valid file; a PDF needs a page
+        writer.close()
+    return rendered
+
+
+class PdfJobRunner:
+    """
+    Runs queued bulk PDF jobs one at a time on a daemon thread, rendering each on a
+    process pool of `workers` processes (created on first use and kept for later jobs).
+    """
+
+    def __init__(self, workers=PDF_JOB_WORKERS, output_dir=PDF_JOB_DIR):
+        self.workers = workers
+        self.output_dir = output_dir
+        self._queue = queue.Queue()
+        self._pool = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, kind, output_format='zip', area_name=None, start=None, end=None):
+        """
+        Validates and queues a job rendering every `kind` challan, optionally of one
+        area and with a timestamp in [start, end). Returns the job id; raises
+        ValueError on a bad kind, format or range.
+        """
+        if kind not in KIND_STATUS:
+            raise ValueError(f"Unknown document kind '{kind}'; expected one of {', '.join(KIND_STATUS)}.")
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format '{output_format}'; expected one of {', '.join(OUTPUT_FORMATS)}.")
+        start, end = _parse_bound(start, 'start'), _parse_bound(end, 'end', end=True)
+        if start and end and start >= end:
+            raise ValueError("The range start must be before its end.")
+
+        self._expire()
+        job_id = uuid.uuid4().hex
+        database.create_pdf_job(job_id, kind, output_format, area_name or None, start, end)
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='pdf-jobs', daemon=True)
+                self._thread.start()
+        self._queue.put(job_id)
+        return job_id
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is None:
+                break
+            try:
+                job = database.get_pdf_job(job_id)
+                if job is not None:
+                    self._run_job(job)
+            except Exception:
+                logger.exception("Bulk PDF job %s failed.", job_id)
+
+    def _run_job(self, job):
+        kind, output_format = job['kind'], job['format']
+        filters = (job['area_name'], KIND_STATUS[kind], job['range_start'], job['range_end'])
+        total = database.count_challans(*filters)
+        database.update_pdf_job(job['id'], state='running', total=total)
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"challans_{kind}_{job['id']}.{OUTPUT_FORMATS[output_format][1]}")
+        last_update = time.monotonic()
+
+        def progress(rendered):
+            nonlocal last_update
+            if time.monotonic() - last_update >= PROGRESS_INTERVAL:
+                database.update_pdf_job(job['id'], rendered=rendered)
+                last_update = time.monotonic()
+
+        try:
+            with open(path + '.part', 'wb') as f:
+                rendered = write_output(f, kind, output_format, database.iter_challans(*filters),
+                                        self._get_pool(), self.workers, progress)
+            if rendered:
+                os.replace(path + '.part', path) # Downloads never see a half-written file
+            else:
+                os.remove(path + '.part')
+        except Exception as e:
+            if os.path.exists(path + '.part'):
+                os.remove(path + '.part')
+            database.update_pdf_job(job['id'], state='failed', error=str(e), finished_at=datetime.now().isoformat())
+            raise
+        database.update_pdf_job(job['id'], state='done', rendered=rendered, path=path if rendered else None,
+                                finished_at=datetime.now().isoformat())
+        logger.info("Bulk PDF job %s rendered %d %s challan(s).", job['id'], rendered, kind)
+
+    def _get_pool(self):
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    def _expire(self):
+        """Deletes jobs that finished more than JOB_RETENTION ago, and their files."""
+        for path in database.delete_finished_pdf_jobs((datetime.now() - JOB_RETENTION).isoformat()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def shutdown(self):
+        """Stops the coordinator after the running job (queued jobs stay queued) and the pool."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=5.0)
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner():
+    """Returns this process's PdfJobRunner, creating it on first use."""
+    global _runner
+    if _runner is None:
+        with _runner_lock:
+            if _runner is None:
+                _runner = PdfJobRunner()
+    return _runner
+
+
+def submit(kind, output_format='zip', area_name=None, start=None, end=None):
+    """Queues a bulk PDF job on this process's runner; see PdfJobRunner.submit()."""
+    return get_runner().submit(kind, output_format, area_name, start, end)
+
+
+def get_status(job_id):
+    """
+    The job's row from pdf_jobs plus a 'progress' fraction, or None for an unknown job.
+    The output path is not exposed; the download route serves the file.
+    """
+    job = database.get_pdf_job(job_id)
+    if job is None:
+        return None
+    job['progress'] = 1.0 if job['state'] == 'done' else (
+        round(job['rendered'] / job['total'], 3) if job['total'] else 0.0)
+    job['has_output'] = job.pop('path') is not None
+    return job
+
+
+def shutdown():
+    if _runner is not None:
+        _runner.shutdown()
+
+
+atexit.register(shutdown)
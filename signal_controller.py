@@ -0,0 +1,294 @@
+"""
+Adaptive signal timing for every junction.
+
+Instead of handing the green to a new lane on every tick, each junction runs
+a signal cycle: every lane gets one green phase followed by an all-red
+clearance interval. Green times are allocated from the lane densities that
+traffic_data.calculate_lane_density() produced for the tick, either with
+Webster's method (cycle length from the junction's total flow ratio, green
+split by each lane's flow ratio) or proportionally over a fixed cycle, and
+clamped to [MIN_GREEN, MAX_GREEN].
+
+A new plan is computed for all junctions every tick (a few NumPy passes over
+the lane arrays of a traffic_data.TrafficBatch, so hundreds of junctions cost
+well under a millisecond), but a running cycle is only replaced at its end.
+An emergency or VIP vehicle arriving at a lane that has not had its green yet
+in the running cycle preempts it: the current green is cut short and cleared,
+the priority lane goes next and the cycle carries on with the lanes still
+waiting. Cycles are never restarted, so they still run to their end.
+"""
+import logging
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+
+MIN_GREEN = 7.0 # Seconds; shortest green a lane is given
+MAX_GREEN = 60.0 # Seconds; longest green a lane is given
+ALL_RED = 2.0 # Seconds of clearance (all lanes red) after every green
+STARTUP_LOST = 2.0 # Seconds of each green lost to vehicles starting up (Webster's lost time)
+MIN_CYCLE = 30.0 # Seconds; bounds for the Webster cycle length
+MAX_CYCLE = 150.0
+PROPORTIONAL_CYCLE = 90.0 # Seconds; fixed cycle length of the proportional mode
+SATURATION_DENSITY = 800.0 # Lane density at which a lane's flow ratio reaches 1
+MAX_FLOW_RATIO = 0.9 # Junction flow ratio cap, keeps Webster's cycle finite when oversaturated
+
+TIMING_MODES = ('webster', 'proportional')
+TIMING_MODE = os.environ.get('TRAFFIC_SIGNAL_TIMING', 'webster')
+
+logger = logging.getLogger(__name__)
+
+
+def allocate_green(density, layout, mode=TIMING_MODE):
+    """
+    Allocates one cycle of green time to every lane of every junction.
+    density is the lane density array of a TrafficBatch whose layout (the
+    TrafficSimulator) groups lanes by junction. Returns (green seconds per lane,
+    cycle seconds per junction in layout.nonempty_areas order); a cycle is the
+    sum of its lanes' green plus ALL_RED each.
+    """
+    if mode not in TIMING_MODES:
+        raise ValueError(f"Unknown signal timing mode '{mode}'; expected one of {', '.join(TIMING_MODES)}.")
+    starts, segment = layout.lane_starts, layout.lane_segment
+    if not len(starts):
+        return np.zeros(0), np.zeros(0)
+    lane_count = np.diff(np.append(starts, len(segment)))
+    lost = lane_count * (STARTUP_LOST + ALL_RED)
+
+    density = np.asarray(density, dtype=np.float64)
+    if mode == 'webster':
+        weight = np.minimum(density / SATURATION_DENSITY, 1.0) # Flow ratio y of each lane
+        total = np.add.reduceat(weight, starts)
+        # Webster's optimum cycle C0 = (1.5L + 5) / (1 - Y)
+        cycle = np.clip((1.5 * lost + 5.0) / (1.0 - np.minimum(total, MAX_FLOW_RATIO)), MIN_CYCLE, MAX_CYCLE)
+    else:
+        weight = density
+        total = np.add.reduceat(weight, starts)
+        cycle = np.full(len(starts), PROPORTIONAL_CYCLE)
+
+    # Effective green split by weight (evenly when a junction is empty), plus the
+    # start-up loss back on top to get the displayed green.
+    effective = np.maximum(cycle - lost, 0.0)[segment]
+    share = np.divide(weight, total[segment], out=1.0 / lane_count[segment], where=total[segment] > 0)
+    green = np.clip(effective * share + STARTUP_LOST, MIN_GREEN, MAX_GREEN)
+    return green, np.add.reduceat(green + ALL_RED, starts)
+
+
+def current_phase(phases, elapsed):
+    """
+    Returns the 'current_phase' of a schedule() whose cycle started elapsed seconds ago:
+    the running phase's lane (None during clearance), its state and remaining seconds.
+    Also used to bring a schedule published by another process up to date.
+    """
+    for phase in phases:
+        green_end = phase['green_start'] + phase['green_seconds']
+        if 0 <= elapsed < green_end + phase['clearance_seconds']:
+            in_green = elapsed < green_end
+            return {
+                'lane_id': phase['lane_id'] if in_green else None,
+                'state': 'green' if in_green else 'all_red',
+                'remaining_seconds': round(float(green_end + (0 if in_green else phase['clearance_seconds'])
+                                                 - elapsed), 1),
+            }
+    # Past the cycle's end, until the next update() starts the next one
+    return {'lane_id': None, 'state': 'all_red', 'remaining_seconds': 0.0}
+
+
+def _first_by_rank(rank, layout):
+    """
+    Returns, for every junction with a lane of positive rank, the index of its first
+    lane with the junction's highest rank (lane arrays of a TrafficBatch).
+    """
+    best = np.maximum.reduceat(rank, layout.lane_starts)[layout.lane_segment]
+    winners = np.flatnonzero((rank > 0) & (rank == best))
+    segments = layout.lane_segment[winners]
+    return winners[np.concatenate(([True], segments[1:] != segments[:-1]))] if len(winners) else winners
+
+
+class SignalController:
+    """
+    Stateful phase timing for every junction of a TrafficSimulator layout.
+    update() is called once per tick with that tick's TrafficBatch and returns
+    the green lane of every area; schedule() describes one junction's cycle.
+    """
+
+    def __init__(self, layout, mode=TIMING_MODE):
+        if mode not in TIMING_MODES:
+            raise ValueError(f"Unknown signal timing mode '{mode}'; expected one of {', '.join(TIMING_MODES)}.")
+        self.layout = layout
+        self.mode = mode
+        segments = len(layout.lane_starts)
+        self._segment_of = {area_i: segment for segment, area_i in enumerate(layout.nonempty_areas)}
+        self._lane_count = np.diff(np.append(layout.lane_starts, len(layout.lane_segment)))
+        self._local = np.arange(len(layout.lane_segment)) - layout.lane_starts[layout.lane_segment]
+        # Running cycle of every junction: start time, length, each lane's position in
+        # the phase order and its green seconds. The next plan is adopted at the cycle's end.
+        self._cycle_start = np.zeros(segments)
+        self._cycle_length = np.zeros(segments)
+        self._position = self._local.copy()
+        self._green = np.zeros(len(layout.lane_segment))
+        self._flagged = np.zeros(len(layout.lane_segment), dtype=bool) # Emergency or VIP on the last tick
+        self._next_green = self._green
+        self._next_cycle = self._cycle_length
+        self._started = False
+        self._lock = threading.Lock() # schedule() is called from request threads
+        self.preemptions = 0
+
+    def update(self, batch, now):
+        """
+        Advances every junction to time now (epoch seconds) with this tick's lane
+        state. Returns the green lane id of every area aligned with batch.areas;
+        None while a junction is in all-red clearance or has no lanes.
+        """
+        with self._lock:
+            return self._update(batch, now)
+
+    def _update(self, batch, now):
+        layout = self.layout
+        green = [None] * len(layout.areas)
+        if not len(layout.lane_starts):
+            return green
+        self._next_green, self._next_cycle = allocate_green(batch.density, layout, self.mode)
+
+        if not self._started:
+            self._start_cycles(np.ones(len(layout.lane_starts), dtype=bool), now)
+            self._started = True
+        else:
+            # Cycles that ran out switch to the latest plan, back to back unless a
+            # whole cycle was missed (e.g. the ticks stalled).
+            ended = now >= self._cycle_start + self._cycle_length
+            if ended.any():
+                starts = self._cycle_start + self._cycle_length
+                self._start_cycles(ended, np.where(now - starts < self._next_cycle, starts, now))
+
+        lanes, in_green, phase_end = self._current_phase(now)
+
+        # Emergency and VIP vehicles that just arrived preempt the cycle if their lane has
+        # not had its green in it yet, or is the phase in clearance right now
+        flagged = batch.is_emergency | batch.is_vip
+        arrived = flagged & ~self._flagged
+        self._flagged = flagged
+        if arrived.any():
+            segment = layout.lane_segment
+            waiting = self._position > self._position[lanes][segment]
+            clearing = np.zeros(len(segment), dtype=bool)
+            clearing[lanes[~in_green]] = True
+            priority = _first_by_rank(np.where(arrived & (waiting | clearing),
+                                               np.where(batch.is_emergency, 2, 1), 0), layout)
+            if len(priority):
+                self.preemptions += len(priority)
+                logger.debug("Signal preemption at %d junction(s).", len(priority))
+                junctions = segment[priority]
+                cut = self._preempt(priority, lanes[junctions], in_green[junctions], phase_end[junctions], now)
+                lanes, in_green, _ = self._current_phase(now)
+                in_green[cut] = False # Their clearance starts now, whatever rounding is left in the green
+
+        lane_ids = layout.lane_ids
+        for area_i, lane, is_green in zip(layout.nonempty_areas, lanes.tolist(), in_green.tolist()):
+            if is_green:
+                green[area_i] = lane_ids[lane]
+        return green
+
+    def schedule(self, area_name, now):
+        """
+        Returns the running cycle of area_name as a dict (phases in order with their
+        offsets from the cycle start, the current phase and its remaining seconds),
+        or None for an unknown area, one without lanes, or before the first update().
+        """
+        segment = self._segment_of.get(self.layout.area_index.get(area_name))
+        if segment is None:
+            return None
+        with self._lock:
+            if not self._started:
+                return None
+            return self._schedule(area_name, segment, now)
+
+    def _schedule(self, area_name, segment, now):
+        layout = self.layout
+        start, count = int(layout.lane_starts[segment]), int(self._lane_count[segment])
+        elapsed = float(now - self._cycle_start[segment])
+
+        phases = []
+        offset = 0.0
+        for lane in (start + np.argsort(self._position[start:start + count])).tolist():
+            green_seconds = float(self._green[lane])
+            phases.append({
+                'lane_id': layout.lane_ids[lane],
+                'green_start': round(offset, 1),
+                'green_seconds': round(green_seconds, 1),
+                'clearance_seconds': ALL_RED,
+            })
+            offset += green_seconds + ALL_RED
+
+        return {
+            'area_name': area_name,
+            'mode': self.mode,
+            'cycle_start': datetime.fromtimestamp(self._cycle_start[segment]).isoformat(),
+            'cycle_length': round(float(self._cycle_length[segment]), 1),
+            'next_cycle_length': round(float(self._next_cycle[segment]), 1),
+            'phases': phases,
+            'current_phase': current_phase(phases, elapsed),
+        }
+
+    def _start_cycles(self, mask, start):
+        """Starts a new cycle, in lane order, from the latest plan for the junctions selected by mask."""
+        lanes = mask[self.layout.lane_segment]
+        self._green = np.where(lanes, self._next_green, self._green)
+        self._cycle_length = np.where(mask, self._next_cycle, self._cycle_length)
+        self._cycle_start = np.where(mask, start, self._cycle_start)
+        self._position = np.where(lanes, self._local, self._position)
+
+    def _preempt(self, priority, current, in_green, phase_end, now):
+        """
+        Gives each priority lane (indexes into the lane arrays, one per junction) the next
+        green of its junction, whose current phase is lane current ending phase_end seconds
+        into the cycle. Returns the junctions whose running green was cut short.
+        """
+        segment = self.layout.lane_segment
+        junctions = segment[priority]
+        # Seconds since the current green started, from the cycle offsets
+        into_green = now - self._cycle_start[junctions] - (phase_end - ALL_RED - self._green[current])
+        # A lane whose green just ended gets MIN_GREEN more straight away, without a clearance
+        same = priority == current
+        extra = into_green[same] + MIN_GREEN - self._green[priority[same]]
+        self._green[priority[same]] += extra
+        self._cycle_length[junctions[same]] += extra
+
+        # Any other lane moves up to right after the current phase, whose running green
+        # is cut short so its clearance starts now
+        moved = ~same
+        priority, current, junctions = priority[moved], current[moved], junctions[moved]
+        cut = in_green[moved]
+        green = np.where(cut, np.maximum(into_green[moved], 0.0), self._green[current])
+        self._cycle_length[junctions] -= self._green[current] - green
+        self._green[current] = green
+        after = np.full(len(self._cycle_length), -1) # Per junction: lanes after this position...
+        before = np.full(len(self._cycle_length), -1) # ...and before this one move back by one
+        after[junctions] = self._position[current]
+        before[junctions] = self._position[priority]
+        self._position[(self._position > after[segment]) & (self._position < before[segment])] += 1
+        self._position[priority] = self._position[current] + 1
+        return junctions[cut]
+
+    def _current_phase(self, now):
+        """
+        Returns (lane index, in green, phase end) of every junction's current phase at
+        time now; in green is False during a clearance interval, and the phase ends
+        (in seconds from the cycle start) after its clearance.
+        """
+        segment = self.layout.lane_segment
+        starts = self.layout.lane_starts
+        # Lay every cycle out in phase order, then find the first phase that ends
+        # after the elapsed time.
+        order = np.lexsort((self._position, segment))
+        slot = self._green[order] + ALL_RED
+        ends = np.cumsum(slot)
+        ends -= np.concatenate(([0.0], ends))[starts][segment] # Offsets from each cycle's start
+        elapsed = now - self._cycle_start
+        running = ends > elapsed[segment]
+        running[np.append(starts[1:], len(segment)) - 1] = True # The last phase runs to the cycle's end
+        running_segments = segment[running]
+        current = np.flatnonzero(running)[np.concatenate(([True], running_segments[1:] != running_segments[:-1]))]
+        in_green = (elapsed >= 0) & (elapsed < ends[current] - ALL_RED)
+        return order[current], in_green, ends[current]
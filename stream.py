@@ -0,0 +1,75 @@
+"""
+Server-Sent Events stream of an area's live state for the dashboard.
+
+A subscriber first receives the full snapshot, then one small event per engine
+publish: lane fields that changed, alert transitions and newly issued challans.
+Event ids are snapshot versions, so a reconnecting EventSource (which resends
+Last-Event-ID) gets the challans it missed.
+"""
+import json_provider
+
+LANE_FIELDS = ('two_wheelers', 'four_wheelers', 'density', 'is_emergency', 'is_vip', 'signal_status')
+KEEPALIVE_INTERVAL = 15.0 # Seconds of silence before a comment line keeps proxies from closing the stream
+
+
+def format_event(event, data, event_id=None):
+    """Formats one SSE message; data is a JSON string."""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {data}\n\n"
+
+
+def _dumps(data):
+    return json_provider.dumps(data)
+
+
+def lane_delta(previous, current):
+    """Returns the lane fields and green lane that changed between two snapshots of one area."""
+    lanes = {}
+    for lane_id, data in current.lanes_info.items():
+        before = previous.lanes_info.get(lane_id, {})
+        changed = {field: data[field] for field in LANE_FIELDS if before.get(field) != data[field]}
+        if changed:
+            lanes[lane_id] = changed
+    delta = {'timestamp': current.timestamp, 'lanes': lanes}
+    if current.current_green_lane != previous.current_green_lane:
+        delta['current_green_lane'] = current.current_green_lane
+    return delta
+
+
+def diff_events(previous, current, new_challans=()):
+    """Yields the SSE messages that bring a client holding 'previous' up to 'current'."""
+    yield format_event('lanes', _dumps(lane_delta(previous, current)), current.version)
+
+    if (current.alert_triggered, current.alert_message, current.alert_threshold) != \
+            (previous.alert_triggered, previous.alert_message, previous.alert_threshold):
+        yield format_event('alert', _dumps({
+            'alert_triggered': current.alert_triggered,
+            'alert_message': current.alert_message,
+            'alert_threshold': current.alert_threshold,
+        }), current.version)
+
+    for challan in new_challans:
+        yield format_event('challan', _dumps(challan), current.version)
+
+
+def area_events(traffic_engine, area_name, resume_version=None, keepalive=KEEPALIVE_INTERVAL):
+    """
+    Generator of SSE messages for one subscriber of area_name. resume_version is the
+    client's Last-Event-ID; challans published after it are replayed.
+    """
+    previous = traffic_engine.snapshot(area_name)
+    challan_cursor = previous.version if resume_version is None else resume_version
+    yield format_event('snapshot', previous.payload_json.decode('utf-8'), previous.version)
+
+    for challan in traffic_engine.challans_since(area_name, challan_cursor):
+        yield format_event('challan', _dumps(challan), previous.version)
+    challan_cursor = previous.version
+
+    while traffic_engine.running:
+        current = traffic_engine.wait_for_update(area_name, previous.version, keepalive)
+        if current is None:
+            yield ": keepalive\n\n"
+            continue
+        yield from diff_events(previous, current, traffic_engine.challans_since(area_name, challan_cursor))
+        challan_cursor = current.version
+        previous = current
@@ -0,0 +1,23 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database
+
+
+@pytest.fixture
+def temp_db(tmp_path):
+    """Points database.DATABASE_FILE at a fresh, initialized temporary file (never traffic_data.db)."""
+    original = database.DATABASE_FILE
+    database.DATABASE_FILE = str(tmp_path / 'test.db')
+    database.init_db()
+    try:
+        yield database.DATABASE_FILE
+    finally:
+        database.shutdown_traffic_log_writer() # Commit queued rows to this database, not the next test's
+        database.close_all_connections()
+        database.clear_caches()
+        database.DATABASE_FILE = original
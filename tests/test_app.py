@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import app
+import database
+
+
+@pytest.fixture
+def client(temp_db):
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    return client
+
+
+def test_history_start_with_offset_and_no_end(client):
+    start = datetime.now(timezone.utc) - timedelta(minutes=10)
+    response = client.get('/api/historical_traffic_data/Sayajigunj', query_string={'start': start.isoformat()})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['resolution'] == 'raw'
+    local_start = datetime.fromisoformat(body['start'])
+    assert local_start.tzinfo is None
+    assert abs(local_start - start.astimezone().replace(tzinfo=None)) < timedelta(seconds=1)
+
+
+def test_history_rejects_a_malformed_start(client):
+    response = client.get('/api/historical_traffic_data/Sayajigunj', query_string={'start': 'yesterday'})
+    assert response.status_code == 400
+
+
+def test_resolution_of_offset_aware_range():
+    end = datetime.now(timezone.utc)
+    assert database.choose_history_resolution(end - timedelta(minutes=5), end) == 'raw'
+    assert database.choose_history_resolution(end - timedelta(hours=10), datetime.now()) == 'minute'
+
+
+def test_bare_app_runs_startup_in_its_first_request(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, 'DATABASE_FILE', str(tmp_path / 'fresh.db')) # Never initialized
+    monkeypatch.setattr(app, '_startup_report', None)
+    client = app.app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    try:
+        response = client.get('/api/challans/Sayajigunj')
+        assert response.status_code == 200
+        assert app._startup_report['seeded_challans'] > 0
+    finally:
+        database.close_all_connections()
+        database.clear_caches()
+
+
+def test_import_reports_a_non_text_column_as_a_bad_row(client):
+    body = '{"area_name": "Sayajigunj", "violation_type": "No Helmet"}\n{"area_name": ["x"], "violation_type": "No Helmet"}\n'
+    response = client.post('/api/challans/import', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 400
+    assert response.get_json()['error'].startswith("Import stopped: Row 2: Expected text for area_name.")
+
+
+def test_alert_events_range_with_offset_is_compared_in_local_time(client):
+    now = datetime.now()
+    with database.get_connection() as conn:
+        conn.executemany(database.INSERT_ALERT_EVENT_SQL, [
+            ('Sayajigunj', 'Lane 1', 'raised', (now - timedelta(hours=2)).isoformat(), 0.9, 0.8, None, None),
+            ('Sayajigunj', 'Lane 1', 'cleared', (now - timedelta(minutes=10)).isoformat(), 0.5, 0.8, 600.0, 0.95),
+        ])
+    start = (now - timedelta(hours=1)).astimezone(timezone(timedelta(hours=5, minutes=30)))
+    response = client.get('/api/alert_events/Sayajigunj', query_string={'start': start.isoformat()})
+    assert [event['kind'] for event in response.get_json()['events']] == ['cleared']
+
+    assert client.get('/api/alert_events/Sayajigunj', query_string={'end': 'yesterday'}).status_code == 400
+    response = client.get('/api/alert_events/Sayajigunj', query_string={'start': '2024-06-03'})
+    assert len(response.get_json()['events']) == 2
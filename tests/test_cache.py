@@ -0,0 +1,29 @@
+import sqlite3
+import time
+
+import database
+
+
+def _set_threshold_elsewhere(path, max_density):
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(database.UPSERT_ALERT_THRESHOLD_SQL, ('Sayajigunj', max_density))
+    conn.close()
+
+
+def test_other_connections_writes_show_after_the_sync_interval(temp_db, monkeypatch):
+    monkeypatch.setattr(database, 'CACHE_SYNC_INTERVAL', 0.2)
+    database.set_alert_threshold('Sayajigunj', 100)
+    assert database.get_alert_threshold('Sayajigunj') == 100
+
+    _set_threshold_elsewhere(temp_db, 120)
+    assert database.get_alert_threshold('Sayajigunj') == 100 # Not checked again yet
+    time.sleep(0.25)
+    assert database.get_alert_threshold('Sayajigunj') == 120
+
+
+def test_own_writes_show_immediately(temp_db, monkeypatch):
+    monkeypatch.setattr(database, 'CACHE_SYNC_INTERVAL', 60.0)
+    assert database.get_alert_threshold('Sayajigunj') == 150
+    database.set_alert_threshold('Sayajigunj', 90)
+    assert database.get_alert_threshold('Sayajigunj') == 90
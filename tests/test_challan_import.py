@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import database
+import traffic_data
+
+AREA = 'Sayajigunj'
+
+
+def _challan(**fields):
+    return dict({'area_name': AREA, 'violation_type': 'Over Speeding', 'vehicle_number': 'GJ06AB1234'}, **fields)
+
+
+def test_import_moves_the_sync_cursor_and_generation(temp_db):
+    before = database.get_challans_page(AREA)['sync_cursor']
+    generation = database.get_challans_generation(AREA)
+    old = (datetime.now() - timedelta(days=30)).isoformat()
+
+    assert database.add_challans([_challan(timestamp=old)]) == 1
+
+    assert database.get_challans_generation(AREA) != generation
+    changed = database.get_challans_page(AREA, since=before)['challans']
+    assert [challan['timestamp'] for challan in changed] == [old]
+    assert changed[0]['updated_at'] > old
+
+
+def test_missing_fine_amount_defaults_to_the_violation_fine(temp_db):
+    database.add_challans([_challan(), _challan(fine_amount=''), _challan(fine_amount=0)])
+    fines = sorted(challan['fine_amount'] for challan in database.get_challans_page(AREA, limit=500)['challans']
+                   if challan['vehicle_number'] == 'GJ06AB1234')
+    assert fines == [0, traffic_data.FINE_AMOUNTS['Over Speeding'], traffic_data.FINE_AMOUNTS['Over Speeding']]
+
+
+@pytest.mark.parametrize('timestamp', ['yesterday', '2024-13-01T00:00:00', '01/05/2024'])
+def test_malformed_timestamp_is_an_invalid_row(temp_db, timestamp):
+    with pytest.raises(ValueError, match="Row 2: Invalid timestamp"):
+        database.add_challans([_challan(), _challan(timestamp=timestamp)])
+
+
+@pytest.mark.parametrize('fields', [{'area_name': [AREA]}, {'violation_type': {'type': 'No Helmet'}},
+                                    {'vehicle_number': 1234}, {'owner_name': ['x']}])
+def test_non_text_column_is_an_invalid_row(temp_db, fields):
+    with pytest.raises(ValueError, match="Row 2: Expected text for " + next(iter(fields))):
+        database.add_challans([_challan(), _challan(**fields)])
+    assert database.get_challans_page(AREA)['challans'][0]['vehicle_number'] == 'GJ06AB1234' # Row 1 stays
@@ -0,0 +1,32 @@
+import pytest
+
+import database
+
+
+@pytest.mark.parametrize('challan_id', ['abc', '1.5', 1.5, True, [1]])
+def test_non_integer_challan_id_is_invalid(temp_db, challan_id):
+    result, = database.update_challan_statuses([{'challan_id': challan_id, 'new_status': 'paid'}])
+    assert result['result'] == 'invalid'
+    assert 'challan_id' in result['error']
+
+
+def test_challan_id_may_be_a_string_of_digits(temp_db):
+    challan_id = database.add_challan('Sayajigunj', 'Lane 1', 'No Helmet', 'GJ06AB1234', 'N/A', 'N/A', 'N/A',
+                                      'N/A', 'N/A', 'N/A', 200)
+    results = database.update_challan_statuses([
+        {'challan_id': str(challan_id), 'new_status': 'paid'},
+        {'challan_id': 'abc', 'new_status': 'paid'},
+        {'challan_id': 10 ** 9, 'new_status': 'paid'},
+    ])
+    assert [result['result'] for result in results] == ['updated', 'invalid', 'not_found']
+    assert results[0]['challan_ids'] == [challan_id]
+    assert database.get_challan_by_id(challan_id)['status'] == 'paid'
+
+
+@pytest.mark.parametrize('key', ['challan_number', 'transaction_id'])
+@pytest.mark.parametrize('value', [{'number': 'X'}, ['X'], 1.5, True])
+def test_non_scalar_match_value_is_invalid(temp_db, key, value):
+    results = database.update_challan_statuses([{key: value, 'new_status': 'paid'},
+                                                {key: 'X', 'new_status': 'paid'}])
+    assert [result['result'] for result in results] == ['invalid', 'not_found']
+    assert key in results[0]['error']
@@ -0,0 +1,76 @@
+import queue
+import time
+
+import pytest
+
+import engine
+
+AREAS = ['Sayajigunj', 'Akota Bridge']
+
+
+def _wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "Timed out"
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def leader(temp_db):
+    lock_file = engine._open_engine_lock()
+    assert engine._try_engine_lock(lock_file)
+    traffic_engine = engine.TrafficEngine(AREAS, tick_interval=3600, seed=7, publish=True)
+    traffic_engine.start()
+    yield traffic_engine, lock_file
+    traffic_engine.stop()
+    lock_file.close()
+
+
+def test_mirror_serves_the_leaders_snapshots(leader):
+    traffic_engine, _ = leader
+    mirror = engine.SnapshotMirror(engine._open_engine_lock(), AREAS, poll_interval=0.02)
+    mirror.start(wait=1.0)
+    try:
+        for _ in range(3):
+            for area_name in AREAS:
+                published, mirrored = traffic_engine.snapshot(area_name), mirror.snapshot(area_name)
+                assert mirrored.version == published.version
+                assert mirrored.payload_json == published.payload_json
+                assert mirrored.payload_v2_json == published.payload_v2_json
+                schedule = mirror.signal_schedule(area_name)
+                assert schedule['phases'] == traffic_engine.signal_schedule(area_name)['phases']
+            version = traffic_engine.snapshot(AREAS[0]).version
+            traffic_engine.tick()
+            assert mirror.wait_for_update(AREAS[0], version, 2.0).version > version
+        assert mirror.leader is None
+        assert mirror.republish(AREAS[0]) is None
+    finally:
+        mirror.stop()
+
+
+def test_mirror_takes_over_when_the_leader_exits(leader):
+    traffic_engine, lock_file = leader
+    mirror = engine.SnapshotMirror(engine._open_engine_lock(), AREAS, poll_interval=0.02)
+    mirror.start(wait=1.0)
+    try:
+        last_version = traffic_engine.snapshot(AREAS[-1]).version
+        traffic_engine.stop()
+        lock_file.close()
+        _wait_until(lambda: mirror.leader is not None)
+        # The new engine continues the published version sequence
+        assert mirror.snapshot(AREAS[0]).version > last_version
+    finally:
+        mirror.stop()
+
+
+def test_snapshot_is_published_when_logging_fails(temp_db, monkeypatch):
+    traffic_engine = engine.TrafficEngine(AREAS, seed=7)
+    traffic_engine.tick()
+    before = traffic_engine.snapshot(AREAS[0])
+
+    def full_queue(area_name, lanes_info):
+        raise queue.Full
+    monkeypatch.setattr(engine.database, 'log_traffic_data', full_queue)
+    traffic_engine.tick()
+    assert all(traffic_engine.snapshot(area_name).tick == 2 for area_name in AREAS)
+    assert traffic_engine.snapshot(AREAS[0]).version > before.version
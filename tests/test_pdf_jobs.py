@@ -0,0 +1,21 @@
+from datetime import datetime, timezone
+
+import pytest
+
+import pdf_jobs
+
+
+def test_offset_aware_bound_is_converted_to_local_time():
+    moment = datetime(2024, 6, 3, 12, 30, tzinfo=timezone.utc)
+    assert pdf_jobs._parse_bound(moment.isoformat(), 'start') == \
+        moment.astimezone().replace(tzinfo=None).isoformat()
+
+
+def test_bare_date_end_bound_covers_the_whole_day():
+    assert pdf_jobs._parse_bound('2024-06-03', 'start') == '2024-06-03T00:00:00'
+    assert pdf_jobs._parse_bound('2024-06-03', 'end', end=True) == '2024-06-04T00:00:00'
+
+
+def test_malformed_bound_is_rejected():
+    with pytest.raises(ValueError, match="Invalid start"):
+        pdf_jobs._parse_bound('yesterday', 'start')
@@ -0,0 +1,104 @@
+from datetime import datetime
+
+import pytest
+
+import signal_controller
+import traffic_data
+
+AREA = 'Sayajigunj'
+
+
+def _batch(simulator, emergency=None):
+    """One simulated tick with the priority flags cleared, except an emergency at lane id emergency."""
+    batch = simulator.simulate()
+    batch.is_emergency[:] = False
+    batch.is_vip[:] = False
+    if emergency is not None:
+        batch.is_emergency[simulator.lane_ids.index(emergency)] = True
+    return batch
+
+
+@pytest.fixture
+def junction():
+    simulator = traffic_data.TrafficSimulator([AREA], seed=1)
+    controller = signal_controller.SignalController(simulator)
+    now = 1_000_000.0
+    controller.update(_batch(simulator), now)
+    return simulator, controller, now, controller.schedule(AREA, now)
+
+
+def _order(schedule):
+    return [phase['lane_id'] for phase in schedule['phases']]
+
+
+def test_waiting_lane_goes_next_without_restarting_the_cycle(junction):
+    simulator, controller, now, plan = junction
+    first, last = _order(plan)[0], _order(plan)[-1]
+
+    assert controller.update(_batch(simulator, emergency=last), now + 3) == [None] # The running green is cleared
+    preempted = controller.schedule(AREA, now + 3)
+    assert preempted['cycle_start'] == plan['cycle_start']
+    assert _order(preempted)[:2] == [first, last]
+    # Still there on the next tick: not a new arrival
+    assert controller.update(_batch(simulator, emergency=last), now + 3 + signal_controller.ALL_RED) == [last]
+    assert controller.preemptions == 1
+
+
+def test_preemption_at_the_cycle_start_clears_the_first_green():
+    simulator = traffic_data.TrafficSimulator([AREA], seed=0)
+    controller = signal_controller.SignalController(simulator)
+    now = 1_760_000_000.123 # Epoch-sized, as from time.time()
+    last = simulator.lane_ids[-1]
+
+    assert controller.update(_batch(simulator, emergency=last), now) == [None]
+    schedule = controller.schedule(AREA, now)
+    assert schedule['phases'][0]['green_seconds'] == 0.0
+    assert schedule['phases'][1]['lane_id'] == last
+    assert schedule['current_phase']['state'] == 'all_red'
+
+
+def test_served_lane_does_not_preempt(junction):
+    simulator, controller, now, plan = junction
+    first, second = _order(plan)[:2]
+    in_second = now + plan['phases'][1]['green_start'] + 1
+
+    assert controller.update(_batch(simulator), in_second) == [second]
+    assert controller.update(_batch(simulator, emergency=first), in_second + 1) == [second]
+    assert controller.preemptions == 0
+    assert _order(controller.schedule(AREA, in_second + 1)) == _order(plan)
+
+
+def test_lane_in_its_clearance_gets_the_green_back_at_once(junction):
+    simulator, controller, now, plan = junction
+    first = _order(plan)[0]
+    clearing = now + plan['phases'][0]['green_seconds'] + signal_controller.ALL_RED / 2
+
+    assert controller.update(_batch(simulator), clearing) == [None]
+    assert controller.update(_batch(simulator, emergency=first), clearing + 0.1) == [first]
+    assert controller.schedule(AREA, clearing + 0.1)['cycle_start'] == plan['cycle_start']
+
+
+def test_cycles_complete_under_the_default_flag_rates():
+    simulator = traffic_data.TrafficSimulator(traffic_data.get_available_areas(), seed=3)
+    controller = signal_controller.SignalController(simulator)
+    now, ticks, all_red = 1_000_000.0, 1200, 0
+    cycles = {area_name: [] for area_name in simulator.areas} # [(start, length)] as last seen
+    for _ in range(ticks):
+        all_red += controller.update(simulator.simulate(), now).count(None)
+        for area_name, area_cycles in cycles.items():
+            schedule = controller.schedule(area_name, now)
+            cycle = (datetime.fromisoformat(schedule['cycle_start']).timestamp(), schedule['cycle_length'])
+            if area_cycles and area_cycles[-1][0] == cycle[0]:
+                area_cycles[-1] = cycle
+            else:
+                area_cycles.append(cycle)
+        now += 3.0
+
+    assert controller.preemptions > 0
+    for area_cycles in cycles.values():
+        assert len(area_cycles) > 5
+        # Every cycle ran to its end: the next one started right after it
+        for (start, length), (next_start, _) in zip(area_cycles, area_cycles[1:]):
+            assert next_start == pytest.approx(start + length, abs=0.1)
+    # Apart from the clearance each preemption starts, no more all-red than a fixed rotation
+    assert (all_red - controller.preemptions) / (ticks * len(simulator.areas)) < 0.12
@@ -0,0 +1,70 @@
+import sqlite3
+import threading
+
+import database
+
+
+def _rows(count, area_name='Sayajigunj', lane_id='Lane 1'):
+    return [(area_name, lane_id, 1_700_000_000_000 + i * 3000, 10, 5, 20) for i in range(count)]
+
+
+def _logged_rows():
+    return database.get_connection().execute("SELECT COUNT(*) FROM traffic_logs").fetchone()[0]
+
+
+def test_transient_lock_is_retried(temp_db, monkeypatch):
+    insert = database._insert_traffic_logs
+    failures = []
+
+    def locked_twice(rows, alert_events=()):
+        if len(failures) < 2:
+            failures.append(1)
+            raise sqlite3.OperationalError("database is locked")
+        insert(rows, alert_events)
+
+    monkeypatch.setattr(database, '_insert_traffic_logs', locked_twice)
+    writer = database.TrafficLogWriter(flush_interval=0.01, retry_backoff=0.01)
+    try:
+        writer.submit(_rows(5))
+        writer.flush()
+    finally:
+        writer.close()
+    assert writer.retries == 2
+    assert writer.rows_written == 5
+    assert _logged_rows() == 5
+
+
+def test_lock_held_by_another_connection_is_retried(temp_db, monkeypatch):
+    # A short busy_timeout makes the writer's connection give up on the lock quickly,
+    # as it does under concurrent writers once the real 5 s timeout runs out
+    monkeypatch.setattr(database, 'SQLITE_PRAGMAS', database.SQLITE_PRAGMAS[:-1] + ("PRAGMA busy_timeout=20",))
+    blocker = sqlite3.connect(temp_db, check_same_thread=False) # Released from the timer thread
+    blocker.execute("BEGIN EXCLUSIVE")
+    release = threading.Timer(0.3, blocker.rollback)
+    writer = database.TrafficLogWriter(flush_interval=0.01, write_retries=6, retry_backoff=0.05)
+    try:
+        release.start()
+        writer.submit(_rows(5))
+        writer.flush()
+    finally:
+        release.join()
+        blocker.close()
+        writer.close()
+    assert writer.retries >= 1
+    assert writer.rows_written == 5
+    assert _logged_rows() == 5
+
+
+def test_persistent_failure_is_dropped_after_retries(temp_db, monkeypatch):
+    def always_locked(rows, alert_events=()):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(database, '_insert_traffic_logs', always_locked)
+    writer = database.TrafficLogWriter(flush_interval=0.01, write_retries=3, retry_backoff=0.001)
+    try:
+        writer.submit(_rows(5))
+        writer.flush()
+    finally:
+        writer.close()
+    assert writer.retries == 3
+    assert writer.rows_written == 0
@@ -1,7 +1,17 @@
+import json
+import logging
+import os
 import random
 import time
+from collections.abc import Mapping
 from datetime import datetime
 
+import numpy as np
+
+import vehicle_registry
+
+logger = logging.getLogger(__name__)
+
 # Predefined areas/intersections with their lane configurations
 # These are common residential areas in Vadodara, chosen to represent different traffic points.
 AREAS = {
@@ -100,25 +110,28 @@ DUMMY_PEOPLE_VEHICLES = [
     {"name": "Nandini Rao", "phone": "9222222333", "vehicle_type": "Car", "rc_number": "GJ06U1V234"}
 ]
 
-# Keep track of which dummy people have been used for challans in the current session
-# This ensures a bit more variety, though it resets on app restart
-_used_dummy_people_indices = set()
+# Registered vehicles for RC-number lookups; violators are drawn from here without replacement
+# (every vehicle once before any repeats). TRAFFIC_VEHICLE_REGISTRY points at a CSV or SQLite
+# registry to load instead of the dummy data. The draw state is per process.
+VEHICLE_REGISTRY_FILE = os.environ.get('TRAFFIC_VEHICLE_REGISTRY')
+VEHICLE_REGISTRY = (vehicle_registry.VehicleRegistry.from_file(VEHICLE_REGISTRY_FILE) if VEHICLE_REGISTRY_FILE
+                    else vehicle_registry.VehicleRegistry(DUMMY_PEOPLE_VEHICLES))
 
-def generate_random_vehicle_number():
+def generate_random_vehicle_number(rng=random):
     """Generates a random Indian-style vehicle number (e.g., GJ06AB1234)."""
     state_code = "GJ" # Gujarat
-    district_code = str(random.randint(1, 99)).zfill(2) # 01 to 99
-    series = ''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=2))
-    number = str(random.randint(1000, 9999))
+    district_code = str(rng.randint(1, 99)).zfill(2) # 01 to 99
+    series = ''.join(rng.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ', k=2))
+    number = str(rng.randint(1000, 9999))
     return f"{state_code}{district_code}{series}{number}"
 
-def generate_challan_number():
+def generate_challan_number(rng=random):
     """Generates a dummy challan number (e.g., CHLN-2024-000123)."""
-    return f"CHLN-{datetime.now().year}-{random.randint(1, 999999):06d}"
+    return f"CHLN-{datetime.now().year}-{rng.randint(1, 999999):06d}"
 
-def generate_transaction_id():
+def generate_transaction_id(rng=random):
     """Generates a dummy transaction ID (e.g., TXN-ABC123XYZ789)."""
-    return f"TXN-{''.join(random.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=12))}"
+    return f"TXN-{''.join(rng.choices('ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', k=12))}"
 
 def get_state_from_rc(rc_number):
     """Extracts the state code from an RC number (e.g., 'GJ' from 'GJ06AB1234')."""
@@ -126,6 +139,14 @@ def get_state_from_rc(rc_number):
         return rc_number[:2].upper()
     return "N/A"
 
+# Why priority_lane_indices() picked a lane
+PRIORITY_DENSITY, PRIORITY_VIP, PRIORITY_EMERGENCY = 0, 1, 2
+
+# Per-cycle probabilities used by the simulators
+EMERGENCY_PROBABILITY = 0.05 # Per lane
+VIP_PROBABILITY = 0.02       # Per lane
+VIOLATION_PROBABILITY = 0.05 # Per area
+
 def simulate_traffic_data(area_name):
     """
     Simulates real-time vehicle counts (2-wheelers & 4-wheelers)
@@ -147,9 +168,9 @@ def simulate_traffic_data(area_name):
         four_wheelers = random.randint(5, 60)
 
         # Simulate emergency vehicle presence with a low probability
-        is_emergency = random.choices([True, False], weights=[0.05, 0.95], k=1)[0]
+        is_emergency = random.choices([True, False], weights=[EMERGENCY_PROBABILITY, 1 - EMERGENCY_PROBABILITY], k=1)[0]
         # Even lower probability for VIP
-        is_vip = random.choices([True, False], weights=[0.02, 0.98], k=1)[0]
+        is_vip = random.choices([True, False], weights=[VIP_PROBABILITY, 1 - VIP_PROBABILITY], k=1)[0]
 
         density = calculate_lane_density(two_wheelers, four_wheelers)
 
@@ -163,54 +184,51 @@ def simulate_traffic_data(area_name):
         }
 
     # Simulate a traffic violation with a very low probability for the entire area per cycle
-    if random.random() < 0.05: # 5% chance per simulation cycle for a violation
-        # Try to pick an unused dummy person
-        available_indices = list(set(range(len(DUMMY_PEOPLE_VEHICLES))) - _used_dummy_people_indices)
-        
-        chosen_person = None
-        if available_indices:
-            chosen_index = random.choice(available_indices)
-            chosen_person = DUMMY_PEOPLE_VEHICLES[chosen_index]
-            _used_dummy_people_indices.add(chosen_index) # Mark as used
-        elif DUMMY_PEOPLE_VEHICLES:
-            # If all are used, reset the used set (or pick a random one if we don't want to reset)
-            _used_dummy_people_indices.clear()
-            chosen_person = random.choice(DUMMY_PEOPLE_VEHICLES)
-            _used_dummy_people_indices.add(DUMMY_PEOPLE_VEHICLES.index(chosen_person))
-        
-        if chosen_person:
-            violation_type = random.choice(VIOLATION_TYPES)
-            violation_details = {
-                'lane_id': random.choice(lanes_in_area), # Assign to a random lane in the area
-                'violation_type': violation_type,
-                'vehicle_number': chosen_person['rc_number'],
-                'owner_name': chosen_person['name'], # This will be "Violator Name" in display
-                'owner_phone': chosen_person['phone'],
-                'vehicle_type': chosen_person['vehicle_type'],
-                'challan_number': generate_challan_number(),
-                'transaction_id': generate_transaction_id(),
-                'state': get_state_from_rc(chosen_person['rc_number']),
-                'fine_amount': FINE_AMOUNTS.get(violation_type, 200) # Get fine amount, default to 200
-            }
-        else:
-            # Fallback to completely random if no dummy people data is available
-            random_rc = generate_random_vehicle_number()
-            violation_type = random.choice(VIOLATION_TYPES)
-            violation_details = {
-                'lane_id': random.choice(lanes_in_area),
-                'violation_type': violation_type,
-                'vehicle_number': random_rc,
-                'owner_name': "Random Citizen",
-                'owner_phone': "N/A",
-                'vehicle_type': random.choice(["Car", "Motorcycle", "Scooter", "Truck"]),
-                'challan_number': generate_challan_number(),
-                'transaction_id': generate_transaction_id(),
-                'state': get_state_from_rc(random_rc),
-                'fine_amount': FINE_AMOUNTS.get(violation_type, 200)
-            }
+    if random.random() < VIOLATION_PROBABILITY: # 5% chance per simulation cycle for a violation
+        violation_details = simulate_violation(lanes_in_area)
 
     return lanes_data, violation_details # Return violation details along with lane data
 
+def simulate_violation(lanes_in_area, rng=random):
+    """
+    Simulates one traffic violation in a random lane of lanes_in_area, using dummy data if available.
+    rng is a random.Random-like source, so seeded simulators can reproduce violations.
+    """
+    chosen_person = VEHICLE_REGISTRY.draw(rng) # Next unused dummy person, if any are registered
+
+    if chosen_person:
+        violation_type = rng.choice(VIOLATION_TYPES)
+        violation_details = {
+            'lane_id': rng.choice(lanes_in_area), # Assign to a random lane in the area
+            'violation_type': violation_type,
+            'vehicle_number': chosen_person['rc_number'],
+            'owner_name': chosen_person['name'], # This will be "Violator Name" in display
+            'owner_phone': chosen_person['phone'],
+            'vehicle_type': chosen_person['vehicle_type'],
+            'challan_number': generate_challan_number(rng),
+            'transaction_id': generate_transaction_id(rng),
+            'state': get_state_from_rc(chosen_person['rc_number']),
+            'fine_amount': FINE_AMOUNTS.get(violation_type, 200) # Get fine amount, default to 200
+        }
+    else:
+        # Fallback to completely random if no dummy people data is available
+        random_rc = generate_random_vehicle_number(rng)
+        violation_type = rng.choice(VIOLATION_TYPES)
+        violation_details = {
+            'lane_id': rng.choice(lanes_in_area),
+            'violation_type': violation_type,
+            'vehicle_number': random_rc,
+            'owner_name': "Random Citizen",
+            'owner_phone': "N/A",
+            'vehicle_type': rng.choice(["Car", "Motorcycle", "Scooter", "Truck"]),
+            'challan_number': generate_challan_number(rng),
+            'transaction_id': generate_transaction_id(rng),
+            'state': get_state_from_rc(random_rc),
+            'fine_amount': FINE_AMOUNTS.get(violation_type, 200)
+        }
+
+    return violation_details
+
 def calculate_lane_density(two_wheelers, four_wheelers):
     """
     Calculates a weighted lane density.
@@ -228,16 +246,19 @@ def determine_green_lane(lanes_data):
     green_lane_id = None
     highest_density = -1
 
+    if isinstance(lanes_data, AreaState):
+        return _determine_green_lane_columns(lanes_data)
+
     # First, check for emergency vehicles
     for lane_id, data in lanes_data.items():
         if data['is_emergency']:
-            print(f"Emergency vehicle detected in {lane_id}. Prioritizing.")
+            _log_priority('emergency', None, lane_id)
             return lane_id
 
     # Second, check for VIP movements (if no emergency)
     for lane_id, data in lanes_data.items():
         if data['is_vip']:
-            print(f"VIP movement detected in {lane_id}. Prioritizing.")
+            _log_priority('vip', None, lane_id)
             return lane_id
 
     # If no emergency or VIP, find the lane with the highest density
@@ -248,10 +269,358 @@ def determine_green_lane(lanes_data):
 
     return green_lane_id
 
+def _determine_green_lane_columns(area_state):
+    """determine_green_lane() over an AreaState's columns instead of per-lane mappings."""
+    lane_ids = area_state.lane_ids
+    if True in area_state.is_emergency:
+        lane_id = lane_ids[area_state.is_emergency.index(True)]
+        _log_priority('emergency', area_state.area_name, lane_id)
+        return lane_id
+    if True in area_state.is_vip:
+        lane_id = lane_ids[area_state.is_vip.index(True)]
+        _log_priority('vip', area_state.area_name, lane_id)
+        return lane_id
+    if not lane_ids:
+        return None
+    # max() returns the first of equal densities, like the strict '>' scan above
+    return lane_ids[max(range(len(lane_ids)), key=area_state.density.__getitem__)]
+
+# Emergency/VIP overrides are logged, not printed, and only a sample of them:
+# a city-wide grid sees hundreds per tick. Each record carries structured
+# fields (event, reason, area_name, lane_id, sample_rate) for log processors.
+PRIORITY_LOG_SAMPLE_RATE = float(os.environ.get('TRAFFIC_PRIORITY_LOG_SAMPLE_RATE', 0.01))
+_PRIORITY_MESSAGES = {
+    'emergency': "Emergency vehicle detected in %s (%s). Prioritizing.",
+    'vip': "VIP movement detected in %s (%s). Prioritizing.",
+}
+_log_sampler = random.Random() # Separate from the simulation's random state
+
+def _log_priority(reason, area_name, lane_id):
+    """Logs a sampled emergency/VIP override at INFO."""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    if PRIORITY_LOG_SAMPLE_RATE < 1 and _log_sampler.random() >= PRIORITY_LOG_SAMPLE_RATE:
+        return
+    logger.info(_PRIORITY_MESSAGES[reason], lane_id, area_name or 'unknown area', extra={
+        'event': 'signal_priority',
+        'reason': reason,
+        'area_name': area_name,
+        'lane_id': lane_id,
+        'sample_rate': PRIORITY_LOG_SAMPLE_RATE,
+    })
+
 def get_available_areas():
     """Returns a list of all predefined area names."""
     return list(AREAS.keys())
 
+# --- Lane State ---
+# Struct-of-arrays lane storage: an AreaState keeps one list per field instead
+# of one dict per lane, is refilled in place every tick, and writes its JSON
+# directly. LaneState is a slotted view of one lane that reads like the old
+# per-lane dicts (lane['density']) as well as by attribute (lane.density).
+LANE_FIELDS = ('two_wheelers', 'four_wheelers', 'density', 'is_emergency', 'is_vip', 'signal_status')
+
+class LaneState(Mapping):
+    """Read-only view of lane `index` of an AreaState."""
+
+    __slots__ = ('_area', '_index')
+
+    def __init__(self, area, index):
+        self._area = area
+        self._index = index
+
+    @property
+    def two_wheelers(self):
+        return self._area.two_wheelers[self._index]
+
+    @property
+    def four_wheelers(self):
+        return self._area.four_wheelers[self._index]
+
+    @property
+    def density(self):
+        return self._area.density[self._index]
+
+    @property
+    def is_emergency(self):
+        return self._area.is_emergency[self._index]
+
+    @property
+    def is_vip(self):
+        return self._area.is_vip[self._index]
+
+    @property
+    def signal_status(self):
+        return 'GREEN' if self._index == self._area.green_index else 'RED'
+
+    def __getitem__(self, field):
+        if field not in LANE_FIELDS:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __iter__(self):
+        return iter(LANE_FIELDS)
+
+    def __len__(self):
+        return len(LANE_FIELDS)
+
+    def __repr__(self):
+        return f"LaneState({dict(self)!r})"
+
+class AreaState(Mapping):
+    """
+    Lane state of one area as parallel per-field sequences indexed like lane_ids, plus
+    the green lane. Maps lane id -> LaneState, so code written for lanes_data dicts
+    (items(), lanes['Lane 1']['density']) keeps working. load() refills it in place;
+    freeze() returns an immutable tuple-backed copy for publishing.
+    """
+
+    __slots__ = ('area_name', 'lane_ids', 'two_wheelers', 'four_wheelers', 'density', 'is_emergency', 'is_vip',
+                 'green_index', '_positions', '_json_keys', '_lanes')
+
+    def __init__(self, area_name, lane_ids):
+        lane_count = len(lane_ids)
+        self.area_name = area_name
+        self.lane_ids = tuple(lane_ids)
+        self.two_wheelers = [0] * lane_count
+        self.four_wheelers = [0] * lane_count
+        self.density = [0] * lane_count
+        self.is_emergency = [False] * lane_count
+        self.is_vip = [False] * lane_count
+        self.green_index = None
+        self._positions = {lane_id: i for i, lane_id in enumerate(self.lane_ids)}
+        self._json_keys = tuple(json.dumps(lane_id) + ': ' for lane_id in self.lane_ids)
+        self._lanes = None
+
+    @classmethod
+    def from_lanes_data(cls, area_name, lanes_data):
+        """Builds an AreaState from simulate_traffic_data()'s lanes_data dict."""
+        state = cls(area_name, list(lanes_data))
+        lanes = list(lanes_data.values())
+        state.load([d['two_wheelers'] for d in lanes], [d['four_wheelers'] for d in lanes],
+                   [d['density'] for d in lanes], [d['is_emergency'] for d in lanes], [d['is_vip'] for d in lanes])
+        green = [lane_id for lane_id, d in lanes_data.items() if d.get('signal_status') == 'GREEN']
+        state.set_green_lane(green[0] if green else None)
+        return state
+
+    @property
+    def frozen(self):
+        return isinstance(self.density, tuple)
+
+    def load(self, two_wheelers, four_wheelers, density, is_emergency, is_vip):
+        """Overwrites every lane's counts and flags in place and clears the green lane."""
+        self.two_wheelers[:] = two_wheelers
+        self.four_wheelers[:] = four_wheelers
+        self.density[:] = density
+        self.is_emergency[:] = is_emergency
+        self.is_vip[:] = is_vip
+        self.green_index = None
+
+    def set_green_lane(self, lane_id):
+        """Marks lane_id GREEN and every other lane RED (all RED for None)."""
+        self.green_index = self._positions.get(lane_id)
+
+    @property
+    def green_lane(self):
+        return None if self.green_index is None else self.lane_ids[self.green_index]
+
+    def freeze(self):
+        """Returns an immutable copy (or self if already frozen) that later load() calls cannot change."""
+        if self.frozen:
+            return self
+        frozen = AreaState.__new__(AreaState)
+        frozen.area_name = self.area_name
+        frozen.lane_ids = self.lane_ids
+        frozen.two_wheelers = tuple(self.two_wheelers)
+        frozen.four_wheelers = tuple(self.four_wheelers)
+        frozen.density = tuple(self.density)
+        frozen.is_emergency = tuple(self.is_emergency)
+        frozen.is_vip = tuple(self.is_vip)
+        frozen.green_index = self.green_index
+        frozen._positions = self._positions
+        frozen._json_keys = self._json_keys
+        frozen._lanes = None
+        return frozen
+
+    def to_json(self):
+        """Serializes the lanes as the lanes_info JSON object without building per-lane dicts."""
+        parts = []
+        for i, key in enumerate(self._json_keys):
+            parts.append(
+                f'{key}{{"two_wheelers": {self.two_wheelers[i]}, "four_wheelers": {self.four_wheelers[i]}, '
+                f'"density": {self.density[i]}, "is_emergency": {"true" if self.is_emergency[i] else "false"}, '
+                f'"is_vip": {"true" if self.is_vip[i] else "false"}, '
+                f'"signal_status": "{"GREEN" if i == self.green_index else "RED"}"}}'
+            )
+        return '{' + ', '.join(parts) + '}'
+
+    def __getitem__(self, lane_id):
+        if self._lanes is None:
+            self._lanes = tuple(LaneState(self, i) for i in range(len(self.lane_ids)))
+        return self._lanes[self._positions[lane_id]]
+
+    def __iter__(self):
+        return iter(self.lane_ids)
+
+    def __len__(self):
+        return len(self.lane_ids)
+
+    def __repr__(self):
+        return f"AreaState({self.area_name!r}, {dict(self.items())!r})"
+
+# --- Batched Simulation ---
+# simulate_traffic_data() draws a handful of Python random numbers per lane and
+# builds nested dicts as it goes. TrafficSimulator draws every lane of every area
+# in one NumPy pass into flat arrays; TrafficBatch converts to the dict shape
+# above only for the areas a caller actually asks about.
+
+class TrafficBatch:
+    """
+    One simulation cycle of every area of a TrafficSimulator, as flat per-lane arrays.
+    The lanes of area i occupy [offsets[i], offsets[i + 1]) of each array, in AREAS order.
+    """
+
+    def __init__(self, simulator, two_wheelers, four_wheelers, density, is_emergency, is_vip, violations):
+        self.layout = simulator
+        self.areas = simulator.areas
+        self.lane_ids = simulator.lane_ids
+        self.offsets = simulator.offsets
+        self.two_wheelers = two_wheelers
+        self.four_wheelers = four_wheelers
+        self.density = density
+        self.is_emergency = is_emergency
+        self.is_vip = is_vip
+        self.violations = violations # area_name -> violation_details, only for areas with a violation
+        self._area_index = simulator.area_index
+        self._columns = None
+
+    def area_view(self, area_name):
+        """Returns area_name's lanes in simulate_traffic_data()'s lanes_data dict shape (a fresh dict)."""
+        two_wheelers, four_wheelers, density, is_emergency, is_vip = self._python_columns()
+        i = self._area_index[area_name]
+        return {
+            self.lane_ids[lane]: {
+                'two_wheelers': two_wheelers[lane],
+                'four_wheelers': four_wheelers[lane],
+                'density': density[lane],
+                'is_emergency': is_emergency[lane],
+                'is_vip': is_vip[lane],
+                'signal_status': 'RED' # Default, will be updated by logic
+            }
+            for lane in range(self.offsets[i], self.offsets[i + 1])
+        }
+
+    def result(self, area_name):
+        """Returns (lanes_data, violation_details) for area_name, like simulate_traffic_data()."""
+        return self.area_view(area_name), self.violations.get(area_name)
+
+    def fill(self, area_state):
+        """Loads this cycle's lanes of area_state.area_name into area_state in place."""
+        i = self._area_index[area_state.area_name]
+        start, end = self.offsets[i], self.offsets[i + 1]
+        area_state.load(*(column[start:end] for column in self._python_columns()))
+
+    def _python_columns(self):
+        if self._columns is None:
+            # One bulk conversion to Python ints/bools per batch; NumPy scalars are not JSON serializable
+            self._columns = (self.two_wheelers.tolist(), self.four_wheelers.tolist(), self.density.tolist(),
+                             self.is_emergency.tolist(), self.is_vip.tolist())
+        return self._columns
+
+class TrafficSimulator:
+    """
+    Simulates every lane of every area in one vectorized pass per simulate() call.
+    areas is a mapping of area name -> lane ids, or a list of names from AREAS (default: all of AREAS).
+    A seed makes both the lane arrays and the violations reproducible; violation_probability
+    is the per-area chance of a violation each cycle.
+    """
+
+    def __init__(self, areas=None, seed=None, violation_probability=VIOLATION_PROBABILITY):
+        if areas is None:
+            areas = AREAS
+        elif not isinstance(areas, dict):
+            areas = {area_name: AREAS[area_name] for area_name in areas}
+        self.areas = tuple(areas)
+        self.area_lanes = tuple(tuple(lanes) for lanes in areas.values())
+        self.lane_ids = tuple(lane_id for lanes in self.area_lanes for lane_id in lanes)
+        self.offsets = [0]
+        for lanes in self.area_lanes:
+            self.offsets.append(self.offsets[-1] + len(lanes))
+        self.area_index = {area_name: i for i, area_name in enumerate(self.areas)}
+        # Segment layout for determine_green_lanes(), which skips areas without lanes
+        self.nonempty_areas = [i for i, lanes in enumerate(self.area_lanes) if lanes]
+        self.lane_starts = np.array([self.offsets[i] for i in self.nonempty_areas], dtype=np.intp)
+        self.lane_segment = np.repeat(np.arange(len(self.nonempty_areas)),
+                                      [len(self.area_lanes[i]) for i in self.nonempty_areas])
+        self.violation_probability = violation_probability
+        self._rng = np.random.default_rng(seed)
+        self._violation_rng = random.Random(seed)
+
+    def area_states(self):
+        """Returns a fresh AreaState per area, to be refilled with TrafficBatch.fill() every tick."""
+        return {area_name: AreaState(area_name, lanes) for area_name, lanes in zip(self.areas, self.area_lanes)}
+
+    def simulate(self):
+        """Runs one cycle for every lane of every area and returns it as a TrafficBatch."""
+        lane_count = len(self.lane_ids)
+        two_wheelers = self._rng.integers(10, 81, lane_count) # Same ranges as random.randint(10, 80)
+        four_wheelers = self._rng.integers(5, 61, lane_count)
+        flags = self._rng.random((2, lane_count))
+        violating = np.flatnonzero(self._rng.random(len(self.areas)) < self.violation_probability)
+        violations = {self.areas[i]: simulate_violation(self.area_lanes[i], self._violation_rng)
+                      for i in violating.tolist() if self.area_lanes[i]}
+        return TrafficBatch(
+            self,
+            two_wheelers,
+            four_wheelers,
+            calculate_lane_density(two_wheelers, four_wheelers),
+            flags[0] < EMERGENCY_PROBABILITY,
+            flags[1] < VIP_PROBABILITY,
+            violations,
+        )
+
+def priority_lane_indices(batch):
+    """
+    Vectorized core of determine_green_lanes(): for every area of batch that has lanes
+    (batch.layout.nonempty_areas order), returns (lane indices into the batch arrays,
+    reasons) where reason is PRIORITY_EMERGENCY, PRIORITY_VIP or PRIORITY_DENSITY.
+    """
+    layout = batch.layout
+    if not len(batch.density):
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.int8)
+    # Rank every lane so one per-area max answers all three rules: emergencies
+    # above VIPs above any density, and equal ranks fall back to lane order.
+    top = int(batch.density.max()) + 1
+    rank = np.where(batch.is_emergency, 2 * top, np.where(batch.is_vip, top, batch.density))
+    area_max = np.maximum.reduceat(rank, layout.lane_starts)
+    winners = np.flatnonzero(rank == area_max[layout.lane_segment])
+    segments = layout.lane_segment[winners]
+    first = winners[np.concatenate(([True], segments[1:] != segments[:-1]))] # First winner per area
+    reasons = np.select([rank[first] == 2 * top, rank[first] == top], [PRIORITY_EMERGENCY, PRIORITY_VIP],
+                        PRIORITY_DENSITY).astype(np.int8)
+    return first, reasons
+
+def determine_green_lanes(batch):
+    """
+    determine_green_lane() for every area of a TrafficBatch in one vectorized pass.
+    Same priority (emergency > VIP > highest density) and tie-breaking (the first
+    such lane in the area's lane order wins). Returns green lane ids aligned with
+    batch.areas (None for an area without lanes).
+    """
+    layout = batch.layout
+    lanes, reasons = priority_lane_indices(batch)
+    green = [None] * len(layout.areas)
+    lane_ids = layout.lane_ids
+    for area_i, lane in zip(layout.nonempty_areas, lanes.tolist()):
+        green[area_i] = lane_ids[lane]
+
+    if logger.isEnabledFor(logging.INFO):
+        for reason, code in (('emergency', PRIORITY_EMERGENCY), ('vip', PRIORITY_VIP)):
+            for segment in np.flatnonzero(reasons == code).tolist():
+                area_i = layout.nonempty_areas[segment]
+                _log_priority(reason, layout.areas[area_i], green[area_i])
+    return green
+
 if __name__ == '__main__':
     # Example usage for testing the logic
     print("--- Simulating Traffic Data & Logic for Multiple Areas ---")
@@ -0,0 +1,155 @@
+"""
+Registry of vehicles and their owners: RC-number lookups for operators and
+violator selection for the simulators.
+
+Records are kept as parallel columns (one list per field) rather than one
+dict per vehicle, with two indexes over the normalized RC numbers: a hash
+index for exact lookups and a sorted array searched with bisect for prefix
+lookups such as "GJ06AB". Registries load from a CSV or SQLite file through a
+streaming reader, so millions of registrations never sit in memory twice.
+
+Vehicles are drawn without replacement through a shuffled permutation
+cursor: each draw swaps a random not-yet-drawn position into place (one step
+of a Fisher-Yates shuffle), so a draw is O(1) however large the registry is,
+and every vehicle is drawn once before any repeats. The draw state lives in
+the registry and is guarded by a lock, so threads share it safely; each
+gunicorn worker has its own registry and cycles through it independently.
+"""
+import csv
+import os
+import random
+import sqlite3
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+FIELDS = ('rc_number', 'name', 'phone', 'vehicle_type')
+MAX_PREFIX_RESULTS = 50 # Cap on search_prefix() results
+LOAD_CHUNK_ROWS = 10000 # Rows fetched per round trip by the SQLite loader
+
+
+def normalize_rc(rc_number):
+    """Canonical form of an RC number for lookups: upper case without spaces or dashes."""
+    return ''.join(rc_number.split()).replace('-', '').upper()
+
+
+class VehicleRegistry:
+    """
+    Vehicle records (rc_number, name, phone, vehicle_type) indexed by normalized
+    RC number, with prefix search and draw-without-replacement for the simulators.
+    vehicles is any iterable of mappings with those keys; it is consumed once.
+    """
+
+    def __init__(self, vehicles=()):
+        self._columns = {field: [] for field in FIELDS}
+        self._by_rc = {}
+        columns = [self._columns[field] for field in FIELDS]
+        for vehicle in vehicles:
+            key = normalize_rc(vehicle['rc_number'])
+            if not key:
+                continue
+            # One string object per RC number shared by the column and both indexes, and
+            # one per vehicle type: the per-row strings dominate memory at millions of rows.
+            row = (key if key == vehicle['rc_number'] else vehicle['rc_number'], vehicle.get('name') or 'N/A',
+                   vehicle.get('phone') or 'N/A', sys.intern(vehicle.get('vehicle_type') or 'N/A'))
+            index = self._by_rc.get(key)
+            if index is None:
+                self._by_rc[key] = len(columns[0])
+                for column, value in zip(columns, row):
+                    column.append(value)
+            else: # A later registration of the same RC number replaces the earlier one
+                for column, value in zip(columns, row):
+                    column[index] = value
+
+        # Prefix index: normalized RC numbers in sorted order, with their record indexes
+        ordered = sorted(self._by_rc.items())
+        self._sorted_rc = [key for key, _ in ordered]
+        self._sorted_index = array('l', (index for _, index in ordered))
+
+        self._order = array('l', range(len(self))) # Permutation of record indexes; [:_cursor] already drawn
+        self._cursor = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path, table='vehicles'):
+        """Loads a registry from a .csv file, or from `table` of a SQLite database otherwise."""
+        if os.path.splitext(path)[1].lower() == '.csv':
+            return cls(iter_csv(path))
+        return cls(iter_sqlite(path, table))
+
+    def __len__(self):
+        return len(self._columns['rc_number'])
+
+    def __contains__(self, rc_number):
+        return normalize_rc(rc_number) in self._by_rc
+
+    def _record(self, index):
+        return {field: self._columns[field][index] for field in FIELDS}
+
+    def get(self, rc_number):
+        """Returns the vehicle registered under rc_number (any spacing/case), or None."""
+        index = self._by_rc.get(normalize_rc(rc_number))
+        return self._record(index) if index is not None else None
+
+    def search_prefix(self, prefix, limit=MAX_PREFIX_RESULTS):
+        """
+        Returns up to limit vehicles whose normalized RC number starts with prefix
+        (e.g. 'GJ06AB'), in RC-number order. O(log n + limit).
+        """
+        prefix = normalize_rc(prefix)
+        if not prefix:
+            return []
+        position = bisect_left(self._sorted_rc, prefix)
+        results = []
+        for key, index in zip(self._sorted_rc[position:position + limit],
+                              self._sorted_index[position:position + limit]):
+            if not key.startswith(prefix):
+                break
+            results.append(self._record(index))
+        return results
+
+    def draw(self, rng=random):
+        """
+        Returns the next vehicle of a random permutation of the registry, starting a
+        new pass once every vehicle has been drawn; None if the registry is empty.
+        rng is a random.Random-like source, so seeded simulators can reproduce draws.
+        """
+        with self._lock:
+            count = len(self._order)
+            if not count:
+                return None
+            if self._cursor >= count:
+                self._cursor = 0 # The drawn positions are still a permutation; keep shuffling from it
+            cursor = self._cursor
+            swap = rng.randrange(cursor, count)
+            order = self._order
+            order[cursor], order[swap] = order[swap], order[cursor]
+            self._cursor = cursor + 1
+            return self._record(order[cursor])
+
+    def reset(self):
+        """Forgets which vehicles have been drawn in the current pass."""
+        with self._lock:
+            self._cursor = 0
+
+
+def iter_csv(path):
+    """Streams vehicle dicts from a CSV file with a header row naming (at least) the FIELDS."""
+    with open(path, newline='', encoding='utf-8') as f:
+        yield from csv.DictReader(f)
+
+
+def iter_sqlite(path, table='vehicles'):
+    """Streams vehicle dicts from the FIELDS columns of a SQLite table, LOAD_CHUNK_ROWS at a time."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(FIELDS)} FROM \"{table}\"")
+        while True:
+            rows = cursor.fetchmany(LOAD_CHUNK_ROWS)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(zip(FIELDS, row))
+    finally:
+        conn.close()